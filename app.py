@@ -1,7 +1,12 @@
-from flask import Flask, request, jsonify, render_template_string, render_template, send_from_directory, redirect
+from flask import Flask, request, jsonify, render_template_string, render_template, send_from_directory, redirect, make_response, abort
+import functools
 import os
+import posixpath
 import sys
-from werkzeug.utils import secure_filename
+import threading
+import time
+import zlib
+from werkzeug.security import safe_join
 
 # Logging สำหรับ debug
 import logging
@@ -10,8 +15,13 @@ logger = logging.getLogger(__name__)
 
 from pyhon import (
     init_db,
+    get_schema_version,
+    SCHEMA_VERSION,
     register,
     list_reviews,
+    list_reviews_page,
+    iter_reviews,
+    list_review_cards,
     create_review,
     create_review_by_customer,
     get_review,
@@ -23,68 +33,138 @@ from pyhon import (
     get_current_user,
     get_dashboard_overview,
     list_products,
+    list_products_page,
+    parse_product_filters,
+    product_facets,
+    search_products,
     create_product,
     get_product,
+    get_product_rating,
     update_product,
     delete_product,
-    list_customers,
+    iter_customers,
     create_admin,
     list_admins,
     delete_customer,
     delete_admin,
     count_admins,
+    CATALOG_PRODUCTS,
+    CATALOG_REVIEWS,
     User,
+    release_blob,
+)
+from catalog_cache import get_catalog_cache
+from suggest_index import get_suggest_index
+import blob_store
+import image_pipeline
+import upload_stream
+from upload_stream import UploadRejected, UploadRequest
+from static_assets import asset_url, send_asset
+from compression import CompressionMiddleware
+from serialization import (
+    EXPORT_FORMATS,
+    REVIEW_FIELDS,
+    USER_FIELDS,
+    JSONProvider,
+    dumps,
+    normalize_image_path,
+    page_body,
+    product_json,
+    product_row_json,
+    review_json,
+    review_row_json,
+    stream_rows,
+    user_json,
+    user_row_json,
 )
 
 app = Flask(__name__)
+# jsonify ใช้ encoder ของ serialization.py (orjson ถ้ามี)
+app.json = JSONProvider(app)
 # ใช้ absolute path เพื่อให้รูปโหลดได้ไม่ว่า CWD จะอยู่ที่ไหน (รวมตอน deploy)
 _base = os.path.dirname(os.path.abspath(__file__))
 app.config['UPLOAD_FOLDER_PROFILE'] = os.path.join(_base, 'static', 'uploads', 'profile')
 app.config['UPLOAD_FOLDER_PRODUCT'] = os.path.join(_base, 'static', 'uploads', 'product')
-app.config['MAX_CONTENT_LENGTH'] = 5 * 1024 * 1024  # 5MB max file size
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
-
-def _normalize_image_path(path):
-    """ให้ path รูปใช้ forward slash เสมอ เพื่อให้ URL ใช้ได้ทุกที่"""
-    if not path or not isinstance(path, str):
-        return path
-    return path.replace("\\", "/")
+app.config['MAX_CONTENT_LENGTH'] = 5 * 1024 * 1024  # 5MB max request (ขนาดสูงสุดของแต่ละชนิดรูป: upload_stream.UPLOAD_MAX_BYTES)
+# route อัปโหลดรูปรับไฟล์แบบ stream ลง blob temp ตรง ๆ (ตรวจชนิด/ขนาดระหว่างรับ)
+app.request_class = UploadRequest
+# template ใช้ {{ asset_url('/static/js/api.js') }} เพื่อได้ชื่อไฟล์ที่มี hash หลัง build
+app.jinja_env.globals["asset_url"] = asset_url
+# บีบ JSON/ข้อความตาม Accept-Encoding (gzip/brotli) — ครอบ wsgi_app จึงมีผลทั้ง gunicorn และ route ที่ asgi.py ส่งต่อมา
+app.wsgi_app = compression_middleware = CompressionMiddleware(app.wsgi_app)
 
 # สร้างโฟลเดอร์สำหรับเก็บรูปภาพ
 os.makedirs(app.config['UPLOAD_FOLDER_PROFILE'], exist_ok=True)
 os.makedirs(app.config['UPLOAD_FOLDER_PRODUCT'], exist_ok=True)
 
-# Flag เพื่อ init DB ครั้งเดียว
-_db_initialized = False
+# สร้างตาราง/migrate ครั้งเดียวต่อ deploy: gunicorn on_starting (gunicorn.conf.py), `flask --app app init-db`
+# หรือ `python app.py` — request ไม่รัน DDL เอง แค่ดูสถานะ schema ผ่าน /health
+HEALTH_RECHECK_SECONDS = float(os.environ.get("HEALTH_RECHECK_SECONDS", "5"))
+_readiness = {"ready": False, "schema_version": None, "error": None, "checked_at": 0.0}
+_readiness_lock = threading.Lock()
+
+
+def initialize_database() -> int:
+    """สร้างตาราง + migrate schema (ปลอดภัย: ใช้ advisory lock และรันเฉพาะขั้นที่ยังไม่เคยรัน)"""
+    logger.info("Initializing database...")
+    version = init_db()
+    logger.info("Database initialized successfully (schema version %s)", version)
+    return version
+
+
+@app.cli.command("init-db")
+def init_db_command():
+    """สร้างตาราง + migrate schema ให้เป็นล่าสุด"""
+    version = initialize_database()
+    print(f"Database initialized (schema version {version})")
 
-def initialize_database():
-    """สร้างตารางใน DB เมื่อ deploy (ปลอดภัย: CREATE TABLE IF NOT EXISTS)"""
-    global _db_initialized
-    if _db_initialized:
+
+@app.cli.command("process-images")
+def process_images_command():
+    """สร้างรูปหลายขนาด (WebP/JPEG) ให้รูปที่อัปโหลดไว้ก่อนมี image pipeline"""
+    if not image_pipeline.enabled():
+        print("ไม่ได้ติดตั้ง Pillow — ข้าม")
         return
-    try:
-        logger.info("Initializing database...")
-        init_db()
-        _db_initialized = True
-        logger.info("Database initialized successfully")
-    except Exception as e:
-        logger.warning(f"Database initialization warning: {e}")
-        # ไม่ crash - จะ retry เมื่อมี request แรก
+    for key in ("UPLOAD_FOLDER_PROFILE", "UPLOAD_FOLDER_PRODUCT"):
+        count = image_pipeline.backfill(app.config[key])
+        print(f"{app.config[key]}: ย่อรูป {count} ไฟล์")
+
 
-# เรียก init_db เมื่อ app start (lazy - จะเรียกเมื่อมี request แรก)
-@app.before_request
-def ensure_db_initialized():
-    initialize_database()
+@app.cli.command("gc-uploads")
+def gc_uploads_command():
+    """ลบไฟล์อัปโหลดที่ไม่มีสินค้า/ผู้ใช้อ้างถึงนานเกิน BLOB_GC_GRACE (ตั้ง cron วันละครั้ง)"""
+    result = blob_store.collect_garbage()
+    print(f"ลบไฟล์ {result['removed']} ไฟล์, ไฟล์ที่ไม่มีในตารางรอลบรอบถัดไป {result['adopted']} ไฟล์")
+    print(f"ลบ resumable upload ที่ค้าง {upload_stream.sweep_resumable()} รายการ")
+
+
+def get_readiness() -> dict:
+    """
+    สถานะความพร้อมของ worker: DB เชื่อมได้ และ schema เป็น version ที่โค้ดนี้ต้องการ
+    พร้อมแล้วจำไว้ตลอด; ยังไม่พร้อมจะเช็ค DB ใหม่ได้ไม่เกินทุก HEALTH_RECHECK_SECONDS
+    """
+    now = time.monotonic()
+    if _readiness["ready"] or now - _readiness["checked_at"] < HEALTH_RECHECK_SECONDS:
+        return dict(_readiness)
+    with _readiness_lock:
+        if not _readiness["ready"] and now - _readiness["checked_at"] >= HEALTH_RECHECK_SECONDS:
+            try:
+                version = get_schema_version()
+                _readiness.update(
+                    ready=version >= SCHEMA_VERSION,
+                    schema_version=version,
+                    error=None if version >= SCHEMA_VERSION else "schema ยังไม่ migrate (รัน flask --app app init-db)",
+                )
+            except Exception as e:
+                _readiness.update(ready=False, error=str(e).strip())
+            _readiness["checked_at"] = time.monotonic()
+        return dict(_readiness)
 
 # Log เมื่อ app start
 logger.info("Flask app initialized")
 logger.info(f"Python version: {sys.version}")
 logger.info(f"Working directory: {os.getcwd()}")
 
-def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
-
-
 def _get_token_from_request():
     """ดึง token จาก Authorization: Bearer <token> หรือ query ?token= หรือ JSON body"""
     auth = request.headers.get("Authorization")
@@ -109,8 +189,90 @@ def _require_admin():
     except Exception as e:
         return None, (jsonify({"error": str(e)}), 401)
 
-# init_db() ถูกเรียกแบบ lazy ใน @app.before_request (ensure_db_initialized) เท่านั้น
+def _wants_page(args):
+    """ถ้าส่ง ?limit= หรือ ?cursor= มา ให้ตอบแบบแบ่งหน้า {"items": [...], "next_cursor": ...}"""
+    return "limit" in args or "cursor" in args
+
+
+def _export_response(rows, row_json, fields, name: str):
+    """
+    ส่งรายการจาก server-side cursor แบบ stream — ?format=json (array, ค่าเริ่มต้น) | ndjson | csv
+    ndjson/csv ส่งเป็นไฟล์ดาวน์โหลด; อ่านก้อนแรกก่อนส่ง header เพื่อให้ error ของ DB ยังตอบเป็น 400 ได้
+    """
+    fmt = request.args.get("format", "json")
+    if fmt not in EXPORT_FORMATS:
+        rows.close()
+        return jsonify({"error": "format ต้องเป็น json, ndjson หรือ csv"}), 400
+    body = stream_rows(rows, row_json, fmt, fields)
+    first = next(body, b"")
+
+    def generate():
+        try:
+            yield first
+            yield from body
+        finally:
+            body.close()
+
+    response = app.response_class(generate(), mimetype=EXPORT_FORMATS[fmt])
+    response.headers["Cache-Control"] = "no-store"
+    if fmt != "json":
+        response.headers["Content-Disposition"] = f'attachment; filename="{name}-{time.strftime("%Y%m%d")}.{fmt}"'
+    return response
+
+
+# HTTP cache ของ API สาธารณะ (browser/CDN เก็บได้สั้นๆ แล้ว revalidate ด้วย ETag)
+CATALOG_MAX_AGE = int(os.environ.get("CATALOG_MAX_AGE", "10"))
+CATALOG_STALE_WHILE_REVALIDATE = int(os.environ.get("CATALOG_STALE_WHILE_REVALIDATE", "300"))
+
+
+CATALOG_CACHE_CONTROL = f"public, max-age={CATALOG_MAX_AGE}, stale-while-revalidate={CATALOG_STALE_WHILE_REVALIDATE}"
+
+
+def _catalog_validators(names, versions, query_string: bytes):
+    """คืน (ETag, Last-Modified epoch) ของ response ที่ขึ้นกับ catalogue names (ใช้ร่วมกับ asgi.py)"""
+    # ETag ต่างกันตาม query string (limit/cursor/product_id ให้ผลไม่เหมือนกัน)
+    etag = "-".join(f"{n}{versions.get(n, (0, 0.0))[0]}" for n in names)
+    etag += "-%08x" % zlib.crc32(query_string)
+    last_modified = int(max(versions.get(n, (0, 0.0))[1] for n in names))
+    return etag, last_modified
+
+
+def _catalog_cached(*names):
+    """
+    ใส่ ETag / Last-Modified / Cache-Control ให้ API สาธารณะ โดยใช้ version ของ catalogue (query เล็กๆ 1 ครั้ง)
+    ถ้า If-None-Match (หรือ If-Modified-Since) ตรง ตอบ 304 ทันทีโดยไม่ต้องดึงข้อมูลทั้งตาราง
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            try:
+                versions = get_catalog_cache().versions()
+            except Exception:
+                return view(*args, **kwargs)
+            etag, last_modified = _catalog_validators(names, versions, request.query_string)
+
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains_weak(etag)
+            else:
+                ims = request.if_modified_since
+                not_modified = ims is not None and last_modified <= ims.timestamp()
+
+            if not_modified:
+                resp = app.response_class(status=304)
+            else:
+                resp = make_response(view(*args, **kwargs))
+                if resp.status_code != 200:
+                    return resp
+            resp.set_etag(etag, weak=True)
+            resp.last_modified = last_modified
+            resp.headers["Cache-Control"] = CATALOG_CACHE_CONTROL
+            return resp
+        return wrapper
+    return decorator
+
+
 # อย่าเรียก init_db() ตอน import เพราะบน Render ยังไม่มี DATABASE_URL หรือจะเชื่อม localhost
+# (ดู initialize_database ด้านบน — รันครั้งเดียวตอน start ไม่ใช่ทุก request)
 
 PAGE_HTML = r"""
 <!DOCTYPE html>
@@ -254,13 +416,19 @@ def index():
 @app.get("/brand/")
 def brand_index():
     """หน้าแรก Champa brand"""
-    return send_from_directory(CLIENT_DIR, "index.html")
+    return send_asset("client", CLIENT_DIR, "index.html")
 
 
 @app.get("/brand/<path:path>")
 def brand_static(path):
     """ไฟล์ static ของ Champa brand (css, js, images, หน้าอื่น)"""
-    return send_from_directory(CLIENT_DIR, path)
+    return send_asset("client", CLIENT_DIR, path)
+
+
+@app.get("/static/js/<path:path>")
+def static_js(path):
+    """JS ของหน้า admin (build แล้วได้ชื่อที่มี hash + gzip/brotli)"""
+    return send_asset("static/js", os.path.join(_base, "static", "js"), path)
 
 
 @app.get("/login")
@@ -277,10 +445,24 @@ def admin_login_redirect():
 
 
 @app.get("/ping")
+def ping():
+    """Keep-alive endpoint เพื่อป้องกัน Render free tier sleep (เรียกทุก 5-10 นาที) — ไม่แตะ DB"""
+    return jsonify({"status": "ok", "message": "Server is alive"}), 200
+
+
 @app.get("/health")
 def health_check():
-    """Keep-alive endpoint เพื่อป้องกัน Render free tier sleep (เรียกทุก 5-10 นาที)"""
-    return jsonify({"status": "ok", "message": "Server is alive"}), 200
+    """Readiness: 200 เมื่อ DB พร้อมและ schema เป็นล่าสุด, 503 ถ้ายังไม่พร้อม"""
+    state = get_readiness()
+    body = {
+        "status": "ok" if state["ready"] else "unavailable",
+        "ready": state["ready"],
+        "schema_version": state["schema_version"],
+        "expected_schema_version": SCHEMA_VERSION,
+    }
+    if state["error"]:
+        body["error"] = state["error"]
+    return jsonify(body), 200 if state["ready"] else 503
 
 
 @app.get("/setup")
@@ -297,16 +479,120 @@ def setup_page():
 # ========== API สาธารณะ (สำหรับ Champa brand) ==========
 
 
+def _build_products_public():
+    guest = User(id=0, username="guest", phone=None, password_hash="", role="customer")
+    paged = _wants_page(request.args)
+    filters = parse_product_filters(request.args)
+    # แถวจาก DB -> dict ของ JSON ตรง ๆ (ไม่ผ่าน Product)
+    if paged:
+        items, next_cursor = list_products_page(
+            guest,
+            limit=request.args.get("limit", type=int),
+            cursor=request.args.get("cursor") or None,
+            row_to=product_row_json,
+            filters=filters,
+        )
+    else:
+        items, next_cursor = list_products(guest, row_to=product_row_json, filters=filters), None
+    return page_body(items, next_cursor, paged)
+
+
 @app.get("/api/products")
+@_catalog_cached(CATALOG_PRODUCTS, CATALOG_REVIEWS)
 def api_products_public():
-    """รายการสินค้าสำหรับแสดงบนเว็บ brand (ไม่ต้องล็อกอิน)"""
+    """
+    รายการสินค้าสำหรับแสดงบนเว็บ brand (ไม่ต้องล็อกอิน) — ตอบจาก catalog cache ถ้ามี
+    กรองที่ server ได้ด้วย ?category=&price_type=&in_stock=&min_price=&max_price=
+    """
+    try:
+        # มี rating_count/rating_avg ด้วย จึงต้องล้างเมื่อรีวิวเปลี่ยนเช่นกัน
+        body = get_catalog_cache().get_or_build(
+            (CATALOG_PRODUCTS, CATALOG_REVIEWS), request.query_string, _build_products_public
+        )
+        return app.response_class(body, mimetype="application/json")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+def _build_product_facets():
+    guest = User(id=0, username="guest", phone=None, password_hash="", role="customer")
+    return dumps(product_facets(guest, parse_product_filters(request.args)))
+
+
+@app.get("/api/products/facets")
+@_catalog_cached(CATALOG_PRODUCTS)
+def api_product_facets_public():
+    """
+    จำนวนสินค้าต่อหมวดหมู่ / ประเภท / มีของ ภายใต้ตัวกรองเดียวกับ /api/products (สำหรับตัวเลขบนแท็บ)
+    นับทั้งตารางครั้งเดียวแล้ว cache จนกว่าสินค้าจะเปลี่ยน — รีวิวเปลี่ยนไม่ต้องนับใหม่
+    """
     try:
-        guest = User(id=0, username="guest", phone=None, password_hash="", role="customer")
-        products = list_products(guest)
-        return jsonify([
-            {"id": p.id, "name": p.name, "price": p.price, "stock": p.stock, "image": _normalize_image_path(p.image), "description": p.description, "category": p.category, "price_type": p.price_type}
-            for p in products
-        ])
+        body = get_catalog_cache().get_or_build(CATALOG_PRODUCTS, b"facets?" + request.query_string, _build_product_facets)
+        return app.response_class(body, mimetype="application/json")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+def _build_search_public():
+    guest = User(id=0, username="guest", phone=None, password_hash="", role="customer")
+    items, next_cursor = search_products(
+        guest,
+        request.args.get("q", ""),
+        limit=request.args.get("limit", type=int),
+        cursor=request.args.get("cursor") or None,
+        row_to=product_row_json,
+    )
+    return page_body(items, next_cursor, True)
+
+
+@app.get("/api/search")
+@_catalog_cached(CATALOG_PRODUCTS, CATALOG_REVIEWS)
+def api_search_public():
+    """ค้นหาสินค้า ?q=คำค้น (&limit=&cursor=) เรียงตามความเกี่ยวข้อง — ตอบ {"items", "next_cursor"} เสมอ"""
+    try:
+        body = get_catalog_cache().get_or_build(
+            (CATALOG_PRODUCTS, CATALOG_REVIEWS), b"search?" + request.query_string, _build_search_public
+        )
+        return app.response_class(body, mimetype="application/json")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+# คำแนะนำเปลี่ยนตามสินค้าช้ากว่า catalogue อื่นได้นิดหน่อย: ให้ browser/CDN เก็บสั้น ๆ ไม่ต้อง revalidate
+SUGGEST_CACHE_CONTROL = f"public, max-age={CATALOG_MAX_AGE}"
+
+
+@app.get("/api/search/suggest")
+def api_search_suggest():
+    """คำแนะนำระหว่างพิมพ์ ?q=คำค้น (&limit=) จาก index ในหน่วยความจำของ worker — [{"id", "name", "category"}]"""
+    try:
+        items = get_suggest_index().suggest(request.args.get("q"), request.args.get("limit", type=int))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    response = app.response_class(dumps(items), mimetype="application/json")
+    response.headers["Cache-Control"] = SUGGEST_CACHE_CONTROL
+    return response
+
+
+@app.get("/api/products/<int:product_id>/rating")
+@_catalog_cached(CATALOG_REVIEWS)
+def api_product_rating(product_id):
+    """สรุปคะแนนของสินค้า: จำนวนรีวิว, คะแนนเฉลี่ย, histogram 1-5 ดาว (อ่านจากตารางสรุป O(1))"""
+    try:
+        body = get_catalog_cache().get_or_build(
+            CATALOG_REVIEWS,
+            f"rating:{product_id}".encode("ascii"),
+            lambda: dumps(get_product_rating(product_id)),
+        )
+        return app.response_class(body, mimetype="application/json")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 404
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -323,14 +609,9 @@ def api_register():
 
     try:
         user = register(username=username, phone=phone, password=password, role="customer")
-        return jsonify(
-            {
-                "id": user.id,
-                "username": user.username,
-                "phone": user.phone,
-                "role": user.role,
-            }
-        )
+        return jsonify(user_json(user))
+    except TimeoutError as e:
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
@@ -350,13 +631,12 @@ def api_login():
         return jsonify(
             {
                 "token": token,
-                "user": {
-                    "id": user.id,
-                    "username": user.username,
-                    "role": user.role,
-                },
+                "user": user_json(user),
             }
         )
+    except TimeoutError as e:
+        # คิวตรวจรหัสผ่านเต็ม (KDF pool) — ให้ลองใหม่ แทนการค้าง worker
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
@@ -391,7 +671,7 @@ def api_setup_first_admin():
         return jsonify({"error": "กรุณาส่ง username และ password ใน body (JSON)"}), 400
     try:
         user = register(username=username, password=password, role="admin", phone=phone)
-        return jsonify({"id": user.id, "username": user.username, "phone": user.phone, "role": user.role}), 201
+        return jsonify(user_json(user)), 201
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
@@ -417,11 +697,9 @@ def api_admin_me():
     except:
         pass
     return jsonify({
-        "id": user.id, 
-        "username": user.username, 
-        "role": user.role, 
-        "phone": user.phone,
-        "profile_image": profile_image
+        **user_json(user),
+        "profile_image": profile_image,
+        "profile_images": image_pipeline.image_set(normalize_image_path(profile_image))
     })
 
 
@@ -437,136 +715,230 @@ def api_admin_dashboard():
         return jsonify({"error": str(e)}), 403
 
 
+@app.get("/api/admin/cache-stats")
+def api_admin_cache_stats():
+    """ตัวนับ hit/miss ของ cache ใน worker นี้ (ไว้เช็คว่า request สาธารณะส่วนใหญ่ไม่แตะ DB)"""
+    user, err = _require_admin()
+    if err:
+        return err[0], err[1]
+    return jsonify({
+        "pid": os.getpid(),
+        "catalog": get_catalog_cache().stats(),
+        "compression": compression_middleware.stats(),
+        "suggest": get_suggest_index().stats(),
+    })
+
+
+def _receive_upload(kind, user):
+    """
+    รับรูปจาก multipart (werkzeug stream ลง temp และตรวจ magic bytes/ขนาดระหว่าง parse — ดู upload_stream)
+    หรือจาก resumable upload ที่ส่งครบแล้ว ({"upload_id": ...}) — คืน PendingBlob, ไฟล์ใช้ไม่ได้ raise UploadRejected
+    """
+    data = request.get_json(silent=True) or {}
+    if data.get("upload_id"):
+        pending = upload_stream.complete_resumable(str(data["upload_id"]), kind, user.id)
+        try:
+            with open(pending.tmp_path, "rb") as f:
+                image_pipeline.check_image(f)
+        except ValueError as e:
+            blob_store.discard(pending)
+            raise UploadRejected(str(e))
+        return pending
+
+    request.upload_kind = kind
+    file = request.files.get('file')
+    if file is None:
+        raise UploadRejected("ไม่มีไฟล์")
+    try:
+        image_pipeline.check_image(file.stream)
+    except ValueError as e:
+        raise UploadRejected(str(e))
+    return file.stream.finish()
+
+
+@app.post("/api/admin/uploads")
+def api_admin_uploads_create():
+    """เริ่ม resumable upload: {"kind": "product"|"profile", "size": bytes, "filename": "..."}"""
+    user, err = _require_admin()
+    if err:
+        return err[0], err[1]
+    data = request.get_json(silent=True) or {}
+    try:
+        status = upload_stream.create_resumable(data.get("kind"), data.get("size"), data.get("filename"), user.id)
+    except UploadRejected as e:
+        return jsonify({"error": str(e), **e.extra}), e.status
+    return jsonify(status), 201
+
+
+@app.get("/api/admin/uploads/<upload_id>")
+def api_admin_uploads_status(upload_id):
+    """ตำแหน่งล่าสุดที่ server ได้รับ (HEAD ได้ค่าเดียวกันใน header Upload-Offset)"""
+    user, err = _require_admin()
+    if err:
+        return err[0], err[1]
+    try:
+        status = upload_stream.resumable_status(upload_id, user.id)
+    except UploadRejected as e:
+        return jsonify({"error": str(e), **e.extra}), e.status
+    response = jsonify(status)
+    response.headers["Upload-Offset"] = str(status["offset"])
+    response.headers["Upload-Length"] = str(status["size"])
+    response.headers["Cache-Control"] = "no-store"
+    return response
+
+
+@app.patch("/api/admin/uploads/<upload_id>")
+def api_admin_uploads_append(upload_id):
+    """ส่งข้อมูลก้อนถัดไป: header Upload-Offset = ตำแหน่งเริ่ม, body = bytes ดิบ (application/offset+octet-stream)"""
+    user, err = _require_admin()
+    if err:
+        return err[0], err[1]
+    offset = request.headers.get("Upload-Offset", type=int)
+    if offset is None:
+        return jsonify({"error": "ต้องส่ง header Upload-Offset"}), 400
+    try:
+        status = upload_stream.append_resumable(upload_id, user.id, offset, request.stream, request.content_length)
+    except UploadRejected as e:
+        response = jsonify({"error": str(e), **e.extra})
+        if "offset" in e.extra:
+            response.headers["Upload-Offset"] = str(e.extra["offset"])
+        return response, e.status
+    response = jsonify(status)
+    response.headers["Upload-Offset"] = str(status["offset"])
+    return response
+
+
 @app.post("/api/admin/upload-profile")
 def api_admin_upload_profile():
-    """อัปโหลดรูป profile"""
+    """อัปโหลดรูป profile (multipart field "file" หรือ JSON {"upload_id"} ของ resumable upload ที่ส่งครบแล้ว)"""
     user, err = _require_admin()
     if err:
         return err[0], err[1]
     
-    if 'file' not in request.files:
-        return jsonify({"error": "ไม่มีไฟล์"}), 400
-    
-    file = request.files['file']
-    if file.filename == '':
-        return jsonify({"error": "ไม่ได้เลือกไฟล์"}), 400
-    
-    if not allowed_file(file.filename):
-        return jsonify({"error": "ไฟล์ไม่รองรับ (รองรับเฉพาะ: png, jpg, jpeg, gif, webp)"}), 400
+    try:
+        pending = _receive_upload("profile", user)
+    except UploadRejected as e:
+        return jsonify({"error": str(e), **e.extra}), e.status
     
     try:
-        # สร้างชื่อไฟล์ใหม่ (user_id_timestamp.extension)
-        import time
-        filename = secure_filename(file.filename)
-        ext = filename.rsplit('.', 1)[1].lower()
-        new_filename = f"{user.id}_{int(time.time())}.{ext}"
-        filepath = os.path.join(app.config['UPLOAD_FOLDER_PROFILE'], new_filename)
-        
-        # บันทึกไฟล์
-        file.save(filepath)
-        
         # บันทึก path ลง database
         from pyhon import get_connection
-        with get_connection() as conn:
-            with conn.cursor() as cur:
-                # ลบรูปเก่าถ้ามี
-                cur.execute("SELECT profile_image FROM users WHERE id = %s", (user.id,))
-                old_image = cur.fetchone()
-                if old_image and old_image[0]:
-                    old_path = os.path.join(_base, 'static', old_image[0])
-                    if os.path.exists(old_path):
-                        try:
-                            os.remove(old_path)
-                        except:
-                            pass
-                
-                # บันทึก path ใหม่ (เก็บเป็น relative path จาก static)
-                relative_path = f"uploads/profile/{new_filename}"
-                cur.execute("UPDATE users SET profile_image = %s WHERE id = %s", (relative_path, user.id))
-                conn.commit()
+        try:
+            with get_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT profile_image FROM users WHERE id = %s FOR UPDATE", (user.id,))
+                    old_image = cur.fetchone()
+                    # user ถูกลบระหว่างอัปโหลด: ห้าม store (reference ของ blob จะไม่มีวันลดลงถึง 0)
+                    if old_image is None:
+                        return jsonify({"error": "ไม่พบผู้ใช้"}), 404
+                    relative_path = blob_store.store(cur, pending)
+                    cur.execute("UPDATE users SET profile_image = %s WHERE id = %s", (relative_path, user.id))
+                    # รูปเก่าไม่ถูกลบตรงนี้: ลด reference แล้วให้ GC ลบเมื่อไม่มีใครใช้
+                    release_blob(cur, old_image[0])
+                    conn.commit()
+        finally:
+            blob_store.discard(pending)
+        filepath = blob_store.absolute_path(relative_path)
         
+        # ย่อรูปใน background — ระหว่างนี้ URL รูปย่อจะได้ไฟล์ต้นฉบับแทน
+        image_pipeline.schedule(filepath)
         return jsonify({
             "success": True,
             "message": "อัปโหลดรูปสำเร็จ",
-            "profile_image": relative_path
+            "profile_image": relative_path,
+            "images": image_pipeline.image_set(relative_path)
         }), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
-@app.get("/static/uploads/profile/<filename>")
+# ชื่อไฟล์อัปโหลดไม่เคยถูกเขียนทับ (ชื่อ = hash ของเนื้อไฟล์) จึงให้ browser/CDN cache ได้ตลอด
+UPLOAD_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def _send_upload(folder, filename):
+    """
+    เสิร์ฟไฟล์ที่อัปโหลดแบบ immutable ถ้าเป็นรูปย่อที่ยังสร้างไม่เสร็จ (เพิ่งอัปโหลด / รูปเก่าก่อนมี pipeline)
+    ส่งต้นฉบับแทนแบบ no-cache เพื่อให้ browser กลับมาเอารูปย่อจริงเมื่อพร้อม
+    """
+    path = safe_join(folder, filename)
+    if path is None or any(part.startswith(".") for part in filename.split("/")):
+        abort(404)  # .incoming = ไฟล์ที่ยังอัปโหลดไม่เสร็จ
+    if not os.path.exists(path):
+        original = image_pipeline.fallback_original(os.path.dirname(path), os.path.basename(path))
+        if original:
+            response = send_from_directory(folder, posixpath.join(posixpath.dirname(filename), original))
+            response.headers["Cache-Control"] = "no-cache"
+            return response
+    response = send_from_directory(folder, filename)
+    response.headers["Cache-Control"] = UPLOAD_CACHE_CONTROL
+    return response
+
+
+@app.get("/static/uploads/profile/<path:filename>")
 def uploaded_profile_file(filename):
     """Serve uploaded profile images"""
-    return send_from_directory(app.config['UPLOAD_FOLDER_PROFILE'], filename)
+    return _send_upload(app.config['UPLOAD_FOLDER_PROFILE'], filename)
 
 
 @app.post("/api/admin/products/<int:product_id>/upload-image")
 def api_admin_products_upload_image(product_id):
-    """อัปโหลดรูปสินค้า"""
+    """อัปโหลดรูปสินค้า (multipart field "file" หรือ JSON {"upload_id"} ของ resumable upload ที่ส่งครบแล้ว)"""
     user, err = _require_admin()
     if err:
         return err[0], err[1]
     
-    if 'file' not in request.files:
-        return jsonify({"error": "ไม่มีไฟล์"}), 400
-    
-    file = request.files['file']
-    if file.filename == '':
-        return jsonify({"error": "ไม่ได้เลือกไฟล์"}), 400
+    # ตรวจสอบว่าสินค้ามีอยู่จริง ก่อนเริ่มรับไฟล์
+    try:
+        from pyhon import get_product
+        get_product(user, str(product_id))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 404
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
     
-    if not allowed_file(file.filename):
-        return jsonify({"error": "ไฟล์ไม่รองรับ (รองรับเฉพาะ: png, jpg, jpeg, gif, webp)"}), 400
+    try:
+        pending = _receive_upload("product", user)
+    except UploadRejected as e:
+        return jsonify({"error": str(e), **e.extra}), e.status
     
     try:
-        # ตรวจสอบว่าสินค้ามีอยู่จริง
-        from pyhon import get_product
-        product = get_product(user, str(product_id))
-        if not product:
-            return jsonify({"error": "ไม่พบสินค้า"}), 404
-        
-        # สร้างชื่อไฟล์ใหม่
-        import time
-        filename = secure_filename(file.filename)
-        ext = filename.rsplit('.', 1)[1].lower()
-        new_filename = f"product_{product_id}_{int(time.time())}.{ext}"
-        filepath = os.path.join(app.config['UPLOAD_FOLDER_PRODUCT'], new_filename)
-        
-        # บันทึกไฟล์
-        file.save(filepath)
-        
         # บันทึก path ลง database
-        from pyhon import get_connection
-        with get_connection() as conn:
-            with conn.cursor() as cur:
-                # ลบรูปเก่าถ้ามี
-                cur.execute("SELECT image FROM products WHERE id = %s", (product_id,))
-                old_image = cur.fetchone()
-                if old_image and old_image[0]:
-                    old_path = os.path.join(_base, 'static', old_image[0])
-                    if os.path.exists(old_path):
-                        try:
-                            os.remove(old_path)
-                        except:
-                            pass
-                
-                # บันทึก path ใหม่
-                relative_path = f"uploads/product/{new_filename}"
-                cur.execute("UPDATE products SET image = %s WHERE id = %s", (relative_path, product_id))
-                conn.commit()
+        from pyhon import get_connection, bump_catalog_version
+        try:
+            with get_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT image FROM products WHERE id = %s FOR UPDATE", (product_id,))
+                    old_image = cur.fetchone()
+                    # สินค้าถูกลบหลังตรวจด้านบน: ห้าม store (reference ของ blob จะไม่มีวันลดลงถึง 0)
+                    if old_image is None:
+                        return jsonify({"error": "ไม่พบสินค้า"}), 404
+                    relative_path = blob_store.store(cur, pending)
+                    cur.execute("UPDATE products SET image = %s WHERE id = %s", (relative_path, product_id))
+                    # รูปเก่าไม่ถูกลบตรงนี้: ลด reference แล้วให้ GC ลบเมื่อไม่มีใครใช้
+                    release_blob(cur, old_image[0])
+                    bump_catalog_version(cur, CATALOG_PRODUCTS)
+                    conn.commit()
+        finally:
+            blob_store.discard(pending)
+        filepath = blob_store.absolute_path(relative_path)
         
+        # ย่อรูปใน background — ระหว่างนี้ URL รูปย่อจะได้ไฟล์ต้นฉบับแทน
+        image_pipeline.schedule(filepath)
         return jsonify({
             "success": True,
             "message": "อัปโหลดรูปสำเร็จ",
-            "image": relative_path
+            "image": relative_path,
+            "images": image_pipeline.image_set(relative_path)
         }), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
-@app.get("/static/uploads/product/<filename>")
+@app.get("/static/uploads/product/<path:filename>")
 def uploaded_product_file(filename):
     """Serve uploaded product images"""
-    return send_from_directory(app.config['UPLOAD_FOLDER_PRODUCT'], filename)
+    return _send_upload(app.config['UPLOAD_FOLDER_PRODUCT'], filename)
 
 
 @app.get("/api/admin/products")
@@ -576,7 +948,7 @@ def api_admin_products_list():
         return err[0], err[1]
     try:
         products = list_products(user)
-        return jsonify([{"id": p.id, "name": p.name, "price": p.price, "stock": p.stock, "image": _normalize_image_path(p.image), "description": p.description, "category": p.category, "price_type": p.price_type} for p in products])
+        return jsonify([product_json(p) for p in products])
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
@@ -602,7 +974,7 @@ def api_admin_products_create():
         return jsonify({"error": "กรุณากรอกชื่อสินค้า"}), 400
     try:
         p = create_product(user, name=name, price=price, stock=stock, description=description, category=category, price_type=price_type)
-        return jsonify({"id": p.id, "name": p.name, "price": p.price, "stock": p.stock, "image": _normalize_image_path(p.image), "description": p.description, "category": p.category, "price_type": p.price_type}), 201
+        return jsonify(product_json(p)), 201
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
@@ -633,7 +1005,7 @@ def api_admin_products_update(product_id):
         return jsonify({"error": "stock ต้องเป็นจำนวนเต็มที่ถูกต้อง"}), 400
     try:
         p = update_product(user, str(product_id), name=name, price=price, stock=stock, description=description, category=category, price_type=price_type)
-        return jsonify({"id": p.id, "name": p.name, "price": p.price, "stock": p.stock, "image": _normalize_image_path(p.image), "description": p.description, "category": p.category, "price_type": p.price_type})
+        return jsonify(product_json(p))
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
@@ -652,28 +1024,55 @@ def api_admin_products_delete(product_id):
 
 # ========== Product Reviews API ==========
 
+def _wants_review_product(args):
+    """?include=product — ให้ join ข้อมูลสินค้า (ชื่อ/รูป/คำอธิบายสั้น) มากับรีวิวเลย"""
+    return "product" in (args.get("include") or "").split(",")
+
+
+def _render_review_cards(cards, next_cursor) -> bytes:
+    for card in cards:
+        if card["product"]:
+            card["product"]["image"] = normalize_image_path(card["product"]["image"])
+    return dumps({"items": cards, "next_cursor": next_cursor})
+
+
+def _build_reviews_public():
+    guest = User(id=0, username="guest", phone=None, password_hash="", role="customer")
+    product_id = request.args.get("product_id", type=int)
+    if _wants_review_product(request.args):
+        cards, next_cursor = list_review_cards(
+            product_id=product_id,
+            limit=request.args.get("limit", type=int),
+            cursor=request.args.get("cursor") or None,
+        )
+        return _render_review_cards(cards, next_cursor)
+    paged = _wants_page(request.args)
+    if paged:
+        items, next_cursor = list_reviews_page(
+            guest,
+            product_id=product_id,
+            limit=request.args.get("limit", type=int),
+            cursor=request.args.get("cursor") or None,
+            row_to=review_row_json,
+        )
+    else:
+        items, next_cursor = list_reviews(guest, product_id=product_id, row_to=review_row_json), None
+    return page_body(items, next_cursor, paged)
+
+
 @app.get("/api/reviews")
+@_catalog_cached(CATALOG_REVIEWS, CATALOG_PRODUCTS)
 def api_reviews_public():
-    """รายการรีวิวสินค้าสำหรับแสดงบนเว็บ brand (ไม่ต้องล็อกอิน)"""
+    """
+    รายการรีวิวสินค้าสำหรับแสดงบนเว็บ brand (ไม่ต้องล็อกอิน) — ตอบจาก catalog cache ถ้ามี
+    ?include=product&limit=N ได้ N รีวิวล่าสุดพร้อมข้อมูลสินค้า (แบ่งหน้าด้วย cursor เสมอ)
+    """
     try:
-        guest = User(id=0, username="guest", phone=None, password_hash="", role="customer")
-        product_id = request.args.get("product_id", type=int)
-        reviews = list_reviews(guest, product_id=product_id)
-        return jsonify([
-            {
-                "id": r.id,
-                "product_id": r.product_id,
-                "customer_name": r.customer_name,
-                "customer_phone": r.customer_phone,
-                "customer_facebook": r.customer_facebook,
-                "customer_instagram": r.customer_instagram,
-                "rating": r.rating,
-                "comment": r.comment,
-                "images": r.images,
-                "created_at": r.created_at
-            }
-            for r in reviews
-        ])
+        names = (CATALOG_REVIEWS, CATALOG_PRODUCTS) if _wants_review_product(request.args) else CATALOG_REVIEWS
+        body = get_catalog_cache().get_or_build(names, request.query_string, _build_reviews_public)
+        return app.response_class(body, mimetype="application/json")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -719,14 +1118,7 @@ def api_reviews_create_by_customer():
             comment=comment,
             images=images,
         )
-        return jsonify({
-            "id": r.id,
-            "product_id": r.product_id,
-            "customer_name": r.customer_name,
-            "rating": r.rating,
-            "comment": r.comment,
-            "created_at": r.created_at,
-        }), 201
+        return jsonify(review_json(r)), 201
     except ValueError as e:
         return jsonify({"error": str(e)}), 400
     except Exception as e:
@@ -759,28 +1151,13 @@ def api_reviews_update_rating(review_id):
 
 @app.get("/api/admin/reviews")
 def api_admin_reviews_list():
-    """รายการรีวิวทั้งหมด (Admin)"""
+    """รายการรีวิวทั้งหมด (Admin) — stream จาก DB; ?format=ndjson|csv สำหรับดาวน์โหลด"""
     user, err = _require_admin()
     if err:
         return err[0], err[1]
     try:
         product_id = request.args.get("product_id", type=int)
-        reviews = list_reviews(user, product_id=product_id)
-        return jsonify([
-            {
-                "id": r.id,
-                "product_id": r.product_id,
-                "customer_name": r.customer_name,
-                "customer_phone": r.customer_phone,
-                "customer_facebook": r.customer_facebook,
-                "customer_instagram": r.customer_instagram,
-                "rating": r.rating,
-                "comment": r.comment,
-                "images": r.images,
-                "created_at": r.created_at
-            }
-            for r in reviews
-        ])
+        return _export_response(iter_reviews(user, product_id=product_id), review_row_json, REVIEW_FIELDS, "reviews")
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
@@ -820,18 +1197,7 @@ def api_admin_reviews_create():
             comment=comment,
             images=images
         )
-        return jsonify({
-            "id": r.id,
-            "product_id": r.product_id,
-            "customer_name": r.customer_name,
-            "customer_phone": r.customer_phone,
-            "customer_facebook": r.customer_facebook,
-            "customer_instagram": r.customer_instagram,
-            "rating": r.rating,
-            "comment": r.comment,
-            "images": r.images,
-            "created_at": r.created_at
-        }), 201
+        return jsonify(review_json(r)), 201
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
@@ -865,18 +1231,7 @@ def api_admin_reviews_update(review_id):
             comment=comment,
             images=images
         )
-        return jsonify({
-            "id": r.id,
-            "product_id": r.product_id,
-            "customer_name": r.customer_name,
-            "customer_phone": r.customer_phone,
-            "customer_facebook": r.customer_facebook,
-            "customer_instagram": r.customer_instagram,
-            "rating": r.rating,
-            "comment": r.comment,
-            "images": r.images,
-            "created_at": r.created_at
-        })
+        return jsonify(review_json(r))
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
@@ -896,12 +1251,12 @@ def api_admin_reviews_delete(review_id):
 
 @app.get("/api/admin/customers")
 def api_admin_customers_list():
+    """รายการ customer (Admin) — stream จาก DB; ?format=ndjson|csv สำหรับดาวน์โหลด"""
     user, err = _require_admin()
     if err:
         return err[0], err[1]
     try:
-        customers = list_customers(user)
-        return jsonify([{"id": u.id, "username": u.username, "phone": u.phone, "role": u.role} for u in customers])
+        return _export_response(iter_customers(user), user_row_json, USER_FIELDS, "customers")
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
@@ -931,7 +1286,7 @@ def api_admin_admins_create():
         return jsonify({"error": "กรุณากรอก username และ password"}), 400
     try:
         u = register(username=username, password=password, role="admin", phone=phone)
-        return jsonify({"id": u.id, "username": u.username, "phone": u.phone, "role": u.role}), 201
+        return jsonify(user_json(u)), 201
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
@@ -943,7 +1298,7 @@ def api_admin_admins_list():
         return err[0], err[1]
     try:
         admins = list_admins(user)
-        return jsonify([{"id": u.id, "username": u.username, "role": u.role} for u in admins])
+        return jsonify([user_json(u) for u in admins])
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
@@ -1337,5 +1692,9 @@ def method_not_allowed(e):
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
     debug = os.environ.get("FLASK_DEBUG", "false").lower() in ("1", "true", "yes")
+    try:
+        initialize_database()
+    except Exception as e:
+        logger.warning(f"Database initialization warning: {e}")
     app.run(host="0.0.0.0", port=port, debug=debug)
 
@@ -0,0 +1,274 @@
+"""
+โหมด ASGI ของ CHAMPA (รันด้วย uvicorn แทน gunicorn sync worker)
+
+    uvicorn asgi:app --host 0.0.0.0 --port $PORT --workers 2
+    # หรือ gunicorn asgi:app -k uvicorn.workers.UvicornWorker --workers 2 --bind 0.0.0.0:$PORT
+
+- API สาธารณะที่ถูกเรียกบ่อย (GET /api/products, /api/products/facets, /api/products/<id>/rating, /api/reviews, /api/search, /api/search/suggest) ตอบแบบ async
+  อ่าน DB ผ่าน pyhon_async (psycopg 3) — รอ DB ด้วย await จึงรับ request พร้อมกันได้มากกว่าจำนวน worker
+- route อื่นทั้งหมด (admin, upload, หน้าเว็บ) ส่งต่อให้ Flask app เดิมใน thread pool (ASGI_WSGI_THREADS)
+  request ที่ช้าจะถือแค่ thread หนึ่ง ไม่ใช่ทั้ง worker
+- ETag / 304 / catalog cache ใช้ชุดเดียวกับโหมด WSGI (app.py, catalog_cache.py)
+"""
+import asyncio
+import logging
+import os
+import re
+from urllib.parse import parse_qsl
+
+from a2wsgi import WSGIMiddleware
+from werkzeug.datastructures import MultiDict
+from werkzeug.http import http_date, parse_date, parse_etags
+
+import compression
+import pyhon_async as db
+from app import (
+    CATALOG_CACHE_CONTROL,
+    SUGGEST_CACHE_CONTROL,
+    _catalog_validators,
+    _render_review_cards,
+    _wants_page,
+    _wants_review_product,
+    app as flask_app,
+)
+from catalog_cache import get_catalog_cache
+from suggest_index import get_suggest_index
+from pyhon import CATALOG_PRODUCTS, CATALOG_REVIEWS, User, parse_product_filters
+from serialization import dumps, page_body, product_row_json, review_row_json
+
+logger = logging.getLogger(__name__)
+
+# จำนวน thread ต่อ worker ที่รัน route ของ Flask (ควรไม่เกิน DB_POOL_MAX ของ pool psycopg2)
+ASGI_WSGI_THREADS = int(os.environ.get("ASGI_WSGI_THREADS", "8"))
+
+_wsgi = WSGIMiddleware(flask_app, workers=ASGI_WSGI_THREADS)
+
+
+# ==========================
+#  Response helpers
+# ==========================
+
+
+async def _send(send, status: int, body: bytes = b"", headers=(), head_only: bool = False) -> None:
+    raw_headers = [(k.encode("latin-1"), v.encode("latin-1")) for k, v in headers]
+    if status != 304:
+        raw_headers.append((b"content-type", b"application/json"))
+        raw_headers.append((b"content-length", str(len(body)).encode("ascii")))
+    await send({"type": "http.response.start", "status": status, "headers": raw_headers})
+    await send({"type": "http.response.body", "body": b"" if head_only or status == 304 else body})
+
+
+def _error_body(message: str) -> bytes:
+    return dumps({"error": message})
+
+
+def _not_modified(headers: dict, etag: str, last_modified: int) -> bool:
+    """ตรรกะเดียวกับ _catalog_cached ของ app.py: If-None-Match ก่อน ถ้าไม่มีค่อยดู If-Modified-Since"""
+    if_none_match = headers.get("if-none-match")
+    if if_none_match:
+        return parse_etags(if_none_match).contains_weak(etag)
+    ims = parse_date(headers.get("if-modified-since"))
+    return ims is not None and last_modified <= ims.timestamp()
+
+
+async def _serve_catalog(scope, send, etag_names, cache_names, variant: bytes, builder, value_error_status: int = 400):
+    """ETag/304 + catalog cache + error เหมือน route ใน app.py แต่ build body แบบ async"""
+    headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope["headers"]}
+    head_only = scope["method"] == "HEAD"
+    cache = get_catalog_cache()
+    validators = []
+    try:
+        versions = await cache.aversions(db.get_catalog_versions)
+    except Exception:
+        versions = None
+    if versions is not None:
+        etag, last_modified = _catalog_validators(etag_names, versions, scope["query_string"])
+        validators = [
+            ("etag", f'W/"{etag}"'),
+            ("last-modified", http_date(last_modified)),
+            ("cache-control", CATALOG_CACHE_CONTROL),
+        ]
+        if _not_modified(headers, etag, last_modified):
+            await _send(send, 304, headers=validators)
+            return
+    try:
+        body = await cache.aget_or_build(cache_names, variant, builder)
+    except ValueError as e:
+        await _send(send, value_error_status, _error_body(str(e)), head_only=head_only)
+        return
+    except Exception as e:
+        await _send(send, 500, _error_body(str(e)), head_only=head_only)
+        return
+    # gzip/brotli เหมือน CompressionMiddleware ของโหมด WSGI (ใช้ cache ของ body ที่บีบแล้วก้อนเดียวกัน)
+    response_headers = validators + [("vary", "Accept-Encoding")]
+    encoding = compression.negotiate(headers.get("accept-encoding"))
+    if encoding is not None and not head_only and len(body) >= compression.COMPRESS_MIN_SIZE:
+        cache_key = (scope["path"], scope["query_string"].decode("latin-1"), validators[0][1]) if validators else None
+        body = compression.encode_body(body, encoding, cache_key)
+        response_headers.append(("content-encoding", encoding))
+    await _send(send, 200, body, headers=response_headers, head_only=head_only)
+
+
+# ==========================
+#  Async routes (API สาธารณะ)
+# ==========================
+
+
+def _args(scope) -> MultiDict:
+    return MultiDict(parse_qsl(scope["query_string"].decode("latin-1"), keep_blank_values=True))
+
+
+async def api_products_public(scope, send) -> None:
+    args = _args(scope)
+    guest = User(id=0, username="guest", phone=None, password_hash="", role="customer")
+
+    async def build() -> bytes:
+        paged = _wants_page(args)
+        filters = parse_product_filters(args)
+        if paged:
+            items, next_cursor = await db.list_products_page(
+                guest,
+                limit=args.get("limit", type=int),
+                cursor=args.get("cursor") or None,
+                row_to=product_row_json,
+                filters=filters,
+            )
+        else:
+            items, next_cursor = await db.list_products(guest, row_to=product_row_json, filters=filters), None
+        return page_body(items, next_cursor, paged)
+
+    names = (CATALOG_PRODUCTS, CATALOG_REVIEWS)
+    await _serve_catalog(scope, send, names, names, scope["query_string"], build)
+
+
+async def api_product_facets_public(scope, send) -> None:
+    args = _args(scope)
+    guest = User(id=0, username="guest", phone=None, password_hash="", role="customer")
+
+    async def build() -> bytes:
+        return dumps(await db.product_facets(guest, parse_product_filters(args)))
+
+    names = (CATALOG_PRODUCTS,)
+    await _serve_catalog(scope, send, names, names, b"facets?" + scope["query_string"], build)
+
+
+async def api_search_public(scope, send) -> None:
+    args = _args(scope)
+    guest = User(id=0, username="guest", phone=None, password_hash="", role="customer")
+
+    async def build() -> bytes:
+        items, next_cursor = await db.search_products(
+            guest,
+            args.get("q", ""),
+            limit=args.get("limit", type=int),
+            cursor=args.get("cursor") or None,
+            row_to=product_row_json,
+        )
+        return page_body(items, next_cursor, True)
+
+    names = (CATALOG_PRODUCTS, CATALOG_REVIEWS)
+    await _serve_catalog(scope, send, names, names, b"search?" + scope["query_string"], build)
+
+
+async def api_search_suggest(scope, send) -> None:
+    args = _args(scope)
+    index = get_suggest_index()
+    try:
+        if index.ready:
+            items = index.suggest(args.get("q"), args.get("limit", type=int))
+        else:
+            # ครั้งแรกของ worker ต้องอ่าน DB (psycopg2): ทำใน thread ไม่ให้ event loop ค้าง
+            items = await asyncio.get_running_loop().run_in_executor(
+                None, index.suggest, args.get("q"), args.get("limit", type=int)
+            )
+    except Exception as e:
+        await _send(send, 500, _error_body(str(e)), head_only=scope["method"] == "HEAD")
+        return
+    await _send(
+        send, 200, dumps(items), headers=[("cache-control", SUGGEST_CACHE_CONTROL)], head_only=scope["method"] == "HEAD"
+    )
+
+
+async def api_product_rating(scope, send, product_id: int) -> None:
+    async def build() -> bytes:
+        return dumps(await db.get_product_rating(product_id))
+
+    await _serve_catalog(
+        scope, send, (CATALOG_REVIEWS,), CATALOG_REVIEWS, f"rating:{product_id}".encode("ascii"), build, 404
+    )
+
+
+async def api_reviews_public(scope, send) -> None:
+    args = _args(scope)
+    guest = User(id=0, username="guest", phone=None, password_hash="", role="customer")
+    product_id = args.get("product_id", type=int)
+    with_product = _wants_review_product(args)
+
+    async def build() -> bytes:
+        if with_product:
+            cards, next_cursor = await db.list_review_cards(
+                product_id=product_id,
+                limit=args.get("limit", type=int),
+                cursor=args.get("cursor") or None,
+            )
+            return _render_review_cards(cards, next_cursor)
+        paged = _wants_page(args)
+        if paged:
+            items, next_cursor = await db.list_reviews_page(
+                guest,
+                product_id=product_id,
+                limit=args.get("limit", type=int),
+                cursor=args.get("cursor") or None,
+                row_to=review_row_json,
+            )
+        else:
+            items, next_cursor = await db.list_reviews(guest, product_id=product_id, row_to=review_row_json), None
+        return page_body(items, next_cursor, paged)
+
+    cache_names = (CATALOG_REVIEWS, CATALOG_PRODUCTS) if with_product else CATALOG_REVIEWS
+    await _serve_catalog(scope, send, (CATALOG_REVIEWS, CATALOG_PRODUCTS), cache_names, scope["query_string"], build)
+
+
+# (pattern, handler) — เฉพาะ GET/HEAD; method อื่น (เช่น POST /api/reviews) ไปที่ Flask
+_ASYNC_ROUTES = [
+    (re.compile(r"/api/products"), api_products_public),
+    (re.compile(r"/api/products/facets"), api_product_facets_public),
+    (re.compile(r"/api/products/(\d+)/rating"), api_product_rating),
+    (re.compile(r"/api/search"), api_search_public),
+    (re.compile(r"/api/search/suggest"), api_search_suggest),
+    (re.compile(r"/api/reviews"), api_reviews_public),
+]
+
+
+# ==========================
+#  ASGI app
+# ==========================
+
+
+async def _lifespan(receive, send) -> None:
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            try:
+                await db.open_pool()
+            except Exception as e:
+                # DB ยังไม่พร้อมก็ให้ start ได้ (pool จะเปิดใหม่ตอนมี request) — /health บอกสถานะ
+                logger.warning("async pool open failed: %s", e)
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await db.close_pool()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send) -> None:
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+    if scope["type"] == "http" and scope["method"] in ("GET", "HEAD"):
+        for pattern, handler in _ASYNC_ROUTES:
+            match = pattern.fullmatch(scope["path"])
+            if match:
+                await handler(scope, send, *(int(g) for g in match.groups()))
+                return
+    await _wsgi(scope, receive, send)
@@ -0,0 +1,226 @@
+"""
+ที่เก็บไฟล์อัปโหลดแบบ content-addressed
+
+- ชื่อไฟล์คือ SHA-256 ของเนื้อไฟล์: uploads/<kind>/ab/cd/abcd…ef.png (แบ่งโฟลเดอร์ 2 ชั้นไม่ให้โฟลเดอร์เดียวมีไฟล์มากเกินไป)
+  รูปเดียวกันอัปโหลดซ้ำกี่ครั้งก็เก็บไฟล์เดียว และ URL ไม่มีวันเปลี่ยนเนื้อหา จึง cache แบบ immutable ได้
+- จำนวนแถวที่อ้างถึงแต่ละไฟล์อยู่ในตาราง upload_blobs (pyhon.acquire_blob / release_blob)
+  request ไม่ลบไฟล์เอง ไฟล์ที่ไม่มีใครอ้างถึงนานเกิน BLOB_GC_GRACE จะถูกลบโดย collect_garbage
+  (`flask --app app gc-uploads` จาก cron)
+"""
+import hashlib
+import logging
+import os
+import re
+import shutil
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Optional
+
+import image_pipeline
+from pyhon import acquire_blob, get_connection
+
+logger = logging.getLogger(__name__)
+
+STATIC_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+BLOB_KINDS = ("profile", "product")
+# ไฟล์ที่ refcount เป็น 0 ต้องรอนานเท่านี้ก่อนถูกลบ (เผื่อ response/หน้าเว็บที่ยังอ้าง URL เดิมอยู่)
+BLOB_GC_GRACE = float(os.environ.get("BLOB_GC_GRACE", "86400"))
+BLOB_GC_BATCH = int(os.environ.get("BLOB_GC_BATCH", "500"))
+_CHUNK_SIZE = 64 * 1024
+_INCOMING_DIR = ".incoming"
+
+_BLOB_NAME_RE = re.compile(r"^[0-9a-f]{64}\.[a-z0-9]+$")
+
+
+@dataclass
+class PendingBlob:
+    """ไฟล์ที่เขียนลง temp แล้ว (คำนวณ hash ระหว่างเขียน) รอย้ายเข้าที่ใน transaction"""
+
+    kind: str
+    tmp_path: str
+    digest: str
+    size: int
+    ext: str
+
+    @property
+    def relative_path(self) -> str:
+        return f"uploads/{self.kind}/{self.digest[:2]}/{self.digest[2:4]}/{self.digest}.{self.ext}"
+
+
+def absolute_path(relative_path: str) -> str:
+    """path จริงบนดิสก์ของ path ที่เก็บใน DB (กัน path ที่หลุดออกนอก static/uploads)"""
+    path = os.path.normpath(os.path.join(STATIC_ROOT, relative_path))
+    if not path.startswith(os.path.join(STATIC_ROOT, "uploads") + os.sep):
+        raise ValueError(f"path อยู่นอก uploads: {relative_path}")
+    return path
+
+
+class BlobWriter:
+    """
+    เขียนไฟล์ลง temp (filesystem เดียวกับปลายทาง) ทีละก้อนพร้อมคำนวณ SHA-256 — ใช้ memory แค่ก้อนที่ส่งเข้ามา
+    อ่านกลับได้ (read/seek) จนกว่าจะ finish() หรือ abort()
+    """
+
+    def __init__(self, kind: str):
+        if kind not in BLOB_KINDS:
+            raise ValueError(f"kind ไม่รองรับ: {kind}")
+        incoming = os.path.join(STATIC_ROOT, "uploads", kind, _INCOMING_DIR)
+        os.makedirs(incoming, exist_ok=True)
+        self.kind = kind
+        self.tmp_path = os.path.join(incoming, uuid.uuid4().hex)
+        self.file = open(self.tmp_path, "w+b")
+        self.size = 0
+        self._digest = hashlib.sha256()
+
+    def write(self, chunk: bytes) -> int:
+        self._digest.update(chunk)
+        self.size += len(chunk)
+        return self.file.write(chunk)
+
+    def finish(self, ext: str) -> PendingBlob:
+        self.file.close()
+        ext = "jpg" if ext == "jpeg" else ext
+        return PendingBlob(kind=self.kind, tmp_path=self.tmp_path, digest=self._digest.hexdigest(), size=self.size, ext=ext)
+
+    def abort(self) -> None:
+        self.file.close()
+        discard_path(self.tmp_path)
+
+
+def write_temp(kind: str, stream, ext: str) -> PendingBlob:
+    """อ่าน stream เป็นก้อน ๆ เขียนลง temp พร้อมคำนวณ SHA-256"""
+    writer = BlobWriter(kind)
+    try:
+        for chunk in iter(lambda: stream.read(_CHUNK_SIZE), b""):
+            writer.write(chunk)
+    except BaseException:
+        writer.abort()
+        raise
+    return writer.finish(ext)
+
+
+def pending_from_file(kind: str, path: str, ext: str) -> PendingBlob:
+    """รับไฟล์ที่เขียนเสร็จแล้วที่อื่น (เช่น resumable upload) เข้ามาเป็น PendingBlob — ไฟล์ต้นทางถูกย้าย"""
+    writer = BlobWriter(kind)
+    writer.file.close()
+    shutil.move(path, writer.tmp_path)
+    digest = hashlib.sha256()
+    with open(writer.tmp_path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    ext = "jpg" if ext == "jpeg" else ext
+    return PendingBlob(
+        kind=kind, tmp_path=writer.tmp_path, digest=digest.hexdigest(), size=os.path.getsize(writer.tmp_path), ext=ext
+    )
+
+
+def store(cur, pending: PendingBlob) -> str:
+    """
+    เพิ่ม reference แล้วย้ายไฟล์เข้าที่ (ถ้ามีไฟล์เนื้อหาเดียวกันอยู่แล้วใช้ไฟล์เดิม) — คืน path สำหรับบันทึกลง DB
+    ย้ายไฟล์หลัง acquire_blob เพราะแถวถูก lock แล้ว GC จะไม่ลบไฟล์นี้ระหว่าง transaction
+    """
+    relative_path = pending.relative_path
+    acquire_blob(cur, relative_path, pending.size)
+    final_path = absolute_path(relative_path)
+    if os.path.exists(final_path):
+        discard(pending)
+    else:
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        os.replace(pending.tmp_path, final_path)
+    return relative_path
+
+
+def discard(pending: Optional[PendingBlob]) -> None:
+    """ลบ temp ที่ยังไม่ถูกย้ายเข้าที่ (เรียกซ้ำได้)"""
+    if pending is not None:
+        discard_path(pending.tmp_path)
+
+
+def discard_path(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+# ==========================
+#  Garbage Collection
+# ==========================
+
+
+def _collect_orphans(grace: float, batch: int) -> int:
+    """ลบไฟล์ที่ refcount เป็น 0 นานเกิน grace (lock แถวไว้ระหว่างลบ upload ที่อ้างไฟล์เดียวกันจะรอจนเสร็จ)"""
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT path FROM upload_blobs
+                WHERE refcount = 0 AND orphaned_at < NOW() - make_interval(secs => %s)
+                ORDER BY orphaned_at
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+                """,
+                (grace, batch),
+            )
+            paths = [row[0] for row in cur.fetchall()]
+            for path in paths:
+                try:
+                    image_pipeline.remove_with_variants(absolute_path(path))
+                except ValueError as e:
+                    logger.warning("blob gc: ข้าม %s", e)
+            if paths:
+                cur.execute("DELETE FROM upload_blobs WHERE path = ANY(%s)", (paths,))
+    return len(paths)
+
+
+def _adopt_untracked(grace: float) -> int:
+    """
+    ไฟล์ที่ไม่มีแถวใน upload_blobs (transaction ถูก rollback หลังย้ายไฟล์แล้ว) ถูกบันทึกเป็นไฟล์กำพร้า
+    ให้ _collect_orphans ลบรอบถัดไปภายใต้ lock เดียวกับ upload — ไม่ลบตรงนี้ เพราะ upload อาจกำลังอ้างไฟล์เดิมอยู่
+    temp ที่ค้างเก่ากว่า grace ลบได้เลย (ชื่อสุ่ม ไม่มีใครอ้าง)
+    """
+    cutoff = time.time() - grace
+    adopted = 0
+    for kind in BLOB_KINDS:
+        root = os.path.join(STATIC_ROOT, "uploads", kind)
+        incoming = os.path.join(root, _INCOMING_DIR)
+        if os.path.isdir(incoming):
+            for name in os.listdir(incoming):
+                path = os.path.join(incoming, name)
+                if os.path.getmtime(path) < cutoff:
+                    discard_path(path)
+        candidates = []
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = [d for d in dirnames if d != _INCOMING_DIR]
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                if _BLOB_NAME_RE.match(name) and os.path.getmtime(path) < cutoff:
+                    candidates.append(os.path.relpath(path, STATIC_ROOT).replace(os.sep, "/"))
+        if not candidates:
+            continue
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    INSERT INTO upload_blobs (path, refcount, orphaned_at)
+                    SELECT unnest(%s::text[]), 0, NOW()
+                    ON CONFLICT (path) DO NOTHING
+                    """,
+                    (candidates,),
+                )
+                adopted += cur.rowcount
+    return adopted
+
+
+def collect_garbage(grace: Optional[float] = None, batch: Optional[int] = None) -> dict:
+    """ลบไฟล์อัปโหลดที่ไม่มีใครอ้างถึงแล้ว — คืนจำนวนไฟล์ที่ลบ และจำนวนไฟล์ไม่มีแถวที่รอลบรอบถัดไป"""
+    grace = BLOB_GC_GRACE if grace is None else grace
+    batch = BLOB_GC_BATCH if batch is None else batch
+    orphans = 0
+    while True:
+        count = _collect_orphans(grace, batch)
+        orphans += count
+        if count < batch:
+            break
+    return {"removed": orphans, "adopted": _adopt_untracked(grace)}
@@ -0,0 +1,252 @@
+import logging
+import os
+import select
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Deque, Dict, FrozenSet, Optional, Set, Tuple
+
+from pyhon import (
+    CATALOG_CHANNEL,
+    _connect,
+    get_catalog_versions,
+    on_catalog_change,
+    parse_catalog_payload,
+)
+
+logger = logging.getLogger(__name__)
+
+
+# ==========================
+#  Catalog Cache (เก็บ JSON ที่ serialize แล้วของ API สาธารณะไว้ในหน่วยความจำ)
+# ==========================
+
+CATALOG_CACHE_TTL = float(os.environ.get("CATALOG_CACHE_TTL", "300"))  # กันพลาดกรณีไม่ได้รับ NOTIFY
+CATALOG_CACHE_MAX_ENTRIES = int(os.environ.get("CATALOG_CACHE_MAX_ENTRIES", "256"))
+CATALOG_LISTEN_RETRY = 5.0  # วินาทีก่อนต่อ LISTEN ใหม่เมื่อหลุด
+CATALOG_LISTEN_PING = 30.0  # ถ้าเงียบนานเท่านี้ให้ SELECT 1 เช็คว่า connection ยังอยู่
+CATALOG_CHANGE_LOG = 256  # จำนวน generation ล่าสุดต่อชื่อที่จำ id ที่เปลี่ยนไว้ (ดู changed_ids)
+
+
+class CatalogCache:
+    """
+    Read-through cache ของ body (bytes) แยกตามชื่อ catalogue ที่ body นั้นขึ้นอยู่ + variant (query string)
+    - ล้างเมื่อ process นี้เขียนข้อมูล (hook จาก pyhon) และเมื่อได้ NOTIFY จาก worker อื่น
+    - มี generation ต่อชื่อ กันกรณีอ่านข้อมูลเก่าค้างอยู่แล้วมาเขียนทับหลังถูกล้าง
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[Tuple[str, ...], bytes], Tuple[bytes, float]]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        # ชื่อ -> [(generation, id ที่เปลี่ยน หรือ None = ไม่รู้)] ล่าสุด
+        self._changes: Dict[str, Deque[Tuple[int, Optional[FrozenSet[int]]]]] = {}
+        self._versions: Optional[Tuple[Dict, float, int]] = None  # (versions, expires_at, generation รวม)
+        self._generation_total = 0
+        self.hits = 0
+        self.misses = 0
+        self.version_hits = 0
+        self.version_misses = 0
+        self.invalidations = 0
+        self.listening = False
+
+    def _generation_of(self, names: Tuple[str, ...]) -> Tuple[int, ...]:
+        return tuple(self._generations.get(n, 0) for n in names)
+
+    def _lookup(self, key, now: float):
+        """คืน (body หรือ None, generation ตอนอ่าน) — generation ใช้ตอนเก็บผลที่ build ใหม่"""
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None and item[1] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return item[0], None
+            self.misses += 1
+            return None, self._generation_of(key[0])
+
+    def _store(self, key, generation: Tuple[int, ...], body: bytes, now: float) -> None:
+        with self._lock:
+            if self._generation_of(key[0]) == generation:
+                self._entries[key] = (body, now + self.ttl)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+    @staticmethod
+    def _key(names, variant: bytes):
+        names = (names,) if isinstance(names, str) else tuple(names)
+        return (names, variant)
+
+    def get_or_build(self, names, variant: bytes, builder: Callable[[], bytes]) -> bytes:
+        """names: ชื่อ catalogue เดียว หรือ tuple ของทุกชื่อที่ body นี้ขึ้นอยู่ (ถูกล้างเมื่อชื่อใดชื่อหนึ่งเปลี่ยน)"""
+        key = self._key(names, variant)
+        now = time.monotonic()
+        body, generation = self._lookup(key, now)
+        if body is None:
+            body = builder()
+            self._store(key, generation, body, now)
+        return body
+
+    async def aget_or_build(self, names, variant: bytes, builder: Callable[[], Awaitable[bytes]]) -> bytes:
+        """เหมือน get_or_build แต่ builder เป็น coroutine (โหมด ASGI) — ใช้ cache ก้อนเดียวกัน"""
+        key = self._key(names, variant)
+        now = time.monotonic()
+        body, generation = self._lookup(key, now)
+        if body is None:
+            body = await builder()
+            self._store(key, generation, body, now)
+        return body
+
+    def _cached_versions(self, now: float):
+        with self._lock:
+            cached = self._versions
+            if cached is not None and cached[1] > now and cached[2] == self._generation_total:
+                self.version_hits += 1
+                return cached[0], None
+            self.version_misses += 1
+            return None, self._generation_total
+
+    def _store_versions(self, versions: Dict, generation: int, now: float) -> None:
+        with self._lock:
+            if self._generation_total == generation:
+                self._versions = (versions, now + self.ttl, generation)
+
+    def versions(self) -> Dict[str, Tuple[int, float]]:
+        """version ของ catalogue (สำหรับ ETag) — อ่านจาก DB เฉพาะตอน cache ถูกล้างหรือหมดอายุ"""
+        now = time.monotonic()
+        versions, generation = self._cached_versions(now)
+        if versions is None:
+            versions = get_catalog_versions()
+            self._store_versions(versions, generation, now)
+        return versions
+
+    async def aversions(self, fetch: Callable[[], Awaitable[Dict]]) -> Dict[str, Tuple[int, float]]:
+        """เหมือน versions แต่อ่าน DB ด้วย coroutine ที่ส่งมา (เช่น pyhon_async.get_catalog_versions)"""
+        now = time.monotonic()
+        versions, generation = self._cached_versions(now)
+        if versions is None:
+            versions = await fetch()
+            self._store_versions(versions, generation, now)
+        return versions
+
+    def invalidate(self, *names: str, ids: Optional[FrozenSet[int]] = None) -> None:
+        """ล้าง cache ของชื่อที่ระบุ — ids: id ของแถวที่เปลี่ยน (ถ้ารู้) ให้ changed_ids ตอบได้"""
+        with self._lock:
+            for name in names:
+                generation = self._generations.get(name, 0) + 1
+                self._generations[name] = generation
+                log = self._changes.setdefault(name, deque(maxlen=CATALOG_CHANGE_LOG))
+                log.append((generation, ids))
+                for key in [k for k in self._entries if name in k[0]]:
+                    del self._entries[key]
+            self._generation_total += 1
+            self._versions = None
+            self.invalidations += 1
+
+    def generation(self, name: str) -> int:
+        """เพิ่มทุกครั้งที่ name ถูกล้าง — ให้ index อื่นในหน่วยความจำ (suggest_index) รู้ว่าต้องโหลดใหม่"""
+        with self._lock:
+            return self._generations.get(name, 0)
+
+    def changed_ids(self, name: str, since: int, until: int) -> Optional[Set[int]]:
+        """
+        id ที่เปลี่ยนระหว่าง generation since (ไม่รวม) ถึง until ของ name
+        None = ไม่รู้ (มีการล้างที่ไม่ได้แนบ id หรือเก่าเกินกว่าที่จำไว้) ต้องโหลดใหม่ทั้งหมด
+        """
+        with self._lock:
+            log = self._changes.get(name)
+            if since >= until:
+                return set()
+            if not log or log[0][0] > since + 1:
+                return None
+            changed: Set[int] = set()
+            for generation, ids in log:
+                if since < generation <= until:
+                    if ids is None:
+                        return None
+                    changed |= ids
+            return changed
+
+    def clear(self) -> None:
+        with self._lock:
+            names = {n for k in self._entries for n in k[0]} | set(self._generations)
+        self.invalidate(*names)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else None,
+                "version_hits": self.version_hits,
+                "version_misses": self.version_misses,
+                "invalidations": self.invalidations,
+                "entries": len(self._entries),
+                "listening": self.listening,
+            }
+
+
+def _listen_forever(cache: CatalogCache) -> None:
+    """LISTEN ช่อง catalog_changed ด้วย connection แยก (ไม่ใช้ pool) แล้วล้าง cache ตาม payload"""
+    while True:
+        conn = None
+        try:
+            conn = _connect()
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute(f"LISTEN {CATALOG_CHANNEL}")
+            # ระหว่างที่หลุดอาจพลาด NOTIFY ไป ให้ล้างทั้งหมดก่อน
+            cache.clear()
+            cache.listening = True
+            while True:
+                if select.select([conn], [], [], CATALOG_LISTEN_PING) == ([], [], []):
+                    with conn.cursor() as cur:
+                        cur.execute("SELECT 1")
+                conn.poll()
+                changes: Dict[str, Optional[Set[int]]] = {}
+                while conn.notifies:
+                    name, ids = parse_catalog_payload(conn.notifies.pop(0).payload)
+                    if name in changes and changes[name] is None:
+                        continue
+                    changes[name] = None if ids is None else changes.get(name, set()) | ids
+                for name, ids in changes.items():
+                    cache.invalidate(name, ids=None if ids is None else frozenset(ids))
+        except Exception as e:
+            logger.warning("catalog cache listener error: %s", e)
+        finally:
+            cache.listening = False
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+        time.sleep(CATALOG_LISTEN_RETRY)
+
+
+_CACHE: Optional[CatalogCache] = None
+_CACHE_PID: Optional[int] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_catalog_cache() -> CatalogCache:
+    """cache ของ process นี้ (สร้างใหม่ + เริ่ม listener หลัง gunicorn fork)"""
+    global _CACHE, _CACHE_PID
+    if _CACHE is not None and _CACHE_PID == os.getpid():
+        return _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None or _CACHE_PID != os.getpid():
+            cache = CatalogCache(ttl=CATALOG_CACHE_TTL, max_entries=CATALOG_CACHE_MAX_ENTRIES)
+            threading.Thread(target=_listen_forever, args=(cache,), name="catalog-listener", daemon=True).start()
+            _CACHE, _CACHE_PID = cache, os.getpid()
+        return _CACHE
+
+
+def _invalidate_local(*names: str, ids: Optional[FrozenSet[int]] = None) -> None:
+    if _CACHE is not None and _CACHE_PID == os.getpid():
+        _CACHE.invalidate(*names, ids=ids)
+
+
+on_catalog_change(_invalidate_local)
@@ -150,8 +150,11 @@ const defaultProducts = [
   { id: 6, title: "Runner Pro Blue Wave", price: "LAK 199.000", type: "running", badge: "New", desc: "ເສື້ອວິ່ງລາຍຄື່ນນ້ຳເງິນ ດ້ອດເດັ່ນ ຖ່າຍຮູບສວຍ", image: "images/products/6.jpg" }
 ];
 
-// สินค้าจาก API (เมื่อเปิดผ่าน Flask จะโหลดจาก /api/products)
+// สินค้าจาก API (เมื่อเปิดผ่าน Flask จะโหลดจาก /api/products ทีละหน้า)
 let apiProducts = [];
+var PRODUCTS_PAGE_SIZE = 24;
+var productsNextCursor = null; // cursor ของหน้าถัดไปจาก API (null = โหลดครบแล้ว)
+var productsQuery = ""; // ตัวกรองที่ server ใช้กับ apiProducts (เช่น "category=jersey&price_type=...")
 
 let addedProducts = [];
 try {
@@ -161,7 +164,8 @@ try {
 
 function getAllProducts() {
   // เมื่อมีสินค้าจาก API (เพิ่มจาก Admin) ใช้เป็นรายการหลัก ไม่ปนกับของคงที่ เพื่อให้สินค้าจาก Admin แสดงใน Client
-  if (apiProducts.length > 0) {
+  // กรองที่ server แล้วไม่เจอสักชิ้น = ว่างจริง ไม่ใช่ยังไม่ได้โหลด
+  if (apiProducts.length > 0 || productsQuery) {
     return [...apiProducts, ...addedProducts];
   }
   return [...defaultProducts, ...addedProducts];
@@ -169,6 +173,15 @@ function getAllProducts() {
 
 // ===== Render Products =====
 const grid = document.getElementById("productGrid");
+
+// รูปสินค้าแบบ responsive: ถ้า API ส่งรูปย่อ (WebP/JPEG หลายขนาด) มา ใช้ <picture> + srcset ให้ browser เลือกขนาดเอง
+function productImageTag(p, attrs, sizes) {
+  if (!p.image) return "";
+  const img = `<img src="${p.image}" alt="${p.title}" ${attrs || ""}`;
+  if (!p.imageSrcset) return `${img} />`;
+  return `<picture><source type="image/webp" srcset="${p.imageSrcset.webp}" sizes="${sizes}" />` +
+    `${img} srcset="${p.imageSrcset.jpeg}" sizes="${sizes}" data-full="${p.imageFull}" loading="lazy" decoding="async" /></picture>`;
+}
 function renderProducts(list) {
   if (!grid) return;
   grid.innerHTML = "";
@@ -177,7 +190,7 @@ function renderProducts(list) {
     const card = document.createElement("div");
     card.className = "product";
     const thumbContent = p.image
-      ? `<img src="${p.image}" alt="${p.title}" class="thumb-img" onerror="this.style.display='none'" /><div class="badge">${p.badge || ""}</div>`
+      ? `${productImageTag(p, `class="thumb-img" onerror="this.style.display='none'"`, "(max-width: 600px) 50vw, 300px")}<div class="badge">${p.badge || ""}</div>`
       : `<div class="badge">${p.badge || ""}</div>`;
     card.innerHTML = `
       <div class="thumb">
@@ -250,8 +263,7 @@ function renderProducts(list) {
   listToShow.forEach((p) => {
     const card = document.createElement("div");
     if (isWorkGrid) {
-      const imgSrc = p.image || "";
-      const imgTag = imgSrc ? `<img src="${imgSrc}" alt="${p.title}" onerror="this.style.display='none'" />` : "";
+      const imgTag = productImageTag(p, `onerror="this.style.display='none'"`, "(max-width: 600px) 50vw, 300px");
       const freeTag = (p.badge && (p.badge === "FREE" || p.badge === "ຟຣີ")) ? '<span class="product-card-free">FREE</span>' : "";
       const categoryLabel = getCategoryLabel(p.category || getProductCategory(p.type));
       const collarLabel = p.price_type || "";
@@ -274,7 +286,7 @@ function renderProducts(list) {
     } else {
       card.className = "product";
       const thumbContent = p.image
-        ? `<img src="${p.image}" alt="${p.title}" class="thumb-img" onerror="this.style.display='none'" /><div class="badge">${p.badge || ""}</div>`
+        ? `${productImageTag(p, `class="thumb-img" onerror="this.style.display='none'"`, "(max-width: 600px) 50vw, 300px")}<div class="badge">${p.badge || ""}</div>`
         : `<div class="badge">${p.badge || ""}</div>`;
       const categoryLabel = getCategoryLabel(p.category || getProductCategory(p.type));
       card.innerHTML = `
@@ -289,7 +301,21 @@ function renderProducts(list) {
     grid.appendChild(card);
   });
 
-  if (isWorkGrid && list.length > PRODUCTS_INITIAL && !showAll) {
+  if (isWorkGrid && (showAll || list.length <= PRODUCTS_INITIAL) && productsNextCursor) {
+    // แสดงครบที่โหลดมาแล้ว แต่ API ยังมีหน้าถัดไป
+    var pageWrap = document.createElement("div");
+    pageWrap.className = "products-load-more-wrap";
+    pageWrap.style.gridColumn = "1 / -1";
+    pageWrap.innerHTML = '<button type="button" class="btn ghost products-load-more" id="productsLoadMorePage">ເບິ່ງເພີ່ມ</button>';
+    grid.appendChild(pageWrap);
+    var pageBtn = document.getElementById("productsLoadMorePage");
+    if (pageBtn) {
+      pageBtn.addEventListener("click", function () {
+        pageBtn.disabled = true;
+        loadMoreProducts();
+      });
+    }
+  } else if (isWorkGrid && list.length > PRODUCTS_INITIAL && !showAll) {
     var wrap = document.createElement("div");
     wrap.className = "products-load-more-wrap";
     wrap.style.gridColumn = "1 / -1";
@@ -313,33 +339,46 @@ function renderProducts(list) {
 const chips = document.querySelectorAll(".chip");
 const productsTabs = document.querySelectorAll(".products-tab");
 
-function applyFilter() {
-  let f = "all";
+// ผลค้นหาจาก /api/search ของคำค้นล่าสุด (ค้นทั้ง catalogue ไม่ใช่แค่หน้าที่โหลดมาแล้ว)
+var productSearch = { term: "", items: null };
+
+function filterProductsLocal(list, searchTerm) {
+  return list.filter(function (p) {
+    var title = (p.title || "").toLowerCase();
+    var desc = (p.desc || "").toLowerCase();
+    var cat = (p.category || "").toLowerCase();
+    return title.indexOf(searchTerm) !== -1 || desc.indexOf(searchTerm) !== -1 || cat.indexOf(searchTerm) !== -1;
+  });
+}
+
+// สินค้าที่ตรงคำค้น: ใช้ผลจาก server ถ้ามีแล้ว ไม่งั้น (ยังรอผล / เปิดไฟล์ตรง ๆ ไม่ผ่าน Flask) กรองในเครื่อง
+function searchProductList(searchTerm) {
+  if (productSearch.items && productSearch.term === searchTerm) return productSearch.items;
+  return filterProductsLocal(getAllProducts(), searchTerm);
+}
+
+function activeCategoryFilter() {
   const activeTab = document.querySelector(".products-tab.active");
   const activeChip = document.querySelector(".chip.active");
-  if (activeTab) f = activeTab.dataset.filter || "all";
-  else if (activeChip) f = activeChip.dataset.filter || "all";
-
-  if (grid) grid.removeAttribute("data-show-all");
-  var list = f === "all"
-    ? getAllProducts()
-    : getAllProducts().filter((p) => {
-        const category = p.category || getProductCategory(p.type);
-        return category === f;
-      });
+  if (activeTab) return activeTab.dataset.filter || "all";
+  if (activeChip) return activeChip.dataset.filter || "all";
+  return "all";
+}
+
+function applyFilter(keepShowAll) {
+  const f = activeCategoryFilter();
+
+  if (grid && !keepShowAll) grid.removeAttribute("data-show-all");
   // ถ้าหน้า products มีช่องค้นหาและเลือกคอ ให้กรองตามนั้นด้วย
   var searchInput = document.getElementById("productsSearchInput");
   var collarSelect = document.getElementById("productsCollarSelect");
-  if (searchInput) {
-    var searchTerm = searchInput.value.trim().toLowerCase();
-    if (searchTerm) {
-      list = list.filter(function (p) {
-        var title = (p.title || "").toLowerCase();
-        var desc = (p.desc || "").toLowerCase();
-        var cat = (p.category || "").toLowerCase();
-        return title.indexOf(searchTerm) !== -1 || desc.indexOf(searchTerm) !== -1 || cat.indexOf(searchTerm) !== -1;
-      });
-    }
+  var searchTerm = searchInput ? searchInput.value.trim().toLowerCase() : "";
+  var list = searchTerm ? searchProductList(searchTerm) : getAllProducts();
+  if (f !== "all") {
+    list = list.filter((p) => {
+      const category = p.category || getProductCategory(p.type);
+      return category === f;
+    });
   }
   if (collarSelect && collarSelect.value) {
     var collarType = (collarSelect.value || "").trim();
@@ -364,6 +403,7 @@ productsTabs.forEach((tab) => {
     productsTabs.forEach((t) => t.classList.remove("active"));
     tab.classList.add("active");
     applyFilter();
+    reloadProductsForFilter();
   });
 });
 
@@ -374,19 +414,27 @@ productsTabs.forEach((tab) => {
   var collarSelect = document.getElementById("productsCollarSelect");
   var productsTabsList = document.querySelectorAll(".products-tab");
   if (!searchInput) return;
+  var searchSeq = 0;
 
   function doSearch() {
     var searchTerm = searchInput.value.trim().toLowerCase();
-    var collarType = collarSelect ? (collarSelect.value || "").trim() : "";
-    var list = getAllProducts();
-    if (searchTerm) {
-      list = list.filter(function (p) {
-        var title = (p.title || "").toLowerCase();
-        var desc = (p.desc || "").toLowerCase();
-        var cat = (p.category || "").toLowerCase();
-        return title.indexOf(searchTerm) !== -1 || desc.indexOf(searchTerm) !== -1 || cat.indexOf(searchTerm) !== -1;
+    if (searchTerm && searchTerm !== productSearch.term) {
+      // แสดงผลกรองในเครื่องก่อน แล้วแทนด้วยผลจาก server เมื่อมาถึง (ทิ้งผลของคำค้นเก่าที่มาช้า)
+      var seq = ++searchSeq;
+      searchProductsApi(searchTerm, PRODUCTS_PAGE_SIZE).then(function (items) {
+        if (seq !== searchSeq || !items) return;
+        productSearch = { term: searchTerm, items: items };
+        showSearchResults();
       });
     }
+    showSearchResults();
+    reloadProductsForFilter();
+  }
+
+  function showSearchResults() {
+    var searchTerm = searchInput.value.trim().toLowerCase();
+    var collarType = collarSelect ? (collarSelect.value || "").trim() : "";
+    var list = searchTerm ? searchProductList(searchTerm) : getAllProducts();
     if (collarType) {
       list = list.filter(function (p) {
         var collar = (p.price_type || "").trim();
@@ -418,6 +466,7 @@ productsTabs.forEach((tab) => {
   // เลือกประเภทคอแล้วแสดงผลทันที
   if (collarSelect) {
     collarSelect.addEventListener("change", doSearch);
+    collarSelect.addEventListener("change", loadProductFacets);
   }
   // พิมพ์ค้นหาแล้วแสดงผลทันที (debounce 200ms)
   var searchDebounce;
@@ -430,6 +479,7 @@ productsTabs.forEach((tab) => {
     if (d.search !== undefined && searchInput) searchInput.value = d.search || "";
     if (d.collar !== undefined && collarSelect) collarSelect.value = d.collar || "";
     doSearch();
+    if (d.collar !== undefined) loadProductFacets();
   });
 })();
 
@@ -445,26 +495,135 @@ if (filterMatch && productsTabs.length) {
   }
 }
 
-// โหลดสินค้าจาก API (เมื่อรันผ่าน Flask)
+// โหลดสินค้าจาก API (เมื่อรันผ่าน Flask) ทีละหน้าด้วย ?limit=&cursor=
+function mapApiProduct(p) {
+  var imgUrl = p.image ? (p.image.indexOf("/") === 0 ? p.image : "/static/" + p.image) : "";
+  return {
+    id: p.id,
+    title: p.name,
+    type: "football",
+    badge: p.stock > 0 ? "ມີສິນຄ້າ" : "ໝົດ",
+    desc: p.description || "",
+    category: p.category || "",
+    price_type: p.price_type || "",
+    image: imgUrl,
+    imageSrcset: p.images ? p.images.srcset : null,
+    imageFull: p.images ? p.images.variants.full.jpeg : imgUrl
+  };
+}
+
+// ตัวกรองหมวดหมู่ (แท็บ) + ประเภทคอ ในรูป query string ของ /api/products — "" = ไม่กรอง
+function productsFilterQuery() {
+  var params = [];
+  var f = activeCategoryFilter();
+  if (f !== "all") params.push("category=" + encodeURIComponent(f));
+  var collarSelect = document.getElementById("productsCollarSelect");
+  var collar = collarSelect ? (collarSelect.value || "").trim() : "";
+  if (collar) params.push("price_type=" + encodeURIComponent(collar));
+  return params.join("&");
+}
+
+// หนึ่งหน้าจาก /api/products (กรองที่ server ตาม query) — null ถ้าเรียกไม่ได้
+async function fetchProductsPage(cursor, query) {
+  var url = "/api/products?limit=" + PRODUCTS_PAGE_SIZE + (query ? "&" + query : "") + (cursor ? "&cursor=" + encodeURIComponent(cursor) : "");
+  const r = await fetch(url);
+  if (!r.ok) return null;
+  const data = await r.json();
+  return { items: (data.items || []).map(mapApiProduct), nextCursor: data.next_cursor || null };
+}
+
+// เปลี่ยนแท็บ/ประเภทคอ: โหลดหน้าแรกใหม่ที่กรองแล้วจาก server (ทิ้งผลของตัวกรองเก่าที่มาช้า)
+var productsReloadSeq = 0;
+async function reloadProductsForFilter() {
+  if (!grid) return;
+  var query = productsFilterQuery();
+  if (query === productsQuery) return;
+  var seq = ++productsReloadSeq;
+  var page = null;
+  try {
+    page = await fetchProductsPage(null, query);
+  } catch (e) {}
+  if (seq !== productsReloadSeq || !page) return;
+  productsQuery = query;
+  apiProducts = page.items;
+  productsNextCursor = page.nextCursor;
+  applyFilter();
+}
+
+// จำนวนสินค้าบนแท็บหมวดหมู่ จาก /api/products/facets (นับตามประเภทคอที่เลือกอยู่)
+var productFacetsSeq = 0;
+async function loadProductFacets() {
+  if (!productsTabs.length) return;
+  var collarSelect = document.getElementById("productsCollarSelect");
+  var collar = collarSelect ? (collarSelect.value || "").trim() : "";
+  var seq = ++productFacetsSeq;
+  try {
+    const r = await fetch("/api/products/facets" + (collar ? "?price_type=" + encodeURIComponent(collar) : ""));
+    if (!r.ok) return;
+    const facets = await r.json();
+    if (seq !== productFacetsSeq) return;
+    productsTabs.forEach(function (tab) {
+      if (!tab.dataset.label) tab.dataset.label = tab.textContent.trim();
+      var f = tab.dataset.filter || "all";
+      var count = f === "all" ? facets.total : (facets.category[f] || 0);
+      tab.textContent = tab.dataset.label + " (" + count + ")";
+    });
+  } catch (e) {}
+}
+
+// ค้นหาทั้ง catalogue ที่ server — null ถ้าเรียกไม่ได้ (ให้ผู้เรียกกรองในเครื่องแทน)
+async function searchProductsApi(q, limit) {
+  try {
+    const r = await fetch("/api/search?q=" + encodeURIComponent(q) + "&limit=" + (limit || PRODUCTS_PAGE_SIZE));
+    if (!r.ok) return null;
+    const data = await r.json();
+    return (data.items || []).map(mapApiProduct);
+  } catch (e) {
+    return null;
+  }
+}
+
+// คำแนะนำระหว่างพิมพ์ (ชื่อ/หมวดหมู่) — ตอบจาก index ในหน่วยความจำของ server ไม่แตะ DB
+async function suggestProductsApi(q, limit) {
+  try {
+    const r = await fetch("/api/search/suggest?q=" + encodeURIComponent(q) + "&limit=" + (limit || 8));
+    if (!r.ok) return null;
+    return await r.json();
+  } catch (e) {
+    return null;
+  }
+}
+
+async function loadMoreProducts() {
+  if (!productsNextCursor) return;
+  var query = productsQuery;
+  try {
+    const more = await fetchProductsPage(productsNextCursor, query);
+    // ตัวกรองเปลี่ยนระหว่างรอ: หน้านี้เป็นของตัวกรองเก่า ไม่ต้องต่อท้าย
+    if (more && query === productsQuery) {
+      apiProducts = apiProducts.concat(more.items);
+      productsNextCursor = more.nextCursor;
+    }
+  } catch (e) {}
+  if (grid) {
+    grid.setAttribute("data-show-all", "true");
+    applyFilter(true);
+  }
+}
+
 (async function initProducts() {
+  // หน้าสินค้าที่เปิดด้วย ?filter= โหลดหน้าแรกที่กรองแล้วเลย
+  var query = grid ? productsFilterQuery() : "";
+  var seq = ++productsReloadSeq;
+  loadProductFacets();
   try {
-    const r = await fetch("/api/products");
-    if (r.ok) {
-      const data = await r.json();
-      apiProducts = data.map(function (p) {
-        var imgUrl = p.image ? (p.image.indexOf("/") === 0 ? p.image : "/static/" + p.image) : "";
-        return {
-          id: p.id,
-          title: p.name,
-          type: "football",
-          badge: p.stock > 0 ? "ມີສິນຄ້າ" : "ໝົດ",
-          desc: p.description || "",
-          category: p.category || "",
-          price_type: p.price_type || "",
-          image: imgUrl
-        };
-      });
-      
+    const first = await fetchProductsPage(null, query);
+    // ผู้ใช้เปลี่ยนแท็บก่อนหน้าแรกมาถึง: reloadProductsForFilter จัดการแทนแล้ว
+    if (first && seq === productsReloadSeq) {
+      productsQuery = query;
+      apiProducts = first.items;
+      productsNextCursor = first.nextCursor;
+
       // แสดงสินค้าในหน้าหลัก (homepage)
       renderHomeProducts(apiProducts);
     }
@@ -472,27 +631,23 @@ if (filterMatch && productsTabs.length) {
   if (grid) applyFilter();
 })();
 
-// ===== Trust Review (หน้า index): โหลดรีวิวจาก API /api/reviews + รูปจาก product ที่ตรงกับ product_id =====
+// ===== Trust Review (หน้า index): โหลดรีวิวล่าสุดพร้อมข้อมูลสินค้าจาก /api/reviews?include=product =====
 (async function loadTrustReviews() {
   const listEl = document.getElementById("trustReviewList");
   const moreLink = document.getElementById("trustReviewMore");
   if (!listEl) return;
+  const showCount = 3;
   try {
-    const [reviewsRes, productsRes] = await Promise.all([
-      fetch("/api/reviews"),
-      fetch("/api/products")
-    ]);
+    const reviewsRes = await fetch("/api/reviews?include=product&limit=" + showCount);
     if (!reviewsRes.ok) return;
-    const reviews = await reviewsRes.json();
-    const products = productsRes.ok ? await productsRes.json() : [];
-    const showCount = 3;
-    const slice = (reviews || []).slice(0, showCount);
+    const reviews = ((await reviewsRes.json()) || {}).items || [];
+    const slice = reviews.slice(0, showCount);
     if (slice.length === 0) {
       listEl.innerHTML = '<p class="trust-review-empty muted">ຍັງບໍ່ມີລີວິວ</p>';
       return;
     }
     listEl.innerHTML = slice.map(function (rev) {
-      const product = rev.product_id != null ? products.find(function (p) { return p.id === rev.product_id; }) : null;
+      const product = rev.product || null;
       const stars = "⭐".repeat(Math.min(5, Math.max(0, rev.rating || 0)));
       const name = (rev.customer_name || "ລູກຄ້າ").replace(/</g, "&lt;").replace(/>/g, "&gt;");
       // เนื้อหา: ใช้จาก product.description ก่อน ถ้าไม่มีใช้ comment รีวิว
@@ -548,8 +703,7 @@ function renderHomeProducts(products) {
   products.forEach((p) => {
     const card = document.createElement("div");
     card.className = "product-card-work";
-    const imgSrc = p.image || "";
-    const imgTag = imgSrc ? `<img src="${imgSrc}" alt="${p.title}" onerror="this.style.display='none'" />` : "";
+    const imgTag = productImageTag(p, `onerror="this.style.display='none'"`, "(max-width: 600px) 50vw, 300px");
     
     // แสดง category, description และขนาดสินค้า
     // แปลง "jersey" เป็น "JERSEY" (ตัวใหญ่) และแสดง category เป็นสีฟ้า
@@ -607,7 +761,7 @@ function openModal(id) {
   if (mPreview) {
     if (p.image) {
       mPreview.style.background = "none";
-      mPreview.style.backgroundImage = `url(${p.image})`;
+      mPreview.style.backgroundImage = `url(${p.imageFull || p.image})`;
       mPreview.style.backgroundSize = "cover";
       mPreview.style.backgroundPosition = "center";
     } else {
@@ -862,7 +1016,7 @@ if (contactForm) {
     if (!document.body.classList.contains("products-page")) return;
     e.preventDefault();
     e.stopPropagation();
-    openLightbox(img.currentSrc || img.src, img.alt || "");
+    openLightbox(img.dataset.full || img.currentSrc || img.src, img.alt || "");
   });
 })();
 
@@ -883,28 +1037,45 @@ if (contactForm) {
     { title: "ອອກແບບເສື້ອ", url: "products.html", label: "ໜ້າສິນຄ້າ" }
   ];
 
-  function getSearchIndex() {
-    var items = pages.slice();
+  function productItem(p) {
+    return { title: p.title, url: "products.html?search=" + encodeURIComponent(p.title), label: "ສິນຄ້າ" };
+  }
+
+  function localProductItems(q) {
     try {
       var products = typeof getAllProducts === "function" ? getAllProducts() : [];
-      products.forEach(function (p) {
-        items.push({ title: p.title, url: "products.html?search=" + encodeURIComponent(p.title), label: "ສິນຄ້າ" });
-      });
-    } catch (e) {}
-    return items;
+      return products.filter(function (p) {
+        return (p.title || "").toLowerCase().indexOf(q) !== -1;
+      }).map(productItem);
+    } catch (e) {
+      return [];
+    }
   }
 
+  var resultsSeq = 0;
+
   function showResults(q) {
     q = (q || "").trim().toLowerCase();
     if (q.length < 1) {
+      resultsSeq++;
       resultsEl.hidden = true;
       resultsEl.innerHTML = "";
       return;
     }
-    var index = getSearchIndex();
-    var matched = index.filter(function (item) {
+    var matchedPages = pages.filter(function (item) {
       return item.title.toLowerCase().indexOf(q) !== -1;
     });
+    renderResults(matchedPages.concat(localProductItems(q)));
+    if (typeof suggestProductsApi !== "function") return;
+    // คำแนะนำจาก /api/search/suggest (ทั้ง catalogue) แทนที่ผลในเครื่องเมื่อมาถึง
+    var seq = ++resultsSeq;
+    suggestProductsApi(q, 8).then(function (items) {
+      if (seq !== resultsSeq || !items) return;
+      renderResults(matchedPages.concat(items.map(function (item) { return productItem({ title: item.name }); })));
+    });
+  }
+
+  function renderResults(matched) {
     resultsEl.innerHTML = matched.slice(0, 10).map(function (item) {
       return '<a href="' + item.url + '" class="search-result-item"><span class="search-result-title">' + escapeHtml(item.title) + '</span><span class="search-result-label">' + escapeHtml(item.label) + '</span></a>';
     }).join("");
@@ -920,7 +1091,7 @@ if (contactForm) {
   var timer;
   input.addEventListener("input", function () {
     clearTimeout(timer);
-    timer = setTimeout(function () { showResults(input.value); }, 150);
+    timer = setTimeout(function () { showResults(input.value); }, 50);
   });
   input.addEventListener("focus", function () { showResults(input.value); });
   input.addEventListener("blur", function () {
@@ -942,6 +1113,11 @@ if (contactForm) {
   if (!match) return;
   var term = decodeURIComponent(match[1].replace(/\+/g, " ")).trim().toLowerCase();
   if (term.length < 1) return;
+  if (document.getElementById("productsSearchInput")) {
+    // หน้าที่มีช่องค้นหา: ค้นผ่าน /api/search เหมือนพิมพ์เอง
+    document.dispatchEvent(new CustomEvent("productsSearch", { detail: { search: term } }));
+    return;
+  }
   try {
     var list = getAllProducts().filter(function (p) {
       return p.title.toLowerCase().indexOf(term) !== -1;
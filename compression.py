@@ -0,0 +1,275 @@
+"""
+บีบอัด response (gzip / brotli) ตาม Accept-Encoding — WSGI middleware ครอบ app.wsgi_app
+
+- บีบเฉพาะชนิดข้อความ (JSON, NDJSON, CSV, HTML, CSS, JS, SVG) ที่ใหญ่กว่า COMPRESS_MIN_SIZE
+  response ที่บีบไว้แล้ว (Content-Encoding, เช่นไฟล์ .br/.gz จาก static_assets) หรือมี no-transform ไม่แตะ
+- body ที่รู้ขนาด (jsonify) บีบก้อนเดียวแล้วใส่ Content-Length; body แบบ stream (ไม่มี Content-Length) บีบทีละก้อน
+- response สาธารณะที่ cache ได้ (Cache-Control: public + ETag จาก _catalog_cached) เก็บผลบีบไว้ใน CompressedBodyCache
+  key มี ETag ซึ่งเปลี่ยนตาม version ของ catalogue จึงไม่ต้องล้างเอง — body catalogue เดิมไม่ต้องบีบใหม่ทุก request
+"""
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+from werkzeug.datastructures import Headers, ResponseCacheControl
+from werkzeug.http import parse_accept_header, parse_cache_control_header
+
+try:
+    import brotli
+except ImportError:  # ไม่มี Brotli: gzip อย่างเดียว
+    brotli = None
+
+
+# ==========================
+#  Settings
+# ==========================
+
+COMPRESS_MIN_SIZE = int(os.environ.get("COMPRESS_MIN_SIZE", "1024"))  # เล็กกว่านี้บีบแล้วไม่คุ้ม CPU
+COMPRESS_GZIP_LEVEL = int(os.environ.get("COMPRESS_GZIP_LEVEL", "6"))
+COMPRESS_BROTLI_QUALITY = int(os.environ.get("COMPRESS_BROTLI_QUALITY", "5"))
+COMPRESS_CACHE_MAX_BYTES = int(os.environ.get("COMPRESS_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+# body ที่รู้ขนาดแต่ใหญ่กว่านี้ บีบแบบ stream แทน (ไม่อ่านทั้งก้อนเข้า memory)
+COMPRESS_BUFFER_MAX = 4 * 1024 * 1024
+# body ที่ถูก cache บีบครั้งเดียวใช้ได้หลายครั้ง จึงใช้ระดับสูงกว่า
+_CACHED_LEVELS = {"gzip": 9, "br": 9}
+
+COMPRESSIBLE_MIMETYPES = frozenset({
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "text/javascript",
+    "text/csv",
+    "text/css",
+    "text/html",
+    "text/plain",
+    "image/svg+xml",
+})
+
+
+def available_encodings() -> Tuple[str, ...]:
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate(accept_encoding: Optional[str]) -> Optional[str]:
+    """เลือก encoding จาก Accept-Encoding (brotli ก่อนถ้ามี) — None ถ้า client ไม่รับแบบไหนเลย"""
+    if not accept_encoding:
+        return None
+    accepted = parse_accept_header(accept_encoding)
+    for encoding in available_encodings():
+        if accepted[encoding]:
+            return encoding
+    return None
+
+
+class _Encoder:
+    """บีบ body ทีละก้อน (สำหรับ response แบบ stream)"""
+
+    def __init__(self, encoding: str, level: Optional[int] = None):
+        if encoding == "br":
+            quality = COMPRESS_BROTLI_QUALITY if level is None else level
+            self._compressor = brotli.Compressor(mode=brotli.MODE_TEXT, quality=quality)
+            self._process, self._finish = self._compressor.process, self._compressor.finish
+        else:
+            # wbits 31 = gzip header/trailer
+            self._compressor = zlib.compressobj(COMPRESS_GZIP_LEVEL if level is None else level, zlib.DEFLATED, 31)
+            self._process, self._finish = self._compressor.compress, self._compressor.flush
+
+    def compress(self, chunk: bytes) -> bytes:
+        return self._process(chunk)
+
+    def finish(self) -> bytes:
+        return self._finish()
+
+
+def compress(body: bytes, encoding: str, level: Optional[int] = None) -> bytes:
+    encoder = _Encoder(encoding, level)
+    return encoder.compress(body) + encoder.finish()
+
+
+# ==========================
+#  Compressed body cache
+# ==========================
+
+
+class CompressedBodyCache:
+    """LRU ของ body ที่บีบแล้ว จำกัดด้วยขนาดรวม (bytes) — key: (path, query string, ETag, encoding)"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, str, str, str], bytes]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compress(self, key: Tuple[str, str, str, str], body: bytes) -> bytes:
+        with self._lock:
+            compressed = self._entries.get(key)
+            if compressed is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return compressed
+            self.misses += 1
+        encoding = key[3]
+        # บีบนอก lock: request อื่นไม่ต้องรอ (ถ้าพร้อมกันจะบีบซ้ำได้บ้าง ผลเหมือนกัน)
+        compressed = compress(body, encoding, _CACHED_LEVELS[encoding])
+        if len(compressed) <= self.max_bytes:
+            with self._lock:
+                if key not in self._entries:
+                    self._entries[key] = compressed
+                    self._bytes += len(compressed)
+                    while self._bytes > self.max_bytes:
+                        _, evicted = self._entries.popitem(last=False)
+                        self._bytes -= len(evicted)
+        return compressed
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else None,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
+
+
+_CACHE = CompressedBodyCache(COMPRESS_CACHE_MAX_BYTES)
+
+
+def get_compressed_cache() -> CompressedBodyCache:
+    return _CACHE
+
+
+def encode_body(body: bytes, encoding: str, cache_key: Optional[Tuple[str, str, str]] = None) -> bytes:
+    """บีบ body ทั้งก้อน; cache_key (path, query string, ETag) = response สาธารณะที่เก็บผลไว้ได้ (ใช้ร่วมกับ asgi.py)"""
+    if cache_key is None:
+        return compress(body, encoding)
+    return _CACHE.get_or_compress(cache_key + (encoding,), body)
+
+
+def _is_compressible(environ, status: int, headers: Headers) -> bool:
+    if status < 200 or status in (204, 206, 304) or environ.get("REQUEST_METHOD") == "HEAD":
+        return False
+    if "Content-Encoding" in headers or "Content-Range" in headers:
+        return False
+    mimetype = headers.get("Content-Type", "").split(";", 1)[0].strip().lower()
+    if mimetype not in COMPRESSIBLE_MIMETYPES:
+        return False
+    return not parse_cache_control_header(headers.get("Cache-Control"), cls=ResponseCacheControl).no_transform
+
+
+def _add_vary(headers: Headers) -> None:
+    vary = [v.strip() for v in headers.get("Vary", "").split(",") if v.strip()]
+    if "accept-encoding" not in (v.lower() for v in vary) and "*" not in vary:
+        headers["Vary"] = ", ".join(vary + ["Accept-Encoding"])
+
+
+def _cache_key(environ, status: int, headers: Headers) -> Optional[Tuple[str, str, str]]:
+    """key ของ response สาธารณะที่บีบเก็บไว้ได้ (200 + public + ETag) — ไม่ใช่ก็คืน None"""
+    etag = headers.get("ETag")
+    if status != 200 or not etag or "Set-Cookie" in headers:
+        return None
+    cache_control = parse_cache_control_header(headers.get("Cache-Control"), cls=ResponseCacheControl)
+    if not cache_control.public or cache_control.no_store or cache_control.private:
+        return None
+    return (environ.get("PATH_INFO", ""), environ.get("QUERY_STRING", ""), etag)
+
+
+def _unsupported_write(data: bytes) -> None:
+    raise RuntimeError("CompressionMiddleware ไม่รองรับ write() ของ WSGI")
+
+
+def _close(app_iter) -> None:
+    close = getattr(app_iter, "close", None)
+    if close is not None:
+        close()
+
+
+def _stream(app_iter: Iterable[bytes], encoding: str):
+    encoder = _Encoder(encoding)
+    try:
+        for chunk in app_iter:
+            compressed = encoder.compress(chunk)
+            if compressed:
+                yield compressed
+        yield encoder.finish()
+    finally:
+        _close(app_iter)
+
+
+class CompressionMiddleware:
+    """
+    WSGI middleware: app.wsgi_app = CompressionMiddleware(app.wsgi_app)
+    (ต้องเรียก start_response ก่อนคืน body อย่างที่ Flask/Werkzeug ทำ)
+    """
+
+    def __init__(self, app, min_size: int = COMPRESS_MIN_SIZE):
+        self.app = app
+        self.min_size = min_size
+        self._lock = threading.Lock()
+        self.compressed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def _count(self, bytes_in: int, bytes_out: int) -> None:
+        with self._lock:
+            self.compressed += 1
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = {
+                "encodings": list(available_encodings()),
+                "compressed_responses": self.compressed,
+                "ratio": round(self.bytes_out / self.bytes_in, 4) if self.bytes_in else None,
+            }
+        stats["cache"] = _CACHE.stats()
+        return stats
+
+    def __call__(self, environ, start_response):
+        captured = []
+
+        def capture(status, headers, exc_info=None):
+            captured[:] = [status, headers, exc_info]
+            return _unsupported_write
+
+        app_iter = self.app(environ, capture)
+        status_line, raw_headers, exc_info = captured
+        status = int(status_line.split(None, 1)[0])
+        headers = Headers(raw_headers)
+
+        if not _is_compressible(environ, status, headers):
+            start_response(status_line, raw_headers, exc_info)
+            return app_iter
+        _add_vary(headers)
+        encoding = negotiate(environ.get("HTTP_ACCEPT_ENCODING"))
+        length = headers.get("Content-Length", type=int)
+        if encoding is None or (length is not None and length < self.min_size):
+            start_response(status_line, headers.to_wsgi_list(), exc_info)
+            return app_iter
+
+        headers["Content-Encoding"] = encoding
+        etag = headers.get("ETag")
+        if etag and not etag.startswith("W/"):
+            # เนื้อ bytes ต่างจากตัวที่ไม่บีบแล้ว — ETag แบบ strong ใช้ซ้ำไม่ได้
+            headers["ETag"] = "W/" + etag
+
+        if length is None or length > COMPRESS_BUFFER_MAX:
+            headers.remove("Content-Length")
+            start_response(status_line, headers.to_wsgi_list(), exc_info)
+            return _stream(app_iter, encoding)
+
+        try:
+            body = b"".join(app_iter)
+        finally:
+            _close(app_iter)
+        body_out = encode_body(body, encoding, _cache_key(environ, status, headers))
+        self._count(len(body), len(body_out))
+        headers["Content-Length"] = str(len(body_out))
+        start_response(status_line, headers.to_wsgi_list(), exc_info)
+        return [body_out]
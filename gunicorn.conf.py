@@ -0,0 +1,32 @@
+# gunicorn โหลดไฟล์นี้อัตโนมัติ (./gunicorn.conf.py) — ค่า bind/workers ยังมาจาก start command
+# สร้างตาราง/migrate ครั้งเดียวใน master ก่อน fork worker แทนการทำใน request
+
+import os
+
+# gthread: แต่ละ worker รับหลาย request พร้อมกัน — request ที่รอ KDF (ล็อกอิน) หรือรอ DB
+# ไม่บล็อก request อื่นของ worker เดียวกัน (sync worker รับได้ทีละ request)
+# threads ต้องไม่เกิน DB_POOL_MAX ไม่งั้น thread ที่เกินจะรอ connection แทน
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", "8"))
+
+
+def on_starting(server):
+    """รันครั้งเดียวต่อการ start (deploy) ก่อนสร้าง worker"""
+    from pyhon import close_pool, init_db
+
+    try:
+        version = init_db()
+        server.log.info("Database initialized (schema version %s)", version)
+    except Exception as e:
+        # ไม่ให้ server ล่ม: worker ยังรับ request ได้ และ /health จะตอบ 503 จนกว่าจะรัน `flask --app app init-db`
+        server.log.error("init_db failed: %s", e)
+    finally:
+        # master ไม่ใช้ DB ต่อ — ไม่ต้องถือ connection ค้างไว้ (worker จะสร้าง pool ของตัวเอง)
+        close_pool()
+
+
+def post_worker_init(worker):
+    """สร้าง pool ของ KDF (+ hash หลอก) ตอน worker เริ่ม — ล็อกอินแรกไม่ต้องจ่าย KDF เพิ่มอีกรอบ"""
+    from pyhon import _get_kdf_executor
+
+    _get_kdf_executor()
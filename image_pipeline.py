@@ -0,0 +1,203 @@
+import logging
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # ไม่มี Pillow: เก็บ/เสิร์ฟเฉพาะไฟล์ต้นฉบับเหมือนเดิม
+    Image = ImageOps = None
+
+logger = logging.getLogger(__name__)
+
+
+# ==========================
+#  Image Pipeline (ย่อรูปที่อัปโหลดเป็นหลายขนาด WebP/JPEG ใน background)
+# ==========================
+
+# (ชื่อ, ความกว้างสูงสุด) — ไม่ขยายรูปที่เล็กกว่านี้
+IMAGE_VARIANTS = (("thumb", 160), ("card", 480), ("full", 1200))
+# (นามสกุลไฟล์, format ของ Pillow, key ใน API)
+IMAGE_FORMATS = (("webp", "WEBP", "webp"), ("jpg", "JPEG", "jpeg"))
+IMAGE_WORKERS = int(os.environ.get("IMAGE_WORKERS", "2"))
+IMAGE_WEBP_QUALITY = int(os.environ.get("IMAGE_WEBP_QUALITY", "80"))
+IMAGE_JPEG_QUALITY = int(os.environ.get("IMAGE_JPEG_QUALITY", "82"))
+ORIGINAL_EXTENSIONS = ("jpg", "jpeg", "png", "gif", "webp")
+
+if Image is not None:
+    # กันไฟล์ที่ประกาศขนาดใหญ่ผิดปกติ (decompression bomb) — รูปจากมือถือทั่วไป < 50MP
+    Image.MAX_IMAGE_PIXELS = int(os.environ.get("IMAGE_MAX_PIXELS", "60000000"))
+
+_VARIANT_RE = re.compile(r"^(?P<base>.+)-(?P<width>\d+)w\.(?P<ext>webp|jpg)$")
+
+_EXECUTOR: Optional[ThreadPoolExecutor] = None
+_EXECUTOR_PID: Optional[int] = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def enabled() -> bool:
+    return Image is not None
+
+
+def variant_filename(original_filename: str, width: int, ext: str) -> str:
+    """ชื่อไฟล์ derivative: product_3_1700000000.png -> product_3_1700000000-480w.webp"""
+    return f"{original_filename.rsplit('.', 1)[0]}-{width}w.{ext}"
+
+
+def image_set(relative_path: Optional[str]) -> Optional[Dict]:
+    """
+    URL ของทุกขนาด/format ของรูปที่อัปโหลด (คำนวณจาก path เดิม ไม่ต้องเก็บใน DB) + srcset พร้อมใช้
+    ถ้า derivative ยังทำไม่เสร็จ URL ยังใช้ได้ (เสิร์ฟต้นฉบับแทนชั่วคราว ดู fallback_original)
+    """
+    if not relative_path or not enabled() or not relative_path.startswith("uploads/"):
+        return None
+    folder, filename = relative_path.rsplit("/", 1)
+    variants = {}
+    for name, width in IMAGE_VARIANTS:
+        variants[name] = {"width": width}
+        for ext, _, key in IMAGE_FORMATS:
+            variants[name][key] = f"/static/{folder}/{variant_filename(filename, width, ext)}"
+    return {
+        "original": f"/static/{relative_path}",
+        "variants": variants,
+        "srcset": {
+            key: ", ".join(f"{variants[name][key]} {width}w" for name, width in IMAGE_VARIANTS)
+            for _, _, key in IMAGE_FORMATS
+        },
+    }
+
+
+def check_image(stream) -> None:
+    """อ่านแค่ header ว่าเป็นรูปที่ Pillow เปิดได้ (ถูกมาก) — decode เต็มทำใน background"""
+    if not enabled():
+        return
+    try:
+        with Image.open(stream) as im:
+            im.size
+    except Exception:
+        raise ValueError("ไฟล์ไม่ใช่รูปภาพ หรือไฟล์เสีย")
+    finally:
+        stream.seek(0)
+
+
+def _flatten(im):
+    """JPEG ไม่มี alpha: วางบนพื้นขาว"""
+    if im.mode in ("RGBA", "LA") or (im.mode == "P" and "transparency" in im.info):
+        rgba = im.convert("RGBA")
+        background = Image.new("RGB", rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.getchannel("A"))
+        return background
+    return im.convert("RGB")
+
+
+def _save_atomic(im, path: str, fmt: str, **options) -> None:
+    tmp = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+    try:
+        im.save(tmp, fmt, **options)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def process_image(path: str) -> List[str]:
+    """
+    decode รูปต้นฉบับ, หมุนตาม EXIF, ตัด metadata (EXIF/GPS/ICC ไม่ถูกเขียนต่อ)
+    แล้วเขียน derivative ทุกขนาดเป็น WebP + JPEG ข้างไฟล์เดิม — คืนรายชื่อไฟล์ที่เขียน
+    """
+    folder, filename = os.path.split(path)
+    written = []
+    with Image.open(path) as source:
+        im = ImageOps.exif_transpose(source)
+        if im.mode not in ("RGB", "RGBA"):
+            im = im.convert("RGBA" if im.mode in ("LA", "P") else "RGB")
+        for _, width in IMAGE_VARIANTS:
+            if im.width > width:
+                resized = im.resize((width, max(1, round(im.height * width / im.width))), Image.LANCZOS)
+            else:
+                resized = im
+            webp_path = os.path.join(folder, variant_filename(filename, width, "webp"))
+            _save_atomic(resized, webp_path, "WEBP", quality=IMAGE_WEBP_QUALITY, method=4)
+            jpeg_path = os.path.join(folder, variant_filename(filename, width, "jpg"))
+            _save_atomic(_flatten(resized), jpeg_path, "JPEG", quality=IMAGE_JPEG_QUALITY, optimize=True, progressive=True)
+            written += [webp_path, jpeg_path]
+    return written
+
+
+def _process_logged(path: str) -> None:
+    try:
+        process_image(path)
+    except Exception as e:
+        logger.warning("image pipeline: ย่อรูป %s ไม่สำเร็จ: %s", path, e)
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """thread pool ของ process นี้ (สร้างใหม่หลัง gunicorn fork) — Pillow ปล่อย GIL ระหว่าง decode/resize/encode"""
+    global _EXECUTOR, _EXECUTOR_PID
+    if _EXECUTOR is not None and _EXECUTOR_PID == os.getpid():
+        return _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None or _EXECUTOR_PID != os.getpid():
+            _EXECUTOR = ThreadPoolExecutor(max_workers=max(1, IMAGE_WORKERS), thread_name_prefix="image-pipeline")
+            _EXECUTOR_PID = os.getpid()
+        return _EXECUTOR
+
+
+def has_variants(path: str) -> bool:
+    """มีรูปย่อของไฟล์นี้ครบแล้ว (ดูจากไฟล์ที่เขียนเป็นไฟล์สุดท้าย)"""
+    folder, filename = os.path.split(path)
+    _, largest = IMAGE_VARIANTS[-1]
+    return os.path.exists(os.path.join(folder, variant_filename(filename, largest, "jpg")))
+
+
+def schedule(path: str) -> None:
+    """ส่งรูปเข้าคิวย่อใน background — request อัปโหลดตอบกลับได้ทันที (รูปซ้ำที่ย่อไว้แล้วไม่ต้องทำใหม่)"""
+    if enabled() and not has_variants(path):
+        _get_executor().submit(_process_logged, path)
+
+
+def remove_with_variants(path: str) -> None:
+    """ลบไฟล์ต้นฉบับพร้อม derivative ทุกไฟล์ (ตอนเปลี่ยนรูปใหม่)"""
+    folder, filename = os.path.split(path)
+    targets = [path] + [
+        os.path.join(folder, variant_filename(filename, width, ext))
+        for _, width in IMAGE_VARIANTS
+        for ext, _, _ in IMAGE_FORMATS
+    ]
+    for target in targets:
+        try:
+            os.remove(target)
+        except OSError:
+            pass
+
+
+def fallback_original(folder: str, filename: str) -> Optional[str]:
+    """derivative ที่ยังไม่ถูกสร้าง (กำลังอยู่ในคิว หรือรูปเก่าก่อนมี pipeline) -> ชื่อไฟล์ต้นฉบับ ถ้ามี"""
+    match = _VARIANT_RE.match(filename)
+    if not match:
+        return None
+    for ext in ORIGINAL_EXTENSIONS:
+        candidate = f"{match.group('base')}.{ext}"
+        if os.path.exists(os.path.join(folder, candidate)):
+            return candidate
+    return None
+
+
+def backfill(folder: str) -> int:
+    """สร้าง derivative ให้รูปต้นฉบับที่ยังไม่มี (เช่น รูปที่อัปโหลดก่อนมี pipeline) — คืนจำนวนรูปที่ทำ"""
+    if not enabled():
+        return 0
+    count = 0
+    for dirpath, dirnames, filenames in os.walk(folder):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+        for filename in sorted(filenames):
+            if _VARIANT_RE.match(filename) or filename.rsplit(".", 1)[-1].lower() not in ORIGINAL_EXTENSIONS:
+                continue
+            path = os.path.join(dirpath, filename)
+            if has_variants(path):
+                continue
+            _process_logged(path)
+            count += 1
+    return count
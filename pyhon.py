@@ -1,14 +1,27 @@
 from dataclasses import dataclass, field
-from typing import Dict, Optional, List
+from typing import Any, Callable, Dict, FrozenSet, Iterable, Iterator, Optional, List, Tuple
+import base64
 import hashlib
+import hmac
+import logging
 import uuid
 import time
 import re
 import os
-from datetime import datetime, timedelta
+import select
+import threading
+from collections import OrderedDict
+from decimal import Decimal, InvalidOperation
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
 
 import psycopg2
+from psycopg2.errors import ForeignKeyViolation
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
 from psycopg2.extras import RealDictCursor
+from psycopg2.pool import PoolError
+
+logger = logging.getLogger(__name__)
 
 
 # ==========================
@@ -37,6 +50,22 @@ class Product:
     category: Optional[str] = None
     price_type: Optional[str] = None  # ประเภทแพ็กเกจ เช่น '1-10', '11-20', 'custom'
     created_at: float = field(default_factory=time.time)
+    rating_count: int = 0  # จำนวนรีวิว (จาก product_rating_stats)
+    rating_avg: Optional[float] = None  # คะแนนเฉลี่ย (None = ยังไม่มีรีวิว)
+
+
+# สินค้าที่ไม่ได้ระบุหมวดหมู่ (NULL/ว่าง) อยู่แท็บนี้ — ตรงกับ client เดิม (p.category || getProductCategory("football"))
+DEFAULT_PRODUCT_CATEGORY = "jersey"
+
+
+@dataclass(frozen=True)
+class ProductFilters:
+    """ตัวกรองรายการสินค้า (?category=&price_type=&in_stock=&min_price=&max_price=) — None = ไม่กรองด้านนั้น"""
+    category: Optional[str] = None
+    price_type: Optional[str] = None
+    in_stock: Optional[bool] = None  # True = stock > 0, False = หมด (0 หรือไม่ระบุ)
+    min_price: Optional[Decimal] = None
+    max_price: Optional[Decimal] = None
 
 
 @dataclass
@@ -66,27 +95,226 @@ DB_PORT = int(os.environ.get("DB_PORT", "5432"))
 DATABASE_URL = os.environ.get("DATABASE_URL")  # Render/Railway ใช้ตัวนี้
 
 
-def get_connection():
-    """คืนค่า connection ไปยังฐานข้อมูล champa"""
+# Connection pool: ใช้ connection ซ้ำแทนการ psycopg2.connect ใหม่ทุกครั้ง
+DB_POOL_MIN = int(os.environ.get("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.environ.get("DB_POOL_MAX", "10"))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "10"))  # วินาทีที่รอ connection ว่าง
+DB_POOL_RECYCLE = float(os.environ.get("DB_POOL_RECYCLE", "1800"))  # อายุสูงสุดของ connection (วินาที)
+DB_POOL_PING_AFTER = float(os.environ.get("DB_POOL_PING_AFTER", "30"))  # idle นานกว่านี้ต้อง SELECT 1 ก่อนใช้
+
+
+def _connect_params() -> Dict:
+    """พารามิเตอร์เชื่อมต่อ (ใช้ร่วมกับ pool แบบ async ใน pyhon_async.py)"""
     if DATABASE_URL:
         # บาง host ใช้ postgres:// ต้องเปลี่ยนเป็น postgresql:// สำหรับ psycopg2
         url = DATABASE_URL
         if url.startswith("postgres://"):
             url = "postgresql://" + url[9:]
-        return psycopg2.connect(url)
-    return psycopg2.connect(
-        dbname=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD,
-        host=DB_HOST,
-        port=DB_PORT,
-    )
+        return {"dsn": url}
+    return {
+        "dbname": DB_NAME,
+        "user": DB_USER,
+        "password": DB_PASSWORD,
+        "host": DB_HOST,
+        "port": DB_PORT,
+    }
+
+
+def _connect():
+    """เปิด connection ใหม่ไปยังฐานข้อมูล champa (ใช้ภายใน pool เท่านั้น)"""
+    return psycopg2.connect(**_connect_params())
+
+
+class _ConnectionPool:
+    """
+    Pool แบบ thread-safe ต่อ process
+    - จำกัดจำนวน connection ที่เปิดพร้อมกันไม่เกิน maxconn (รอได้ไม่เกิน timeout)
+    - connection ที่ idle นานเกิน ping_after จะถูกเช็คด้วย SELECT 1 ก่อนส่งให้ผู้เรียก
+    - connection ที่อายุเกิน recycle จะถูกปิดแล้วเปิดใหม่
+    """
+
+    def __init__(self, minconn: int, maxconn: int, timeout: float, recycle: float, ping_after: float):
+        self.pid = os.getpid()
+        self.minconn = max(0, min(minconn, maxconn))
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_after = ping_after
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._idle: List[tuple] = []  # (conn, last_used)
+        self._born: Dict[int, float] = {}  # id(conn) -> เวลาที่เปิด
+        self._prefilled = False
+
+    def _open(self):
+        conn = _connect()
+        self._born[id(conn)] = time.monotonic()
+        return conn
+
+    def _discard(self, conn) -> None:
+        self._born.pop(id(conn), None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _expired(self, conn) -> bool:
+        born = self._born.get(id(conn))
+        return born is None or (self.recycle > 0 and time.monotonic() - born > self.recycle)
+
+    def _alive(self, conn) -> bool:
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _prefill(self) -> None:
+        with self._lock:
+            if self._prefilled:
+                return
+            self._prefilled = True
+        for _ in range(self.minconn):
+            try:
+                conn = self._open()
+            except Exception:
+                break
+            with self._lock:
+                self._idle.append((conn, time.monotonic()))
+
+    def getconn(self):
+        if not self._prefilled:
+            self._prefill()
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolError("connection pool เต็ม (รอเกิน %s วินาที)" % self.timeout)
+        try:
+            while True:
+                with self._lock:
+                    item = self._idle.pop() if self._idle else None
+                if item is None:
+                    return self._open()
+                conn, last_used = item
+                if conn.closed or self._expired(conn):
+                    self._discard(conn)
+                    continue
+                if time.monotonic() - last_used > self.ping_after and not self._alive(conn):
+                    self._discard(conn)
+                    continue
+                return conn
+        except Exception:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn, discard: bool = False) -> None:
+        try:
+            if not discard and not conn.closed and not self._expired(conn):
+                try:
+                    if conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                        conn.rollback()
+                except Exception:
+                    discard = True
+                if not discard:
+                    with self._lock:
+                        self._idle.append((conn, time.monotonic()))
+                    return
+            self._discard(conn)
+        finally:
+            self._slots.release()
+
+    def closeall(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._discard(conn)
+
+
+_POOL: Optional[_ConnectionPool] = None
+_POOL_LOCK = threading.Lock()
+# connection ที่ติดมาจาก process แม่หลัง fork: เก็บ reference ไว้เฉยๆ ห้าม close
+# (ถ้า close/GC ใน process ลูก จะส่ง Terminate ไปบน socket เดียวกับของ process แม่)
+_INHERITED_POOLS: List[_ConnectionPool] = []
+
+
+def _get_pool() -> _ConnectionPool:
+    global _POOL
+    pool = _POOL
+    if pool is not None and pool.pid == os.getpid():
+        return pool
+    with _POOL_LOCK:
+        if _POOL is not None and _POOL.pid != os.getpid():
+            _INHERITED_POOLS.append(_POOL)
+            _POOL = None
+        if _POOL is None:
+            _POOL = _ConnectionPool(
+                minconn=DB_POOL_MIN,
+                maxconn=DB_POOL_MAX,
+                timeout=DB_POOL_TIMEOUT,
+                recycle=DB_POOL_RECYCLE,
+                ping_after=DB_POOL_PING_AFTER,
+            )
+        return _POOL
+
+
+def _reset_pool_after_fork() -> None:
+    """เรียกใน process ลูกหลัง fork (เช่น gunicorn worker) ให้สร้าง pool ใหม่ของตัวเอง"""
+    global _POOL
+    if _POOL is not None:
+        _INHERITED_POOLS.append(_POOL)
+        _POOL = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_pool_after_fork)
 
 
-def init_db() -> None:
-    """สร้างตารางพื้นฐาน (users, products) ถ้ายังไม่มี"""
+def close_pool() -> None:
+    """ปิด connection ที่ idle ทั้งหมดของ process นี้ (เช่น ตอน worker shutdown)"""
+    global _POOL
+    with _POOL_LOCK:
+        pool, _POOL = _POOL, None
+    if pool is not None and pool.pid == os.getpid():
+        pool.closeall()
+
+
+@contextmanager
+def get_connection():
+    """
+    ยืม connection จาก pool ไปยังฐานข้อมูล champa
+    ใช้แบบ `with get_connection() as conn:` — จบ block แล้ว commit (หรือ rollback ถ้า error)
+    และคืน connection เข้า pool ให้อัตโนมัติ
+    """
+    pool = _get_pool()
+    conn = pool.getconn()
+    discard = False
+    try:
+        with conn:
+            yield conn
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        discard = True
+        raise
+    finally:
+        pool.putconn(conn, discard=discard or bool(conn.closed))
+
+
+def init_db() -> int:
+    """
+    สร้างตารางพื้นฐาน (users, products) ถ้ายังไม่มี แล้ว migrate schema ให้เป็นล่าสุด
+    ควรเรียกครั้งเดียวต่อ deploy (gunicorn on_starting / `flask --app app init-db`) ไม่ใช่ตอนมี request
+    คืนค่า schema version หลังรัน
+    """
+    # schema ล่าสุดแล้ว: ไม่ต้องแตะ DDL (ALTER TABLE ... IF NOT EXISTS ยังล็อกตารางแบบ exclusive)
+    version = get_schema_version()
+    if version >= SCHEMA_VERSION:
+        # pg_trgm อาจถูกติดตั้งทีหลัง (ผู้ดูแลรัน CREATE EXTENSION) — สร้าง trigram index ตอน restart ครั้งถัดไป
+        if not _search_trigram_ready():
+            _ensure_search_trigram()
+        return version
+
     with get_connection() as conn:
         with conn.cursor() as cur:
+            # กันหลาย process (เช่น deploy ซ้อนกัน) สร้างตารางพร้อมกัน — ปล่อยเองตอน commit
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", (_MIGRATION_LOCK_KEY,))
             cur.execute(
                 """
                 CREATE TABLE IF NOT EXISTS users (
@@ -137,32 +365,816 @@ def init_db() -> None:
                 );
                 """
             )
+            # สรุปคะแนนรีวิวต่อสินค้า (อัปเดตใน transaction เดียวกับที่เขียนรีวิว) อ่านได้ O(1)
+            cur.execute(
+                """
+                CREATE TABLE IF NOT EXISTS product_rating_stats (
+                    product_id INTEGER PRIMARY KEY REFERENCES products(id) ON DELETE CASCADE,
+                    review_count INTEGER NOT NULL DEFAULT 0,
+                    rating_sum INTEGER NOT NULL DEFAULT 0,
+                    stars_1 INTEGER NOT NULL DEFAULT 0,
+                    stars_2 INTEGER NOT NULL DEFAULT 0,
+                    stars_3 INTEGER NOT NULL DEFAULT 0,
+                    stars_4 INTEGER NOT NULL DEFAULT 0,
+                    stars_5 INTEGER NOT NULL DEFAULT 0,
+                    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+                );
+                """
+            )
+            # เติมสถิติให้สินค้าที่มีรีวิวอยู่แล้วแต่ยังไม่มีแถวสรุป
+            cur.execute(
+                """
+                INSERT INTO product_rating_stats
+                    (product_id, review_count, rating_sum, stars_1, stars_2, stars_3, stars_4, stars_5)
+                SELECT
+                    product_id,
+                    COUNT(*),
+                    SUM(rating),
+                    COUNT(*) FILTER (WHERE rating = 1),
+                    COUNT(*) FILTER (WHERE rating = 2),
+                    COUNT(*) FILTER (WHERE rating = 3),
+                    COUNT(*) FILTER (WHERE rating = 4),
+                    COUNT(*) FILTER (WHERE rating = 5)
+                FROM product_reviews
+                WHERE product_id IS NOT NULL
+                GROUP BY product_id
+                ON CONFLICT (product_id) DO NOTHING;
+                """
+            )
             cur.execute(
                 """
                 CREATE TABLE IF NOT EXISTS user_sessions (
                     token TEXT PRIMARY KEY,
                     user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-                    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+                    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                    last_seen_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+                );
+                """
+            )
+            # version ของข้อมูล catalogue (เพิ่มทุกครั้งที่มีการเขียน) ใช้ทำ ETag ให้ API สาธารณะ
+            cur.execute(
+                """
+                CREATE TABLE IF NOT EXISTS catalog_versions (
+                    name TEXT PRIMARY KEY,
+                    version BIGINT NOT NULL DEFAULT 0,
+                    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
                 );
                 """
             )
+            cur.execute(
+                "INSERT INTO catalog_versions (name) VALUES ('products'), ('reviews') ON CONFLICT (name) DO NOTHING;"
+            )
+            # sliding expiry: เวลาที่ใช้ token ล่าสุด (index อยู่ใน MIGRATIONS)
+            cur.execute("ALTER TABLE user_sessions ADD COLUMN IF NOT EXISTS last_seen_at TIMESTAMPTZ NOT NULL DEFAULT NOW();")
+    return migrate()
 
 
 # ==========================
-#  Session (memory + DB เพื่อให้อยู่ได้ตลอดจนกว่าผู้ใช้กดออกจากระบบ)
+#  Schema Migrations (index และการเปลี่ยน schema แบบมีเลข version)
 # ==========================
 
-SESSIONS: Dict[str, int] = {}  # token -> user_id (int)
+# แต่ละขั้น: (version, คำอธิบาย, คำสั่ง SQL) — เรียงตาม version และห้ามแก้ขั้นที่ deploy ไปแล้ว
+# ให้เพิ่มขั้นใหม่ต่อท้ายเสมอ ทุกคำสั่งต้องรันซ้ำได้ (IF NOT EXISTS) เผื่อฐานข้อมูลเก่ามี index อยู่แล้ว
+MIGRATIONS: List[Tuple[int, str, List[str]]] = [
+    (
+        1,
+        "keyset pagination ของ /api/products และ /api/reviews (ใหม่สุดก่อน)",
+        [
+            "CREATE INDEX IF NOT EXISTS idx_products_created_at_id ON products (created_at, id)",
+            "CREATE INDEX IF NOT EXISTS idx_product_reviews_created_at_id ON product_reviews (created_at, id)",
+        ],
+    ),
+    (
+        2,
+        "sweeper หา session หมดอายุ",
+        ["CREATE INDEX IF NOT EXISTS idx_user_sessions_last_seen_at ON user_sessions (last_seen_at)"],
+    ),
+    (
+        3,
+        "login ด้วยเบอร์มือถือ (_get_user_by_phone)",
+        ["CREATE INDEX IF NOT EXISTS idx_users_phone ON users (phone)"],
+    ),
+    (
+        4,
+        "list_admins / list_customers / count_admins: กรอง role แล้วเรียง created_at",
+        ["CREATE INDEX IF NOT EXISTS idx_users_role_created_at ON users (role, created_at)"],
+    ),
+    (
+        5,
+        "รีวิวของสินค้าหนึ่งชิ้น เรียงใหม่สุดก่อน + ON DELETE CASCADE จาก products",
+        ["CREATE INDEX IF NOT EXISTS idx_product_reviews_product_created_id ON product_reviews (product_id, created_at, id)"],
+    ),
+    (
+        6,
+        "ON DELETE CASCADE จาก users ไปยัง user_sessions",
+        ["CREATE INDEX IF NOT EXISTS idx_user_sessions_user_id ON user_sessions (user_id)"],
+    ),
+    (
+        7,
+        "ไฟล์อัปโหลดแบบ content-addressed + reference count (blob_store.py)",
+        [
+            """
+            CREATE TABLE IF NOT EXISTS upload_blobs (
+                path TEXT PRIMARY KEY,
+                refcount INTEGER NOT NULL DEFAULT 0 CHECK (refcount >= 0),
+                size_bytes BIGINT,
+                created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                orphaned_at TIMESTAMPTZ
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_upload_blobs_orphaned_at ON upload_blobs (orphaned_at) WHERE refcount = 0",
+        ],
+    ),
+    (
+        8,
+        "เบอร์มือถือไม่ซ้ำ: register เป็น INSERT ... ON CONFLICT, login หา username หรือเบอร์ใน query เดียว",
+        [
+            # บัญชีเก่าที่เบอร์ซ้ำกัน: เบอร์อยู่กับบัญชีแรกสุด บัญชีอื่นยังล็อกอินด้วย username ได้
+            # เบอร์ที่ถูกล้างเก็บไว้ใน users_phone_conflicts (ไม่มี foreign key: ลบ user แล้วบันทึกยังอยู่)
+            # ให้ admin ตรวจ/คืนเบอร์ให้บัญชีที่ถูกต้องเองได้
+            """
+            CREATE TABLE IF NOT EXISTS users_phone_conflicts (
+                user_id INTEGER NOT NULL,
+                phone TEXT NOT NULL,
+                kept_by_user_id INTEGER NOT NULL,
+                cleared_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+            )
+            """,
+            """
+            INSERT INTO users_phone_conflicts (user_id, phone, kept_by_user_id)
+            SELECT u.id, u.phone, (SELECT MIN(o.id) FROM users o WHERE o.phone = u.phone)
+            FROM users u
+            WHERE u.phone IS NOT NULL
+              AND EXISTS (SELECT 1 FROM users o WHERE o.phone = u.phone AND o.id < u.id)
+            """,
+            """
+            UPDATE users u SET phone = NULL
+            FROM users_phone_conflicts c
+            WHERE c.user_id = u.id AND c.phone = u.phone
+            """,
+            # migrate() log ข้อความนี้ (จำนวนบัญชี + user id) ตอน deploy
+            """
+            DO $$
+            DECLARE
+                cleared INTEGER;
+                ids TEXT;
+            BEGIN
+                SELECT COUNT(*), string_agg(user_id::TEXT, ', ' ORDER BY user_id) INTO cleared, ids
+                FROM users_phone_conflicts;
+                IF cleared > 0 THEN
+                    RAISE WARNING 'ล้างเบอร์มือถือที่ซ้ำของ % บัญชี (user id: %) — เบอร์เดิมอยู่ในตาราง users_phone_conflicts',
+                        cleared, ids;
+                END IF;
+            END $$
+            """,
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_users_phone_unique ON users (phone)",
+            "DROP INDEX IF EXISTS idx_users_phone",
+        ],
+    ),
+    (
+        9,
+        "ค้นหาสินค้า /api/search: tsvector + GIN (trigram index เป็นขั้นเสริม ดู _ensure_search_trigram)",
+        [
+            # generated column: PostgreSQL คำนวณใหม่เองทุกครั้งที่ INSERT/UPDATE ไม่ต้องมี trigger
+            # (ADD COLUMN ... STORED เขียนตาราง products ใหม่ทั้งตารางครั้งเดียวตอน migrate)
+            """
+            ALTER TABLE products ADD COLUMN IF NOT EXISTS search_vector TSVECTOR
+            GENERATED ALWAYS AS (
+                setweight(to_tsvector('simple', COALESCE(name, '')), 'A')
+                || setweight(to_tsvector('simple', COALESCE(category, '')), 'B')
+                || setweight(to_tsvector('simple', COALESCE(description, '')), 'C')
+            ) STORED
+            """,
+            """
+            ALTER TABLE products ADD COLUMN IF NOT EXISTS search_text TEXT
+            GENERATED ALWAYS AS (
+                LOWER(COALESCE(name, '') || ' ' || COALESCE(category, '') || ' ' || COALESCE(description, ''))
+            ) STORED
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_products_search_vector ON products USING GIN (search_vector)",
+        ],
+    ),
+    (
+        10,
+        "กรองรายการสินค้าที่ server (หมวดหมู่ / ประเภท / มีของ / ช่วงราคา) เรียงใหม่สุดก่อน",
+        [
+            "CREATE INDEX IF NOT EXISTS idx_products_category_created_id ON products (category, created_at, id)",
+            "CREATE INDEX IF NOT EXISTS idx_products_price_type_created_id ON products (price_type, created_at, id)",
+            "CREATE INDEX IF NOT EXISTS idx_products_in_stock_created_id ON products (created_at, id) WHERE stock > 0",
+            "CREATE INDEX IF NOT EXISTS idx_products_price ON products (price)",
+        ],
+    ),
+]
+
+# version ที่โค้ดชุดนี้ต้องการ (readiness ของ /health เทียบกับค่านี้)
+SCHEMA_VERSION = max(version for version, _, _ in MIGRATIONS)
+
+# กันไม่ให้หลาย process (เช่น gunicorn master ของ deploy ที่ซ้อนกัน) สร้างตาราง/migrate พร้อมกัน
+_MIGRATION_LOCK_KEY = 7_310_002
+
+
+def get_schema_version() -> int:
+    """version ล่าสุดที่ migrate แล้ว (0 ถ้ายังไม่เคย)"""
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT to_regclass('schema_version') IS NOT NULL")
+            if not cur.fetchone()[0]:
+                return 0
+            cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+            return int(cur.fetchone()[0])
+
+
+def migrate() -> int:
+    """
+    รันขั้นใน MIGRATIONS ที่ยังไม่เคยรัน ตามลำดับ version
+    แต่ละขั้นอยู่ใน transaction ของตัวเอง (พร้อมบันทึกลง schema_version) ถ้าพังกลางทางจะ rollback ทั้งขั้น
+    คืนค่า version ล่าสุดหลัง migrate
+    """
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INTEGER PRIMARY KEY,
+                    description TEXT NOT NULL,
+                    applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+                );
+                """
+            )
+
+    current = 0
+    for version, description, statements in sorted(MIGRATIONS, key=lambda m: m[0]):
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                # lock ถูกปล่อยเองตอน commit/rollback; process ที่รอจะเห็นว่าขั้นนี้รันไปแล้ว
+                cur.execute("SELECT pg_advisory_xact_lock(%s)", (_MIGRATION_LOCK_KEY,))
+                cur.execute("SELECT 1 FROM schema_version WHERE version = %s", (version,))
+                if cur.fetchone() is None:
+                    logger.info("migrate schema v%s: %s", version, description)
+                    del conn.notices[:]
+                    for statement in statements:
+                        cur.execute(statement)
+                    # RAISE WARNING/NOTICE ของขั้นนี้ (เช่น ข้อมูลที่ถูกแก้) ให้เห็นใน log ของ deploy
+                    for notice in conn.notices:
+                        logger.warning("migrate schema v%s: %s", version, notice.strip())
+                    cur.execute(
+                        "INSERT INTO schema_version (version, description) VALUES (%s, %s)",
+                        (version, description),
+                    )
+        current = version
+    if current >= 9:
+        _ensure_search_trigram()
+    return current
+
+
+# pg_trgm (ค้นข้อความกลางคำของภาษาลาว/ไทย) ไม่บังคับ: role ของแอปอาจสร้าง extension ไม่ได้
+# (ต้องเป็นเจ้าของฐานข้อมูลบน PostgreSQL 13+ ที่ pg_trgm เป็น trusted extension หรือ superuser)
+# ทำไม่ได้ให้ WARNING แล้วค้นหาแบบไม่มี trigram — ไม่ทำให้ migrate ล้มและ /health ไม่พร้อมทั้งแอป
+_SEARCH_TRIGRAM_SETUP_SQL = """
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') THEN
+        IF NOT EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm') THEN
+            RAISE WARNING 'ไม่มี extension pg_trgm บนเซิร์ฟเวอร์นี้ — /api/search ค้นกลางคำได้แต่ไม่มี trigram index';
+            RETURN;
+        END IF;
+        BEGIN
+            CREATE EXTENSION pg_trgm;
+        EXCEPTION WHEN OTHERS THEN
+            RAISE WARNING 'สร้าง extension pg_trgm ไม่ได้ (%) — ให้ผู้ดูแลฐานข้อมูลรัน CREATE EXTENSION pg_trgm แล้ว restart แอป', SQLERRM;
+            RETURN;
+        END;
+    END IF;
+    CREATE INDEX IF NOT EXISTS idx_products_search_text_trgm ON products USING GIN (search_text gin_trgm_ops);
+END $$
+"""
+
+_SEARCH_TRIGRAM_SQL = "SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')"
+
+# pg_trgm ใช้ได้ไหม — ตั้งตอน migrate หรือตรวจครั้งแรกที่ค้นหาของ process (ติดตั้งทีหลังต้อง restart)
+_search_trigram: Optional[bool] = None
+
+
+def _ensure_search_trigram() -> None:
+    """สร้าง pg_trgm + trigram index ของการค้นหาถ้าทำได้ (รันทุกครั้งที่ migrate, ซ้ำได้)"""
+    global _search_trigram
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            # กันหลาย process สร้าง index พร้อมกัน (lock เดียวกับ migrate)
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", (_MIGRATION_LOCK_KEY,))
+            del conn.notices[:]
+            cur.execute(_SEARCH_TRIGRAM_SETUP_SQL)
+            for notice in conn.notices:
+                logger.warning("search trigram: %s", notice.strip())
+            cur.execute(_SEARCH_TRIGRAM_SQL)
+            _search_trigram = bool(cur.fetchone()[0])
+
+
+def _search_trigram_ready() -> bool:
+    """มี pg_trgm และ trigram index แล้วหรือยัง (อ่านอย่างเดียว ไม่ล็อกตาราง)"""
+    global _search_trigram
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'),"
+                " to_regclass('idx_products_search_text_trgm') IS NOT NULL"
+            )
+            has_extension, has_index = cur.fetchone()
+    _search_trigram = bool(has_extension)
+    return bool(has_extension and has_index)
+
+
+def _has_search_trigram() -> bool:
+    global _search_trigram
+    if _search_trigram is None:
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(_SEARCH_TRIGRAM_SQL)
+                _search_trigram = bool(cur.fetchone()[0])
+    return _search_trigram
 
 
 # ==========================
-#  Helper Functions
+#  Session Store (memory cache + DB ให้ทุก worker เห็น session เดียวกัน)
+# ==========================
+
+# session หมดอายุเมื่อไม่ได้ใช้งานนานเกินนี้ (sliding: ทุกครั้งที่ใช้ token จะต่ออายุ) — 0 = ไม่หมดอายุ
+SESSION_IDLE_TTL = float(os.environ.get("SESSION_IDLE_TTL", str(30 * 24 * 3600)))
+SESSION_STORE = os.environ.get("SESSION_STORE", "postgres")  # "postgres" หรือ "memory" (dev, ไม่แชร์ข้าม worker)
+SESSION_SWEEP_INTERVAL = float(os.environ.get("SESSION_SWEEP_INTERVAL", "600"))  # วินาที, 0 = ปิด sweeper
+SESSION_SWEEP_BATCH = int(os.environ.get("SESSION_SWEEP_BATCH", "500"))
+
+# Cache ของ token -> User ที่ resolve แล้ว (จำกัดจำนวน + มีอายุ) ให้ token ที่ใช้ซ้ำไม่ต้องแตะ DB
+AUTH_CACHE_SIZE = int(os.environ.get("AUTH_CACHE_SIZE", "1024"))
+AUTH_CACHE_TTL = float(os.environ.get("AUTH_CACHE_TTL", "30"))  # วินาที
+
+_SESSION_SWEEP_LOCK_KEY = 7_310_001  # key ของ pg advisory lock ให้ sweep ทีละ worker
+
+# NOTIFY ให้ทุก worker ทิ้ง session ที่ cache ไว้ (logout, ลบ user, เปลี่ยน role) — payload "token:<sha256>" / "user:<id>"
+SESSION_CHANNEL = "session_revoked"
+SESSION_LISTEN_RETRY = 5.0  # วินาทีก่อนต่อ LISTEN ใหม่เมื่อหลุด
+SESSION_LISTEN_PING = 30.0  # ถ้าเงียบนานเท่านี้ให้ SELECT 1 เช็คว่า connection ยังอยู่
+
+
+def _token_digest(token: str) -> str:
+    """ตัวแทนของ token ใน NOTIFY (ไม่ส่ง token จริงออกไปนอกตาราง)"""
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+class SessionStore:
+    """Interface ของที่เก็บ session (token -> User)"""
+
+    def create(self, token: str, user: User) -> None:
+        raise NotImplementedError
+
+    def resolve(self, token: str) -> Optional[User]:
+        """คืน User ของ token (และต่ออายุ session) หรือ None ถ้าไม่มี/หมดอายุ"""
+        raise NotImplementedError
+
+    def delete(self, token: str) -> None:
+        raise NotImplementedError
+
+    def forget_user(self, user_id) -> None:
+        """ทิ้งข้อมูล user ที่ cache ไว้ (เรียกเมื่อ role เปลี่ยนหรือ user ถูกลบ)"""
+        raise NotImplementedError
+
+    def prune_expired(self) -> int:
+        """ลบ session ที่หมดอายุ คืนจำนวนที่ลบ"""
+        return 0
+
+
+class MemorySessionStore(SessionStore):
+    """
+    LRU + TTL ในหน่วยความจำของ process
+    - max_entries จำกัดขนาด (ตัวเก่าสุดจะถูกไล่ออกก่อน)
+    - sliding=True ต่ออายุทุกครั้งที่ resolve, False ใช้เป็น cache อายุสั้นหน้า store อื่น
+    """
+
+    def __init__(self, max_entries: int, ttl: float, sliding: bool = True):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.sliding = sliding
+        self._lock = threading.Lock()
+        self._items: "OrderedDict[str, tuple]" = OrderedDict()  # token -> (User, expires_at)
+
+    def _expires_at(self) -> float:
+        return time.monotonic() + self.ttl if self.ttl > 0 else float("inf")
+
+    def create(self, token: str, user: User) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._items[token] = (user, self._expires_at())
+            self._items.move_to_end(token)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def resolve(self, token: str) -> Optional[User]:
+        with self._lock:
+            item = self._items.get(token)
+            if item is None:
+                return None
+            user, expires_at = item
+            if expires_at < time.monotonic():
+                del self._items[token]
+                return None
+            if self.sliding:
+                self._items[token] = (user, self._expires_at())
+            self._items.move_to_end(token)
+            return user
+
+    def delete(self, token: str) -> None:
+        with self._lock:
+            self._items.pop(token, None)
+
+    def forget_user(self, user_id) -> None:
+        uid = int(user_id)
+        with self._lock:
+            for token in [t for t, (u, _) in self._items.items() if u.id == uid]:
+                del self._items[token]
+
+    def forget_digest(self, digest: str) -> None:
+        """ทิ้ง token ที่ _token_digest ตรงกับ digest (มาจาก NOTIFY ของ worker อื่น)"""
+        with self._lock:
+            for token in [t for t in self._items if _token_digest(t) == digest]:
+                del self._items[token]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+    def prune_expired(self) -> int:
+        now = time.monotonic()
+        with self._lock:
+            expired = [t for t, (_, exp) in self._items.items() if exp < now]
+            for token in expired:
+                del self._items[token]
+        return len(expired)
+
+
+class PostgresSessionStore(SessionStore):
+    """เก็บ session ในตาราง user_sessions (แชร์ระหว่าง gunicorn worker และอยู่รอดหลัง restart)"""
+
+    def __init__(self, idle_ttl: float, sweep_batch: int):
+        self.idle_ttl = idle_ttl
+        self.sweep_batch = sweep_batch
+
+    def create(self, token: str, user: User) -> None:
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "INSERT INTO user_sessions (token, user_id) VALUES (%s, %s)",
+                    (token, user.id),
+                )
+
+    def resolve(self, token: str) -> Optional[User]:
+        # ต่ออายุ session + ดึง user ใน round trip เดียว
+        with get_connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute(
+                    """
+                    UPDATE user_sessions s
+                    SET last_seen_at = NOW()
+                    FROM users u
+                    WHERE s.token = %s
+                      AND u.id = s.user_id
+                      AND (%s <= 0 OR s.last_seen_at > NOW() - make_interval(secs => %s))
+                    RETURNING
+                        u.id,
+                        u.username,
+                        u.phone,
+                        u.password_hash,
+                        u.role,
+                        EXTRACT(EPOCH FROM u.created_at) AS created_at
+                    """,
+                    (token, self.idle_ttl, self.idle_ttl),
+                )
+                row = cur.fetchone()
+        return _row_to_user(row) if row else None
+
+    def delete(self, token: str) -> None:
+        # NOTIFY ถูกส่งตอน commit พร้อมกับการลบ — worker อื่นทิ้ง token นี้จาก cache
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "WITH deleted AS (DELETE FROM user_sessions WHERE token = %s) SELECT pg_notify(%s, %s)",
+                    (token, SESSION_CHANNEL, "token:" + _token_digest(token)),
+                )
+
+    def forget_user(self, user_id) -> None:
+        # ข้อมูล user อ่านสดจากตาราง users ทุกครั้ง และ session ถูกลบตาม ON DELETE CASCADE อยู่แล้ว
+        # แต่ cache ของ worker อื่นยังถือ User เดิม (role เดิม) อยู่: แจ้งให้ทิ้ง
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_notify(%s, %s)", (SESSION_CHANNEL, f"user:{int(user_id)}"))
+
+    def prune_expired(self) -> int:
+        """ลบ session หมดอายุทีละ batch (ไม่ล็อกตารางนาน) — ถ้ามี worker อื่นกำลัง sweep อยู่จะข้ามไป"""
+        if self.idle_ttl <= 0:
+            return 0
+        total = 0
+        with get_connection() as conn:
+            conn.autocommit = True
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT pg_try_advisory_lock(%s)", (_SESSION_SWEEP_LOCK_KEY,))
+                    if not cur.fetchone()[0]:
+                        return 0
+                    try:
+                        while True:
+                            cur.execute(
+                                """
+                                DELETE FROM user_sessions
+                                WHERE token IN (
+                                    SELECT token FROM user_sessions
+                                    WHERE last_seen_at < NOW() - make_interval(secs => %s)
+                                    LIMIT %s
+                                )
+                                """,
+                                (self.idle_ttl, self.sweep_batch),
+                            )
+                            total += cur.rowcount
+                            if cur.rowcount < self.sweep_batch:
+                                break
+                    finally:
+                        cur.execute("SELECT pg_advisory_unlock(%s)", (_SESSION_SWEEP_LOCK_KEY,))
+            finally:
+                conn.autocommit = False
+        return total
+
+
+class CachedSessionStore(SessionStore):
+    """
+    ใช้ cache ในหน่วยความจำ (อายุสั้น) หน้า store หลัก เพื่อให้ token ที่ใช้ซ้ำไม่ต้องแตะ DB
+    - logout / ลบ user / เปลี่ยน role ใน worker ไหนก็ตาม ถูกส่งมาทาง NOTIFY (_session_listener) แล้วทิ้งจาก cache
+    - ใช้ cache เฉพาะตอน listener ต่ออยู่ (listening) — หลุดเมื่อไหร่ resolve จาก store หลักทุกครั้ง
+    """
+
+    def __init__(self, backend: SessionStore, cache: MemorySessionStore):
+        self.backend = backend
+        self.cache = cache
+        self.listening = False
+        # เพิ่มทุกครั้งที่มีการเพิกถอน กันผลที่อ่านจาก DB ก่อนเพิกถอนถูกเก็บลง cache ทีหลัง
+        self._generation = 0
+
+    def create(self, token: str, user: User) -> None:
+        self.backend.create(token, user)
+        if self.listening:
+            self.cache.create(token, user)
+
+    def resolve(self, token: str) -> Optional[User]:
+        if not self.listening:
+            return self.backend.resolve(token)
+        user = self.cache.resolve(token)
+        if user is None:
+            generation = self._generation
+            user = self.backend.resolve(token)
+            if user is not None and generation == self._generation and self.listening:
+                self.cache.create(token, user)
+        return user
+
+    def delete(self, token: str) -> None:
+        self._generation += 1
+        self.cache.delete(token)
+        self.backend.delete(token)
+
+    def forget_user(self, user_id) -> None:
+        self._generation += 1
+        self.cache.forget_user(user_id)
+        self.backend.forget_user(user_id)
+
+    def revoke(self, payload: str) -> None:
+        """payload จาก NOTIFY ช่อง SESSION_CHANNEL"""
+        self._generation += 1
+        kind, _, value = payload.partition(":")
+        if kind == "user" and value.isdigit():
+            self.cache.forget_user(int(value))
+        elif kind == "token":
+            self.cache.forget_digest(value)
+        else:
+            self.cache.clear()
+
+    def reset(self, listening: bool) -> None:
+        """เริ่ม/หยุดใช้ cache — ระหว่างที่ listener หลุดอาจพลาด NOTIFY จึงทิ้ง cache ทั้งหมด"""
+        self._generation += 1
+        self.listening = listening
+        self.cache.clear()
+
+    def prune_expired(self) -> int:
+        self.cache.prune_expired()
+        return self.backend.prune_expired()
+
+
+_SESSION_STORE: Optional[SessionStore] = None
+_SESSION_STORE_PID: Optional[int] = None
+_SESSION_STORE_LOCK = threading.Lock()
+
+
+def _build_session_store() -> SessionStore:
+    if SESSION_STORE == "memory":
+        return MemorySessionStore(max_entries=AUTH_CACHE_SIZE, ttl=SESSION_IDLE_TTL, sliding=True)
+    return CachedSessionStore(
+        backend=PostgresSessionStore(idle_ttl=SESSION_IDLE_TTL, sweep_batch=SESSION_SWEEP_BATCH),
+        cache=MemorySessionStore(max_entries=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL, sliding=False),
+    )
+
+
+def _session_sweeper(store: SessionStore) -> None:
+    while True:
+        time.sleep(SESSION_SWEEP_INTERVAL)
+        try:
+            removed = store.prune_expired()
+            if removed:
+                logger.info("session sweeper: ลบ session หมดอายุ %d รายการ", removed)
+        except Exception as e:
+            logger.warning("session sweeper error: %s", e)
+
+
+def _session_listener(store: CachedSessionStore) -> None:
+    """LISTEN ช่อง session_revoked ด้วย connection แยก (ไม่ใช้ pool) แล้วทิ้ง session ที่ cache ไว้ตาม payload"""
+    while True:
+        conn = None
+        try:
+            conn = _connect()
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute(f"LISTEN {SESSION_CHANNEL}")
+            store.reset(listening=True)
+            while True:
+                if select.select([conn], [], [], SESSION_LISTEN_PING) == ([], [], []):
+                    with conn.cursor() as cur:
+                        cur.execute("SELECT 1")
+                conn.poll()
+                while conn.notifies:
+                    store.revoke(conn.notifies.pop(0).payload)
+        except Exception as e:
+            logger.warning("session listener error: %s", e)
+        finally:
+            store.reset(listening=False)
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+        time.sleep(SESSION_LISTEN_RETRY)
+
+
+def get_session_store() -> SessionStore:
+    """คืน session store ของ process นี้ (สร้างใหม่ + เริ่ม sweeper หลัง fork)"""
+    global _SESSION_STORE, _SESSION_STORE_PID
+    if _SESSION_STORE is not None and _SESSION_STORE_PID == os.getpid():
+        return _SESSION_STORE
+    with _SESSION_STORE_LOCK:
+        if _SESSION_STORE is None or _SESSION_STORE_PID != os.getpid():
+            store = _build_session_store()
+            if isinstance(store, CachedSessionStore):
+                threading.Thread(target=_session_listener, args=(store,), name="session-listener", daemon=True).start()
+            if SESSION_SWEEP_INTERVAL > 0:
+                threading.Thread(target=_session_sweeper, args=(store,), name="session-sweeper", daemon=True).start()
+            _SESSION_STORE, _SESSION_STORE_PID = store, os.getpid()
+        return _SESSION_STORE
+
+
+# ==========================
+#  Password Hashing (KDF มี salt + thread pool จำกัดจำนวน)
 # ==========================
 
+# รูปแบบที่เก็บใน users.password_hash: "<scheme>$<params คั่นด้วย ,>$<salt b64>$<hash b64>"
+# hash เก่า (SHA-256 hex ไม่มี salt) ยังล็อกอินได้ และจะถูก rehash ให้อัตโนมัติเมื่อล็อกอินสำเร็จ
+PASSWORD_HASH_SCHEME = os.environ.get("PASSWORD_HASH_SCHEME", "scrypt")  # "scrypt" หรือ "pbkdf2_sha256"
+PASSWORD_SCRYPT_N = int(os.environ.get("PASSWORD_SCRYPT_N", str(2 ** 14)))  # ใช้ RAM ประมาณ 128 * N * r ไบต์
+PASSWORD_SCRYPT_R = int(os.environ.get("PASSWORD_SCRYPT_R", "8"))
+PASSWORD_SCRYPT_P = int(os.environ.get("PASSWORD_SCRYPT_P", "1"))
+PASSWORD_PBKDF2_ITERATIONS = int(os.environ.get("PASSWORD_PBKDF2_ITERATIONS", "600000"))
+
+# KDF กิน CPU (และ RAM สำหรับ scrypt) — จำกัดจำนวนที่คำนวณพร้อมกันต่อ process
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_TIMEOUT = float(os.environ.get("PASSWORD_HASH_TIMEOUT", "10"))  # วินาที (รอคิว + คำนวณ)
+
+_KDF_EXECUTOR: Optional[ThreadPoolExecutor] = None
+_KDF_EXECUTOR_PID: Optional[int] = None
+_KDF_EXECUTOR_LOCK = threading.Lock()
+_DUMMY_PASSWORD_HASH: Optional[str] = None
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+
+def _password_params(scheme: str) -> Tuple[int, ...]:
+    """ค่า cost ปัจจุบันของ scheme (อ่านตอนเรียก ให้ปรับค่าได้โดยไม่ต้อง restart ใน benchmark)"""
+    if scheme == "scrypt":
+        return (PASSWORD_SCRYPT_N, PASSWORD_SCRYPT_R, PASSWORD_SCRYPT_P)
+    if scheme == "pbkdf2_sha256":
+        return (PASSWORD_PBKDF2_ITERATIONS,)
+    raise ValueError(f"ไม่รู้จัก password hash scheme: {scheme}")
+
+
+def _kdf(scheme: str, password: str, salt: bytes, params: Tuple[int, ...], dklen: int = 32) -> bytes:
+    secret = password.encode("utf-8")
+    if scheme == "scrypt":
+        n, r, p = params
+        # hashlib.scrypt และ pbkdf2_hmac ปล่อย GIL ระหว่างคำนวณ จึงรันใน thread ได้จริง
+        return hashlib.scrypt(secret, salt=salt, n=n, r=r, p=p, maxmem=256 * r * (n + p + 2), dklen=dklen)
+    if scheme == "pbkdf2_sha256":
+        (iterations,) = params
+        return hashlib.pbkdf2_hmac("sha256", secret, salt, iterations, dklen=dklen)
+    raise ValueError(f"ไม่รู้จัก password hash scheme: {scheme}")
+
+
+def _hash_password_sync(password: str) -> str:
+    scheme = PASSWORD_HASH_SCHEME
+    params = _password_params(scheme)
+    salt = os.urandom(16)
+    digest = _kdf(scheme, password, salt, params)
+    return "$".join([scheme, ",".join(str(x) for x in params), _b64encode(salt), _b64encode(digest)])
+
+
+def _verify_password_sync(password: str, stored: str) -> Tuple[bool, bool]:
+    """คืน (รหัสผ่านถูกต้อง, ควร rehash ด้วย scheme/cost ปัจจุบัน)"""
+    if "$" not in stored:
+        legacy = hashlib.sha256(password.encode("utf-8")).hexdigest()
+        return hmac.compare_digest(legacy, stored), True
+    try:
+        scheme, params_text, salt_text, digest_text = stored.split("$")
+        params = tuple(int(x) for x in params_text.split(","))
+        expected = _b64decode(digest_text)
+        actual = _kdf(scheme, password, _b64decode(salt_text), params, dklen=len(expected))
+    except ValueError:
+        return False, False
+    ok = hmac.compare_digest(actual, expected)
+    return ok, ok and (scheme != PASSWORD_HASH_SCHEME or params != _password_params(scheme))
+
+
+def _get_kdf_executor() -> ThreadPoolExecutor:
+    """thread pool ของ process นี้ (สร้างใหม่หลัง fork เหมือน connection pool)"""
+    global _KDF_EXECUTOR, _KDF_EXECUTOR_PID
+    if _KDF_EXECUTOR is not None and _KDF_EXECUTOR_PID == os.getpid():
+        return _KDF_EXECUTOR
+    with _KDF_EXECUTOR_LOCK:
+        if _KDF_EXECUTOR is None or _KDF_EXECUTOR_PID != os.getpid():
+            _KDF_EXECUTOR = ThreadPoolExecutor(max_workers=max(1, PASSWORD_HASH_WORKERS), thread_name_prefix="password-kdf")
+            _KDF_EXECUTOR_PID = os.getpid()
+            _ensure_dummy_password_hash()
+        return _KDF_EXECUTOR
+
+
+def _ensure_dummy_password_hash() -> None:
+    """สร้าง hash หลอกครั้งเดียวตอนสร้าง pool — ไม่ให้ request แรกที่ไม่พบ user ช้ากว่าครั้งถัดไป"""
+    global _DUMMY_PASSWORD_HASH
+    if _DUMMY_PASSWORD_HASH is None:
+        _DUMMY_PASSWORD_HASH = _hash_password_sync(uuid.uuid4().hex)
+
+
+def _run_kdf(fn, *args):
+    """รัน KDF ใน pool ที่จำกัดจำนวน — ถ้าคิวยาวจนเกิน PASSWORD_HASH_TIMEOUT ตอบว่าระบบยุ่งแทนการค้าง"""
+    future = _get_kdf_executor().submit(fn, *args)
+    try:
+        return future.result(timeout=PASSWORD_HASH_TIMEOUT)
+    except FutureTimeoutError:
+        future.cancel()
+        raise TimeoutError("ระบบกำลังยุ่ง กรุณาลองใหม่อีกครั้ง")
+
 
 def _hash_password(password: str) -> str:
-    """แฮชรหัสผ่านอย่างง่าย (ห้ามใช้แบบนี้ใน production จริง ๆ ควรใช้ bcrypt / argon2 ฯลฯ)"""
-    return hashlib.sha256(password.encode("utf-8")).hexdigest()
+    """แฮชรหัสผ่านด้วย KDF ที่ตั้งค่าไว้ (scrypt / PBKDF2 + salt สุ่ม)"""
+    return _run_kdf(_hash_password_sync, password)
+
+
+def _verify_password(password: str, stored: str) -> Tuple[bool, bool]:
+    """ตรวจรหัสผ่าน (รองรับ hash เก่าแบบ SHA-256) คืน (ถูกต้อง, ควร rehash)"""
+    return _run_kdf(_verify_password_sync, password, stored)
+
+
+def _burn_password_check(password: str) -> None:
+    """ตรวจกับ hash หลอก เมื่อไม่พบ user — ให้เวลาตอบไม่บอกว่ามี username/เบอร์นี้หรือไม่"""
+    _get_kdf_executor()  # ให้แน่ใจว่ามี _DUMMY_PASSWORD_HASH แล้ว (สร้างพร้อม pool)
+    _verify_password(password, _DUMMY_PASSWORD_HASH)
+
+
+def _rehash_password(user: User, password: str) -> None:
+    """อัปเกรด hash เก่า/cost เก่า หลังล็อกอินสำเร็จ (พลาดได้ ไม่ทำให้ล็อกอินล้ม)"""
+    try:
+        new_hash = _hash_password(password)
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                # เงื่อนไข password_hash เดิม: ถ้ามีการเปลี่ยนรหัสผ่านพร้อมกัน จะไม่เขียนทับ
+                cur.execute(
+                    "UPDATE users SET password_hash = %s WHERE id = %s AND password_hash = %s",
+                    (new_hash, user.id, user.password_hash),
+                )
+        user.password_hash = new_hash
+    except Exception as e:
+        logger.warning("rehash password ของ user %s ไม่สำเร็จ: %s", user.id, e)
+
+
+# ==========================
+#  Helper Functions
+# ==========================
 
 
 def normalize_lao_phone(phone: Optional[str]) -> Optional[str]:
@@ -213,6 +1225,67 @@ def _generate_token() -> str:
     return str(uuid.uuid4())
 
 
+# Pagination แบบ keyset บน (created_at, id): cursor = ตำแหน่งของแถวสุดท้ายในหน้าที่แล้ว
+PAGE_DEFAULT_LIMIT = 20
+PAGE_MAX_LIMIT = 100
+
+
+def _clamp_limit(limit: Optional[int]) -> int:
+    if not limit or limit < 1:
+        return PAGE_DEFAULT_LIMIT
+    return min(limit, PAGE_MAX_LIMIT)
+
+
+def _encode_cursor(created_at_us: int, row_id: int) -> str:
+    """cursor เป็น string ทึบ (base64) ของ created_at (microseconds) + id"""
+    raw = f"{int(created_at_us)}:{int(row_id)}".encode("ascii")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _keyset_condition(cursor: str, prefix: str = ""):
+    """เงื่อนไข WHERE ของ keyset (ใหม่สุดก่อน) สำหรับแถวที่อยู่หลัง cursor — คืน (sql, values)"""
+    created_at_us, row_id = _decode_cursor(cursor)
+    sql = (
+        f"({prefix}created_at, {prefix}id) < "
+        "(TIMESTAMPTZ 'epoch' + %s * INTERVAL '1 microsecond', %s)"
+    )
+    return sql, [created_at_us, row_id]
+
+
+def _finish_page(rows: list, limit: int):
+    """ตัดแถวส่วนเกิน (ดึงมา limit+1 เพื่อดูว่ามีหน้าถัดไปไหม) คืน (rows, next_cursor)"""
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(rows[-1]["created_at_us"], rows[-1]["id"])
+    return rows, next_cursor
+
+
+def _decode_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        us, row_id = base64.urlsafe_b64decode(padded.encode("ascii")).decode("ascii").split(":")
+        return int(us), int(row_id)
+    except Exception:
+        raise ValueError("cursor ไม่ถูกต้อง")
+
+
+# export แบบ stream: ดึงจาก server-side cursor ทีละ EXPORT_ITERSIZE แถว (memory คงที่ไม่ว่าตารางใหญ่แค่ไหน)
+EXPORT_ITERSIZE = int(os.environ.get("EXPORT_ITERSIZE", "2000"))
+
+
+def _iter_rows(sql: str, values: tuple = (), itersize: Optional[int] = None) -> Iterator[Dict]:
+    """
+    อ่านผลของ SELECT ทีละแถวผ่าน named cursor (DECLARE ... CURSOR ฝั่ง PostgreSQL)
+    ถือ connection จาก pool ไว้จนกว่าจะอ่านครบหรือ generator ถูกปิด — ต้องวนให้จบหรือเรียก close()
+    """
+    with get_connection() as conn:
+        with conn.cursor(name=f"export_{uuid.uuid4().hex}", cursor_factory=RealDictCursor) as cur:
+            cur.itersize = itersize or EXPORT_ITERSIZE
+            cur.execute(sql, values)
+            yield from cur
+
+
 def _row_to_user(row) -> User:
     return User(
         id=int(row["id"]),
@@ -236,6 +1309,8 @@ def _row_to_product(row) -> Product:
         category=row.get("category"),
         price_type=row.get("price_type"),
         created_at=float(row["created_at"]),
+        rating_count=int(row.get("rating_count") or 0),
+        rating_avg=round(float(row["rating_sum"]) / int(row["rating_count"]), 2) if row.get("rating_count") else None,
     )
 
 
@@ -285,24 +1360,34 @@ def _get_user_by_id(user_id: int) -> Optional[User]:
             return _row_to_user(row)
 
 
-def _get_user_by_phone(phone_normalized: str) -> Optional[User]:
-    """ดึง user จากเบอร์มือถือ (ต้องเป็นรูปแบบ +85620... ที่ normalize แล้ว)"""
+# username ก่อน: ถ้ามี username ที่หน้าตาเหมือนเบอร์ของอีกบัญชี ให้ได้บัญชีที่ตรง username (เหมือนเดิม)
+_USER_BY_LOGIN_SQL = """
+    SELECT
+        id,
+        username,
+        phone,
+        password_hash,
+        role,
+        EXTRACT(EPOCH FROM created_at) AS created_at
+    FROM users
+    WHERE username = %s OR phone = %s
+    ORDER BY username = %s DESC
+    LIMIT 1
+"""
+
+
+def _get_user_by_login(login_id: str) -> Optional[User]:
+    """
+    ดึง user จาก username หรือเบอร์มือถือ ใน query เดียว
+    (BitmapOr ของ unique index users.username และ idx_users_phone_unique)
+    """
+    try:
+        phone_norm = normalize_lao_phone(login_id)
+    except ValueError:
+        phone_norm = None  # ไม่ใช่เบอร์ลาว: หาด้วย username อย่างเดียว (phone = NULL ไม่ตรงแถวไหน)
     with get_connection() as conn:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute(
-                """
-                SELECT
-                    id,
-                    username,
-                    phone,
-                    password_hash,
-                    role,
-                    EXTRACT(EPOCH FROM created_at) AS created_at
-                FROM users
-                WHERE phone = %s
-                """,
-                (phone_normalized,),
-            )
+            cur.execute(_USER_BY_LOGIN_SQL, (login_id, phone_norm, login_id))
             row = cur.fetchone()
             if not row:
                 return None
@@ -322,39 +1407,34 @@ def _require_admin(user: User):
 def register(username: str, password: str, role: str = "customer", phone: Optional[str] = None) -> User:
     """
     สมัครสมาชิกใหม่
-    - username ต้องไม่ซ้ำ
+    - username และเบอร์มือถือต้องไม่ซ้ำ (unique index ตรวจใน INSERT เดียว ไม่ต้อง SELECT ก่อน และไม่มี race)
     - role: "admin" หรือ "customer"
     """
-    if _get_user_by_username(username):
-        raise ValueError("username นี้ถูกใช้งานแล้ว")
-
     if role not in ("admin", "customer"):
         raise ValueError("role ไม่ถูกต้อง (ต้องเป็น 'admin' หรือ 'customer')")
 
-    password_hash = _hash_password(password)
-    created_at = time.time()
     phone_clean = normalize_lao_phone(phone)
+    password_hash = _hash_password(password)
 
     with get_connection() as conn:
-        with conn.cursor() as cur:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
             cur.execute(
                 """
                 INSERT INTO users (username, phone, password_hash, role, created_at)
                 VALUES (%s, %s, %s, %s, TO_TIMESTAMP(%s))
-                RETURNING id
+                ON CONFLICT DO NOTHING
+                RETURNING id, username, phone, password_hash, role, EXTRACT(EPOCH FROM created_at) AS created_at
                 """,
-                (username, phone_clean, password_hash, role, created_at),
+                (username, phone_clean, password_hash, role, time.time()),
             )
-            user_id = cur.fetchone()[0]
+            row = cur.fetchone()
 
-    return User(
-        id=user_id,
-        username=username,
-        phone=phone_clean,
-        password_hash=password_hash,
-        role=role,
-        created_at=created_at,
-    )
+    if not row:
+        # ชน unique index — query เพิ่มเฉพาะตอนสมัครไม่สำเร็จ เพื่อบอกว่าซ้ำที่ช่องไหน
+        if _get_user_by_username(username):
+            raise ValueError("username นี้ถูกใช้งานแล้ว")
+        raise ValueError("เบอร์มือถือนี้ถูกใช้งานแล้ว")
+    return _row_to_user(row)
 
 
 def login(login_id: str, password: str) -> str:
@@ -367,61 +1447,33 @@ def login(login_id: str, password: str) -> str:
     if not login_stripped:
         raise ValueError("กรุณากรอก username หรือ เบอร์มือถือ")
 
-    user = _get_user_by_username(login_stripped)
-    if not user:
-        try:
-            phone_norm = normalize_lao_phone(login_stripped)
-            if phone_norm:
-                user = _get_user_by_phone(phone_norm)
-        except ValueError:
-            pass
+    user = _get_user_by_login(login_stripped)
     if not user:
+        _burn_password_check(password)
         raise ValueError("username/เบอร์มือถือ หรือ password ไม่ถูกต้อง")
 
-    if user.password_hash != _hash_password(password):
+    ok, needs_rehash = _verify_password(password, user.password_hash)
+    if not ok:
         raise ValueError("username/เบอร์มือถือ หรือ password ไม่ถูกต้อง")
+    if needs_rehash:
+        _rehash_password(user, password)
 
     token = _generate_token()
-    SESSIONS[token] = user.id
-    with get_connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                "INSERT INTO user_sessions (token, user_id) VALUES (%s, %s)",
-                (token, user.id),
-            )
-            conn.commit()
+    get_session_store().create(token, user)
     return token
 
 
 def get_current_user(token: str) -> User:
-    """ดึงข้อมูล user จาก token (เช็ค memory ก่อน แล้วเช็ค DB ถ้า server restart)"""
-    user_id = SESSIONS.get(token)
-    if not user_id:
-        with get_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    "SELECT user_id FROM user_sessions WHERE token = %s",
-                    (token,),
-                )
-                row = cur.fetchone()
-        if row:
-            user_id = row[0]
-            SESSIONS[token] = user_id
-        else:
-            raise PermissionError("token ไม่ถูกต้อง หรือหมดอายุ")
-    user = _get_user_by_id(user_id)
-    if not user:
-        raise PermissionError("ไม่พบผู้ใช้สำหรับ token นี้")
+    """ดึงข้อมูล user จาก token ผ่าน session store (cache ก่อน ถ้าไม่มีค่อย join user_sessions กับ users ใน query เดียว)"""
+    user = get_session_store().resolve(token)
+    if user is None:
+        raise PermissionError("token ไม่ถูกต้อง หรือหมดอายุ")
     return user
 
 
 def logout(token: str) -> None:
     """ลบ session (ออกจากระบบ) — เรียกเมื่อผู้ใช้กดปุ่มออกจากระบบเท่านั้น"""
-    SESSIONS.pop(token, None)
-    with get_connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute("DELETE FROM user_sessions WHERE token = %s", (token,))
-            conn.commit()
+    get_session_store().delete(token)
 
 
 # ==========================
@@ -429,177 +1481,161 @@ def logout(token: str) -> None:
 # ==========================
 
 
+# cache ผลสรุป dashboard สั้นๆ (เหมือนกันทุก admin) ให้การ poll dashboard ไม่ต้อง query ทุกครั้ง
+DASHBOARD_CACHE_TTL = float(os.environ.get("DASHBOARD_CACHE_TTL", "15"))  # วินาที
+
+_DASHBOARD_CACHE: Optional[tuple] = None  # (overview, expires_at)
+_DASHBOARD_LOCK = threading.Lock()
+
+# สรุปทุกตัวเลขของ dashboard ใน query เดียว
+# - เดือน/วัน สร้างด้วย generate_series ตามปฏิทินจริง (ไม่ใช่ 30 วัน/เดือน) เดือนที่ไม่มีข้อมูลได้ 0
+_DASHBOARD_ROLLUP_SQL = """
+WITH
+user_counts AS (
+    SELECT
+        COUNT(*) AS total_users,
+        COUNT(*) FILTER (WHERE role = 'admin') AS total_admin,
+        COUNT(*) FILTER (WHERE role = 'customer') AS total_customer
+    FROM users
+),
+product_totals AS (
+    SELECT
+        COUNT(*) AS total_products,
+        COALESCE(SUM(price * stock), 0) AS total_revenue
+    FROM products
+),
+months AS (
+    SELECT generate_series(
+        DATE_TRUNC('month', NOW()) - INTERVAL '5 months',
+        DATE_TRUNC('month', NOW()),
+        INTERVAL '1 month'
+    ) AS month
+),
+revenue_by_month AS (
+    SELECT m.month, COALESCE(SUM(p.price * p.stock), 0) AS revenue
+    FROM months m
+    LEFT JOIN products p
+        ON p.created_at >= m.month AND p.created_at < m.month + INTERVAL '1 month'
+    GROUP BY m.month
+),
+days AS (
+    SELECT generate_series(
+        DATE_TRUNC('day', NOW()) - INTERVAL '6 days',
+        DATE_TRUNC('day', NOW()),
+        INTERVAL '1 day'
+    ) AS day
+),
+orders_by_day AS (
+    SELECT d.day, COUNT(u.id) * 2 AS orders
+    FROM days d
+    LEFT JOIN users u
+        ON u.role = 'customer' AND u.created_at >= d.day AND u.created_at < d.day + INTERVAL '1 day'
+    GROUP BY d.day
+),
+recent AS (
+    (
+        SELECT
+            username AS name,
+            CASE WHEN role = 'customer' THEN 'Created an account' ELSE 'Admin joined' END AS action,
+            created_at,
+            'user' AS type
+        FROM users
+        WHERE created_at >= NOW() - INTERVAL '7 days'
+        ORDER BY created_at DESC
+        LIMIT 3
+    )
+    UNION ALL
+    (
+        SELECT name, 'Product added' AS action, created_at, 'product' AS type
+        FROM products
+        WHERE created_at >= NOW() - INTERVAL '7 days'
+        ORDER BY created_at DESC
+        LIMIT 3
+    )
+)
+SELECT
+    uc.total_users,
+    uc.total_admin,
+    uc.total_customer,
+    pt.total_products,
+    pt.total_revenue,
+    (SELECT ARRAY_AGG(revenue ORDER BY month) FROM revenue_by_month) AS revenue_by_month,
+    (SELECT ARRAY_AGG(TO_CHAR(month, 'Mon') ORDER BY month) FROM revenue_by_month) AS revenue_month_labels,
+    (SELECT ARRAY_AGG(orders ORDER BY day) FROM orders_by_day) AS orders_by_week,
+    (SELECT ARRAY_AGG(TO_CHAR(day, 'Dy') ORDER BY day) FROM orders_by_day) AS orders_day_labels,
+    (
+        SELECT COALESCE(JSON_AGG(r ORDER BY r.created_at DESC), '[]'::JSON)
+        FROM (SELECT * FROM recent ORDER BY created_at DESC LIMIT 3) r
+    ) AS recent_activities
+FROM user_counts uc, product_totals pt
+"""
+
+
+def _load_dashboard_overview() -> Dict:
+    with get_connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(_DASHBOARD_ROLLUP_SQL)
+            row = cur.fetchone()
+
+    total_products = int(row["total_products"])
+    total_customer = int(row["total_customer"])
+    return {
+        "total_users": int(row["total_users"]),
+        "total_admin": int(row["total_admin"]),
+        "total_customer": total_customer,
+        "total_products": total_products,
+        "total_revenue": float(row["total_revenue"] or 0),
+        # Orders (ประมาณการจากจำนวนสินค้า x 10 หรือจำนวน customer x 5)
+        "total_orders": max(total_products * 10, total_customer * 5),
+        "revenue_by_month": [float(v or 0) for v in row["revenue_by_month"]],
+        "revenue_month_labels": list(row["revenue_month_labels"]),
+        "orders_by_week": [int(v or 0) for v in row["orders_by_week"]],
+        "orders_day_labels": list(row["orders_day_labels"]),
+        "recent_activities": [
+            {"name": a["name"], "action": a["action"], "created_at": a["created_at"], "type": a["type"]}
+            for a in row["recent_activities"]
+        ],
+    }
+
+
 def get_dashboard_overview(current_user: User) -> Dict:
     """
-    ข้อมูลภาพรวมสำหรับ dashboard
-    - จำนวนผู้ใช้ทั้งหมด
-    - จำนวน admin
-    - จำนวน customer
+    ข้อมูลภาพรวมสำหรับ dashboard (query เดียว + cache DASHBOARD_CACHE_TTL วินาที)
+    - จำนวนผู้ใช้ทั้งหมด / admin / customer
     - จำนวนสินค้า
     - Revenue (คำนวณจากราคารวมของสินค้าทั้งหมด)
     - Orders (ประมาณการจากจำนวนสินค้า x 10)
-    - Revenue by month (6 เดือนล่าสุด)
-    - Orders by week (7 วันล่าสุด)
+    - Revenue by month (6 เดือนปฏิทินล่าสุด รวมเดือนนี้)
+    - Orders by week (7 วันล่าสุด วันนี้คือวันสุดท้าย)
+    - Recent activity 3 รายการล่าสุด
     """
+    global _DASHBOARD_CACHE
     _require_admin(current_user)
 
-    with get_connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute("SELECT COUNT(*) FROM users")
-            total_users = cur.fetchone()[0]
+    cached = _DASHBOARD_CACHE
+    if cached is not None and cached[1] > time.monotonic():
+        return cached[0]
+    # ให้ query แค่ request เดียวตอน cache หมดอายุ ที่เหลือรอใช้ผลเดียวกัน
+    with _DASHBOARD_LOCK:
+        cached = _DASHBOARD_CACHE
+        if cached is not None and cached[1] > time.monotonic():
+            return cached[0]
+        overview = _load_dashboard_overview()
+        _DASHBOARD_CACHE = (overview, time.monotonic() + DASHBOARD_CACHE_TTL)
+        return overview
 
-            cur.execute("SELECT COUNT(*) FROM users WHERE role = 'admin'")
-            total_admin = cur.fetchone()[0]
 
-            cur.execute("SELECT COUNT(*) FROM users WHERE role = 'customer'")
-            total_customer = cur.fetchone()[0]
+# ==========================
+#  Admin Management (จัดการ admin)
+# ==========================
 
-            cur.execute("SELECT COUNT(*) FROM products")
-            total_products = cur.fetchone()[0]
 
-            # คำนวณ Revenue จากราคารวมของสินค้าทั้งหมด (ราคา x stock)
-            cur.execute("SELECT COALESCE(SUM(price * stock), 0) FROM products")
-            total_revenue = float(cur.fetchone()[0] or 0)
-
-            # คำนวณ Orders (ประมาณการจากจำนวนสินค้า x 10 หรือจำนวน customer x 5)
-            total_orders = max(total_products * 10, total_customer * 5)
-
-            # Revenue by month (6 เดือนล่าสุด) - ใช้ข้อมูลจาก products ที่สร้างในแต่ละเดือน
-            cur.execute("""
-                SELECT 
-                    DATE_TRUNC('month', created_at) as month,
-                    COALESCE(SUM(price * stock), 0) as revenue
-                FROM products
-                WHERE created_at >= NOW() - INTERVAL '6 months'
-                GROUP BY DATE_TRUNC('month', created_at)
-                ORDER BY month
-            """)
-            revenue_by_month = cur.fetchall()
-            
-            # สร้าง array สำหรับ 6 เดือนล่าสุด
-            revenue_data = [0.0] * 6
-            month_labels = []
-            for i in range(6):
-                month_date = datetime.now() - timedelta(days=30 * (5 - i))
-                month_labels.append(month_date.strftime('%b'))
-            
-            # Map ข้อมูลจาก database
-            for row in revenue_by_month:
-                month_date = row[0]
-                revenue = float(row[1] or 0)
-                # หา index ของเดือนใน array
-                for i, label in enumerate(month_labels):
-                    check_date = datetime.now() - timedelta(days=30 * (5 - i))
-                    if month_date.month == check_date.month and month_date.year == check_date.year:
-                        revenue_data[i] = revenue
-                        break
-
-            # Orders by week (7 วันล่าสุด) - ใช้ข้อมูลจาก users ที่สร้างในแต่ละวัน
-            cur.execute("""
-                SELECT 
-                    DATE_TRUNC('day', created_at) as day,
-                    COUNT(*) * 2 as orders
-                FROM users
-                WHERE role = 'customer' AND created_at >= NOW() - INTERVAL '7 days'
-                GROUP BY DATE_TRUNC('day', created_at)
-                ORDER BY day
-            """)
-            orders_by_day = cur.fetchall()
-            
-            # สร้าง array สำหรับ 7 วันล่าสุด (วันนี้คือวันสุดท้าย)
-            orders_data = [0] * 7
-            day_labels = []
-            today = datetime.now()
-            # สร้าง labels สำหรับ 7 วันล่าสุด (เริ่มจาก 6 วันก่อน ถึงวันนี้)
-            for i in range(6, -1, -1):
-                check_date = today - timedelta(days=i)
-                day_labels.append(check_date.strftime('%a'))
-            
-            # Map ข้อมูลจาก database
-            for row in orders_by_day:
-                day_date = row[0]
-                orders = int(row[1] or 0)
-                # หาวันนี้อยู่ที่ index ไหน (6 = วันนี้, 0 = 6 วันก่อน)
-                days_ago = (today.date() - day_date.date()).days
-                if 0 <= days_ago <= 6:
-                    orders_data[6 - days_ago] = orders
-
-            # Recent Activity - ดึงข้อมูล user ล่าสุดที่สร้าง account หรือ product ล่าสุดที่เพิ่ม
-            cur.execute("""
-                SELECT username, role, created_at
-                FROM users
-                WHERE created_at >= NOW() - INTERVAL '7 days'
-                ORDER BY created_at DESC
-                LIMIT 5
-            """)
-            recent_users = cur.fetchall()
-            
-            cur.execute("""
-                SELECT name, created_at
-                FROM products
-                WHERE created_at >= NOW() - INTERVAL '7 days'
-                ORDER BY created_at DESC
-                LIMIT 5
-            """)
-            recent_products = cur.fetchall()
-            
-            # รวมและเรียงตามเวลา
-            recent_activities = []
-            for row in recent_users:
-                created_at = row[2]
-                if hasattr(created_at, 'isoformat'):
-                    created_at_str = created_at.isoformat()
-                else:
-                    created_at_str = str(created_at)
-                recent_activities.append({
-                    'name': row[0],
-                    'action': 'Created an account' if row[1] == 'customer' else 'Admin joined',
-                    'created_at': created_at_str,
-                    'type': 'user'
-                })
-            for row in recent_products:
-                created_at = row[1]
-                if hasattr(created_at, 'isoformat'):
-                    created_at_str = created_at.isoformat()
-                else:
-                    created_at_str = str(created_at)
-                recent_activities.append({
-                    'name': row[0],
-                    'action': 'Product added',
-                    'created_at': created_at_str,
-                    'type': 'product'
-                })
-            
-            # เรียงตามเวลาและเลือก 3 รายการล่าสุด
-            recent_activities.sort(key=lambda x: x['created_at'], reverse=True)
-            recent_activities = recent_activities[:3]
-
-    return {
-        "total_users": total_users,
-        "total_admin": total_admin,
-        "total_customer": total_customer,
-        "total_products": total_products,
-        "total_revenue": total_revenue,
-        "total_orders": total_orders,
-        "revenue_by_month": revenue_data,
-        "revenue_month_labels": month_labels,
-        "orders_by_week": orders_data,
-        "orders_day_labels": day_labels,
-        "recent_activities": recent_activities,
-    }
-
-
-# ==========================
-#  Admin Management (จัดการ admin)
-# ==========================
-
-
-def count_admins() -> int:
-    """จำนวน admin ในระบบ (ไม่ต้องล็อกอิน) ใช้สำหรับ setup แอดมินคนแรก"""
-    with get_connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute("SELECT COUNT(*) FROM users WHERE role = 'admin'")
-            return cur.fetchone()[0]
+def count_admins() -> int:
+    """จำนวน admin ในระบบ (ไม่ต้องล็อกอิน) ใช้สำหรับ setup แอดมินคนแรก"""
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT COUNT(*) FROM users WHERE role = 'admin'")
+            return cur.fetchone()[0]
 
 
 def create_admin(current_user: User, username: str, password: str) -> User:
@@ -625,7 +1661,7 @@ def list_admins(current_user: User) -> List[User]:
                     EXTRACT(EPOCH FROM created_at) AS created_at
                 FROM users
                 WHERE role = 'admin'
-                ORDER BY created_at DESC
+                ORDER BY users.created_at DESC
                 """
             )
             rows = cur.fetchall()
@@ -640,17 +1676,19 @@ def delete_admin(current_user: User, admin_id: str) -> None:
         raise ValueError("ไม่สามารถลบ admin ที่กำลังใช้งานอยู่ได้")
 
     with get_connection() as conn:
-        with conn.cursor() as cur:
-            # ตรวจสอบว่าเป็น admin จริง
-            cur.execute(
-                "SELECT role FROM users WHERE id = %s",
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            # ลบเฉพาะเมื่อเป็น admin จริง (เงื่อนไขอยู่ใน WHERE ไม่ต้อง SELECT ก่อน)
+            row = _write_returning(
+                cur,
+                [
+                    "changed AS (DELETE FROM users WHERE id = %s AND role = 'admin' RETURNING profile_image)",
+                    _release_blob_cte("profile_image"),
+                ],
                 (admin_id,),
             )
-            row = cur.fetchone()
-            if not row or row[0] != "admin":
-                raise ValueError("ไม่พบ admin ที่ต้องการลบ")
-
-            cur.execute("DELETE FROM users WHERE id = %s", (admin_id,))
+    if not row:
+        raise ValueError("ไม่พบ admin ที่ต้องการลบ")
+    get_session_store().forget_user(admin_id)
 
 
 # ==========================
@@ -658,54 +1696,56 @@ def delete_admin(current_user: User, admin_id: str) -> None:
 # ==========================
 
 
+_LIST_CUSTOMERS_SQL = """
+    SELECT
+        id,
+        username,
+        phone,
+        password_hash,
+        role,
+        EXTRACT(EPOCH FROM created_at) AS created_at
+    FROM users
+    WHERE role = 'customer'
+    ORDER BY users.created_at DESC
+"""
+
+
 def list_customers(current_user: User) -> List[User]:
     """รายการ customer ทั้งหมด (เฉพาะ admin)"""
     _require_admin(current_user)
 
     with get_connection() as conn:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute(
-                """
-                SELECT
-                    id,
-                    username,
-                    phone,
-                    password_hash,
-                    role,
-                    EXTRACT(EPOCH FROM created_at) AS created_at
-                FROM users
-                WHERE role = 'customer'
-                ORDER BY created_at DESC
-                """
-            )
+            cur.execute(_LIST_CUSTOMERS_SQL)
             rows = cur.fetchall()
             return [_row_to_user(r) for r in rows]
 
 
+def iter_customers(current_user: User, itersize: Optional[int] = None) -> Iterator[Dict]:
+    """customer ทั้งหมดเป็นแถวดิบทีละแถว (server-side cursor) สำหรับ export — แปลงด้วย serialization.user_row_json"""
+    _require_admin(current_user)
+    return _iter_rows(_LIST_CUSTOMERS_SQL, itersize=itersize)
+
+
 def update_customer_role_to_admin(current_user: User, customer_id: str) -> User:
     """อัปเกรด customer ให้เป็น admin"""
     _require_admin(current_user)
 
     with get_connection() as conn:
-        with conn.cursor() as cur:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
             cur.execute(
-                "SELECT role FROM users WHERE id = %s",
+                """
+                UPDATE users SET role = 'admin'
+                WHERE id = %s AND role = 'customer'
+                RETURNING id, username, phone, password_hash, role, EXTRACT(EPOCH FROM created_at) AS created_at
+                """,
                 (customer_id,),
             )
             row = cur.fetchone()
-            if not row or row[0] != "customer":
-                raise ValueError("ไม่พบ customer ที่ต้องการอัปเกรด")
-
-            cur.execute(
-                "UPDATE users SET role = 'admin' WHERE id = %s",
-                (customer_id,),
-            )
-
-    # ดึงข้อมูล user หลังอัปเดต
-    user = _get_user_by_id(customer_id)
-    if not user:
-        raise ValueError("เกิดข้อผิดพลาดหลังอัปเดต role")
-    return user
+    if not row:
+        raise ValueError("ไม่พบ customer ที่ต้องการอัปเกรด")
+    get_session_store().forget_user(customer_id)
+    return _row_to_user(row)
 
 
 def delete_customer(current_user: User, customer_id: str) -> None:
@@ -713,16 +1753,204 @@ def delete_customer(current_user: User, customer_id: str) -> None:
     _require_admin(current_user)
 
     with get_connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                "SELECT role FROM users WHERE id = %s",
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            row = _write_returning(
+                cur,
+                [
+                    "changed AS (DELETE FROM users WHERE id = %s AND role = 'customer' RETURNING profile_image)",
+                    _release_blob_cte("profile_image"),
+                ],
                 (customer_id,),
             )
-            row = cur.fetchone()
-            if not row or row[0] != "customer":
-                raise ValueError("ไม่พบ customer ที่ต้องการลบ")
+    if not row:
+        raise ValueError("ไม่พบ customer ที่ต้องการลบ")
+    get_session_store().forget_user(customer_id)
+
+
+# ==========================
+#  Catalog Version (สำหรับ HTTP cache / ETag ของ /api/products, /api/reviews)
+# ==========================
+
+CATALOG_PRODUCTS = "products"
+CATALOG_REVIEWS = "reviews"
+CATALOG_CHANNEL = "catalog_changed"  # ช่อง LISTEN/NOTIFY ให้ทุก worker รู้ว่า catalogue เปลี่ยน
+
+# callback ที่อยากรู้ทันทีเมื่อ catalogue ใน process นี้ถูกแก้ (เช่น catalog_cache)
+_CATALOG_CHANGE_HOOKS: List = []
+
+
+def on_catalog_change(callback) -> None:
+    """
+    ลงทะเบียน callback(*names, ids=None) ที่จะถูกเรียกเมื่อ process นี้เขียนข้อมูล catalogue
+    ids: id ของแถวที่เปลี่ยน (ถ้ารู้) — None = ไม่รู้ ต้องถือว่าเปลี่ยนทั้งหมด
+    """
+    _CATALOG_CHANGE_HOOKS.append(callback)
+
+
+def bump_catalog_version(cur, *names: str) -> None:
+    """
+    เพิ่ม version ของ catalogue ที่ระบุ — เรียกด้วย cursor ของ transaction เดียวกับที่เขียนข้อมูล
+    เพื่อให้ version เปลี่ยนพร้อมข้อมูลเสมอ (ถ้า rollback ก็ rollback ไปด้วยกัน)
+    และส่ง NOTIFY (ถูกส่งจริงตอน commit) ให้ worker อื่นล้าง cache
+    """
+    cur.execute(
+        """
+        WITH bumped AS (
+            UPDATE catalog_versions
+            SET version = version + 1, updated_at = NOW()
+            WHERE name = ANY(%s)
+            RETURNING name
+        )
+        SELECT pg_notify(%s, name) FROM bumped
+        """,
+        (list(names), CATALOG_CHANNEL),
+    )
+    _run_catalog_hooks(*names)
+
+
+def _run_catalog_hooks(*names: str, ids: Optional[FrozenSet[int]] = None) -> None:
+    for callback in _CATALOG_CHANGE_HOOKS:
+        try:
+            callback(*names, ids=ids)
+        except Exception as e:
+            logger.warning("catalog change hook error: %s", e)
+
+
+# bump_catalog_version ในรูป CTE (ต่อท้าย CTE ชื่อ changed) — bump เฉพาะเมื่อ changed มีแถวจริง
+_CATALOG_BUMP_CTE = """
+    bumped AS (
+        UPDATE catalog_versions
+        SET version = version + 1, updated_at = NOW()
+        WHERE name = ANY(%s) AND EXISTS (SELECT 1 FROM changed)
+        RETURNING name
+    ),
+    notified AS (
+        SELECT pg_notify(%s, name) FROM bumped
+    )"""
+
+# แบบแนบ id ของแถวที่เปลี่ยน: payload "products:12,15" ให้ index ในหน่วยความจำ (suggest_index) อ่านใหม่เฉพาะแถวนั้น
+_CATALOG_BUMP_IDS_CTE = """
+    bumped AS (
+        UPDATE catalog_versions
+        SET version = version + 1, updated_at = NOW()
+        WHERE name = ANY(%s) AND EXISTS (SELECT 1 FROM changed)
+        RETURNING name
+    ),
+    notified AS (
+        SELECT pg_notify(%s, name || ':' || (SELECT string_agg(id::text, ',') FROM changed)) FROM bumped
+    )"""
+
+
+def parse_catalog_payload(payload: str) -> Tuple[str, Optional[FrozenSet[int]]]:
+    """payload ของ NOTIFY catalog_changed -> (ชื่อ catalogue, id ที่เปลี่ยน หรือ None ถ้าไม่ได้แนบมา)"""
+    name, sep, ids = payload.partition(":")
+    if not sep:
+        return name, None
+    try:
+        return name, frozenset(int(x) for x in ids.split(",") if x)
+    except ValueError:
+        return name, None
+
+
+def _write_returning(
+    cur,
+    ctes: List[str],
+    values: tuple,
+    select: str = "SELECT * FROM changed",
+    catalog: Tuple[str, ...] = (),
+    catalog_ids: bool = False,
+) -> Optional[Dict]:
+    """
+    รวมการเขียนข้อมูลทั้งหมดเป็นคำสั่ง SQL เดียว (round trip เดียว, transaction เดียว)
+    - ctes: CTE ตามลำดับ ต้องมีตัวชื่อ changed (INSERT/UPDATE/DELETE ... RETURNING) ตัวอื่นอ่านจาก changed
+      (เช่น _RATING_DELTA_CTE, _release_blob_cte) — values เรียงตาม placeholder ใน ctes, select ห้ามมี placeholder
+    - catalog: ชื่อ catalogue ที่ต้อง bump version + NOTIFY เมื่อ changed มีแถว
+    - catalog_ids: แนบ id ของแถวใน changed ไปกับ NOTIFY และ hook (changed ต้องมีคอลัมน์ id)
+    cur ต้องเป็น RealDictCursor — คืนแถวแรกของ select หรือ None
+    """
+    ctes = list(ctes)
+    values = tuple(values)
+    if catalog:
+        ctes.append(_CATALOG_BUMP_IDS_CTE if catalog_ids else _CATALOG_BUMP_CTE)
+        values += (list(catalog), CATALOG_CHANNEL)
+        # CTE ที่เป็น SELECT จะถูกรันก็ต่อเมื่อมีคนอ่าน: อ้าง notified ไว้ให้ pg_notify ทำงานเสมอ
+        ids_column = ", (SELECT array_agg(id) FROM changed) AS changed_ids" if catalog_ids else ""
+        select = f"SELECT s.*, (SELECT COUNT(*) FROM notified) AS notified{ids_column} FROM ({select}) s"
+    cur.execute("WITH " + ",".join(ctes) + "\n" + select, values)
+    row = cur.fetchone()
+    if row is not None and catalog:
+        ids = frozenset(row.pop("changed_ids") or ()) if catalog_ids else None
+        if row.pop("notified"):
+            _run_catalog_hooks(*catalog, ids=ids)
+    return row
+
+
+_CATALOG_VERSIONS_SQL = "SELECT name, version, EXTRACT(EPOCH FROM updated_at) FROM catalog_versions"
+
+
+def _rows_to_catalog_versions(rows) -> Dict[str, Tuple[int, float]]:
+    return {row[0]: (int(row[1]), float(row[2])) for row in rows}
+
 
-            cur.execute("DELETE FROM users WHERE id = %s", (customer_id,))
+def get_catalog_versions() -> Dict[str, Tuple[int, float]]:
+    """คืน {ชื่อ: (version, updated_at epoch)} — query เล็กมาก ใช้เช็ค ETag ก่อนดึงข้อมูลจริง"""
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(_CATALOG_VERSIONS_SQL)
+            return _rows_to_catalog_versions(cur.fetchall())
+
+
+# ==========================
+#  Upload Blobs (reference count ของไฟล์อัปโหลดแบบ content-addressed — ไฟล์จริงจัดการใน blob_store.py)
+# ==========================
+
+
+def acquire_blob(cur, path: str, size_bytes: Optional[int] = None) -> None:
+    """
+    เพิ่ม reference ของไฟล์ (สร้างแถวถ้ายังไม่มี) — เรียกใน transaction เดียวกับที่บันทึก path ลงแถวที่อ้างถึง
+    แถวนี้ถูก lock จนจบ transaction: GC ที่กำลังลบไฟล์เดียวกันจะต้องรอ (หรือเราต้องรอ GC) จึงไม่ลบไฟล์ที่เพิ่งถูกใช้
+    """
+    cur.execute(
+        """
+        INSERT INTO upload_blobs (path, refcount, size_bytes)
+        VALUES (%s, 1, %s)
+        ON CONFLICT (path) DO UPDATE
+        SET refcount = upload_blobs.refcount + 1, orphaned_at = NULL
+        """,
+        (path, size_bytes),
+    )
+
+
+def release_blob(cur, path: Optional[str]) -> None:
+    """
+    ลด reference ของไฟล์ — ไฟล์ไม่ถูกลบที่นี่ เมื่อ refcount เป็น 0 จะถูก GC ลบหลังพ้นช่วงผ่อนผัน
+    (blob_store.collect_garbage) ไฟล์อัปโหลดชื่อแบบเก่าที่ยังไม่มีแถว จะถูกบันทึกเป็นไฟล์กำพร้าให้ GC เก็บเช่นกัน
+    path ที่ไม่ได้อยู่ใต้ uploads/ (เช่นรูปตัวอย่าง) ไม่ถูกแตะ
+    """
+    if not path or not path.startswith("uploads/"):
+        return
+    cur.execute(
+        """
+        INSERT INTO upload_blobs (path, refcount, orphaned_at)
+        VALUES (%s, 0, NOW())
+        ON CONFLICT (path) DO UPDATE
+        SET refcount = GREATEST(upload_blobs.refcount - 1, 0),
+            orphaned_at = CASE WHEN upload_blobs.refcount <= 1 THEN NOW() ELSE NULL END
+        """,
+        (path,),
+    )
+
+
+def _release_blob_cte(column: str) -> str:
+    """release_blob ในรูป CTE สำหรับ _write_returning: ลด reference ของไฟล์ใน changed.<column>"""
+    return f"""
+    released AS (
+        INSERT INTO upload_blobs (path, refcount, orphaned_at)
+        SELECT {column}, 0, NOW() FROM changed WHERE {column} LIKE 'uploads/%%'
+        ON CONFLICT (path) DO UPDATE
+        SET refcount = GREATEST(upload_blobs.refcount - 1, 0),
+            orphaned_at = CASE WHEN upload_blobs.refcount <= 1 THEN NOW() ELSE NULL END
+    )"""
 
 
 # ==========================
@@ -749,19 +1977,23 @@ def create_product(
     created_at = time.time()
     desc = (description or "").strip() or None
 
+    # stock: ถ้า DB กำหนด NOT NULL ให้ใช้ 0 แทน None
+    stock_val = stock if stock is not None else 0
     with get_connection() as conn:
-        with conn.cursor() as cur:
-            # stock: ถ้า DB กำหนด NOT NULL ให้ใช้ 0 แทน None
-            stock_val = stock if stock is not None else 0
-            cur.execute(
-                """
-                INSERT INTO products (name, price, stock, image, description, category, price_type, created_at)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, TO_TIMESTAMP(%s))
-                RETURNING id
-                """,
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            row = _write_returning(
+                cur,
+                ["""
+                changed AS (
+                    INSERT INTO products (name, price, stock, image, description, category, price_type, created_at)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, TO_TIMESTAMP(%s))
+                    RETURNING id
+                )"""],
                 (name, price, stock_val, None, desc, category, price_type, created_at),
+                catalog=(CATALOG_PRODUCTS,),
+                catalog_ids=True,
             )
-            product_id = cur.fetchone()[0]
+            product_id = row["id"]
 
     return Product(
         id=product_id,
@@ -776,29 +2008,180 @@ def create_product(
     )
 
 
-def list_products(current_user: User) -> List[Product]:
-    """รายการสินค้าทั้งหมด (admin หรือ customer ก็เรียกดูได้)"""
+# ค่าที่ถือว่าเป็น true/false ของ ?in_stock=
+_TRUE_VALUES = ("1", "true", "yes", "on")
+_FALSE_VALUES = ("0", "false", "no", "off")
+
+
+def _parse_price(value: Optional[str], label: str) -> Optional[Decimal]:
+    if value is None or not value.strip():
+        return None
+    try:
+        price = Decimal(value.strip())
+    except InvalidOperation:
+        raise ValueError(f"{label} ต้องเป็นตัวเลข")
+    if not price.is_finite() or price < 0:
+        raise ValueError(f"{label} ต้องมากกว่าหรือเท่ากับ 0")
+    return price
+
+
+def parse_product_filters(args) -> ProductFilters:
+    """
+    อ่านตัวกรองจาก query string (request.args หรือ MultiDict ของ asgi.py) — ค่าว่างถือว่าไม่กรอง
+    ค่าผิดรูปแบบ -> ValueError (route ตอบ 400)
+    """
+    in_stock = (args.get("in_stock") or "").strip().lower()
+    if in_stock and in_stock not in _TRUE_VALUES + _FALSE_VALUES:
+        raise ValueError("in_stock ต้องเป็น true หรือ false")
+    filters = ProductFilters(
+        category=(args.get("category") or "").strip() or None,
+        price_type=(args.get("price_type") or "").strip() or None,
+        in_stock=(in_stock in _TRUE_VALUES) if in_stock else None,
+        min_price=_parse_price(args.get("min_price"), "min_price"),
+        max_price=_parse_price(args.get("max_price"), "max_price"),
+    )
+    if filters.min_price is not None and filters.max_price is not None and filters.min_price > filters.max_price:
+        raise ValueError("min_price ต้องไม่มากกว่า max_price")
+    return filters
+
+
+def _product_filter_conditions(filters: Optional[ProductFilters], facets: bool = True) -> Tuple[List[str], list]:
+    """
+    เงื่อนไข WHERE ของตัวกรอง คืน (conditions, values) — แต่ละด้านมี index ของ migration v10 รองรับ
+    facets=False: เฉพาะช่วงราคา (หมวดหมู่/ประเภท/มีของ product_facets นับเองจากผลที่ group แล้ว)
+    """
+    conditions: List[str] = []
+    values: list = []
+    if filters is None:
+        return conditions, values
+    if facets:
+        if filters.category == DEFAULT_PRODUCT_CATEGORY:
+            conditions.append("(category = %s OR category IS NULL OR category = '')")
+            values.append(filters.category)
+        elif filters.category is not None:
+            conditions.append("category = %s")
+            values.append(filters.category)
+        if filters.price_type is not None:
+            conditions.append("price_type = %s")
+            values.append(filters.price_type)
+        if filters.in_stock is True:
+            conditions.append("stock > 0")
+        elif filters.in_stock is False:
+            conditions.append("(stock IS NULL OR stock <= 0)")
+    # ส่งเป็น Decimal ให้เทียบแบบ NUMERIC (ถ้าเป็น float คอลัมน์ price จะถูก cast และไม่ใช้ index)
+    if filters.min_price is not None:
+        conditions.append("price >= %s")
+        values.append(filters.min_price)
+    if filters.max_price is not None:
+        conditions.append("price <= %s")
+        values.append(filters.max_price)
+    return conditions, values
+
+
+# SQL ของการอ่านรายการ (ใช้ร่วมกับ pyhon_async.py ให้ผลเหมือนกันทั้งโหมด WSGI และ ASGI)
+def _list_products_query(filters: Optional[ProductFilters] = None) -> Tuple[str, tuple]:
+    """SQL + values ของ list_products (ทั้งหมด ไม่แบ่งหน้า)"""
+    conditions, values = _product_filter_conditions(filters)
+    where_clause = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+    return (
+        f"""
+        SELECT
+            id,
+            name,
+            price,
+            stock,
+            image,
+            description,
+            category,
+            price_type,
+            EXTRACT(EPOCH FROM created_at) AS created_at,
+            COALESCE(rs.review_count, 0) AS rating_count,
+            rs.rating_sum
+        FROM products
+        LEFT JOIN product_rating_stats rs ON rs.product_id = products.id
+        {where_clause}
+        ORDER BY products.created_at DESC
+        """,
+        tuple(values),
+    )
+
+
+def _products_page_query(
+    limit: int, cursor: Optional[str], filters: Optional[ProductFilters] = None
+) -> Tuple[str, tuple]:
+    """SQL + values ของ list_products_page (limit ต้อง clamp แล้ว; ดึง limit+1 แถว)"""
+    # ORDER BY ต้องระบุชื่อตาราง: created_at เฉย ๆ คือ alias EXTRACT(EPOCH ...) ใน SELECT (ตัวเลขที่คำนวณแล้ว)
+    # ซึ่ง index (created_at, id) เรียงให้ไม่ได้ — จะกลายเป็นอ่านทั้งตารางแล้ว sort ทุกหน้า
+    conditions, values = _product_filter_conditions(filters)
+    if cursor:
+        sql, cursor_values = _keyset_condition(cursor)
+        conditions.append(sql)
+        values.extend(cursor_values)
+    where_clause = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+    values.append(limit + 1)
+    return (
+        f"""
+        SELECT
+            id,
+            name,
+            price,
+            stock,
+            image,
+            description,
+            category,
+            price_type,
+            EXTRACT(EPOCH FROM created_at) AS created_at,
+            (EXTRACT(EPOCH FROM created_at) * 1000000)::BIGINT AS created_at_us,
+            COALESCE(rs.review_count, 0) AS rating_count,
+            rs.rating_sum
+        FROM products
+        LEFT JOIN product_rating_stats rs ON rs.product_id = products.id
+        {where_clause}
+        ORDER BY products.created_at DESC, products.id DESC
+        LIMIT %s
+        """,
+        tuple(values),
+    )
+
+
+def list_products(
+    current_user: User,
+    row_to: Callable[[Dict], Any] = _row_to_product,
+    filters: Optional[ProductFilters] = None,
+) -> List[Product]:
+    """
+    รายการสินค้าทั้งหมด (admin หรือ customer ก็เรียกดูได้)
+    row_to: ตัวแปลงแถว (เช่น serialization.product_row_json เพื่อได้ dict ของ JSON ตรง ๆ ไม่ผ่าน Product)
+    filters: ตัวกรอง (parse_product_filters) — None = ทุกชิ้น
+    """
     # ถ้าต้องการเฉพาะคนที่ล็อกอิน ให้เช็กสิทธิ์ที่ layer ด้านนอก
+    sql, values = _list_products_query(filters)
     with get_connection() as conn:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute(
-                """
-                SELECT
-                    id,
-                    name,
-                    price,
-                    stock,
-                    image,
-                    description,
-                    category,
-                    price_type,
-                    EXTRACT(EPOCH FROM created_at) AS created_at
-                FROM products
-                ORDER BY created_at DESC
-                """
-            )
+            cur.execute(sql, values)
             rows = cur.fetchall()
-            return [_row_to_product(r) for r in rows]
+            return [row_to(r) for r in rows]
+
+
+def list_products_page(
+    current_user: User,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    row_to: Callable[[Dict], Any] = _row_to_product,
+    filters: Optional[ProductFilters] = None,
+) -> Tuple[List[Product], Optional[str]]:
+    """
+    รายการสินค้าทีละหน้า (ใหม่สุดก่อน) แบบ keyset บน (created_at, id)
+    คืน (สินค้าในหน้านี้, next_cursor) — next_cursor เป็น None เมื่อไม่มีหน้าถัดไป
+    filters: ตัวกรองเดียวกับ list_products (cursor ของหน้าถัดไปใช้ได้กับตัวกรองชุดเดิมเท่านั้น)
+    """
+    limit = _clamp_limit(limit)
+    sql, values = _products_page_query(limit, cursor, filters)
+    with get_connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(sql, values)
+            rows, next_cursor = _finish_page(cur.fetchall(), limit)
+    return [row_to(r) for r in rows], next_cursor
 
 
 def get_product(current_user: User, product_id: str) -> Product:
@@ -816,8 +2199,11 @@ def get_product(current_user: User, product_id: str) -> Product:
                     description,
                     category,
                     price_type,
-                    EXTRACT(EPOCH FROM created_at) AS created_at
+                    EXTRACT(EPOCH FROM created_at) AS created_at,
+                    COALESCE(rs.review_count, 0) AS rating_count,
+                    rs.rating_sum
                 FROM products
+                LEFT JOIN product_rating_stats rs ON rs.product_id = products.id
                 WHERE id = %s
                 """,
                 (product_id,),
@@ -882,14 +2268,29 @@ def update_product(
     values.append(product_id)
     set_clause = ", ".join(fields)
 
+    # UPDATE + bump version + อ่านแถวใหม่ (พร้อมคะแนน) ในคำสั่งเดียว
     with get_connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                f"UPDATE products SET {set_clause} WHERE id = %s",
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            row = _write_returning(
+                cur,
+                [f"""
+                changed AS (
+                    UPDATE products SET {set_clause} WHERE id = %s
+                    RETURNING id, name, price, stock, image, description, category, price_type,
+                              EXTRACT(EPOCH FROM created_at) AS created_at
+                )"""],
                 tuple(values),
+                select="""
+                SELECT changed.*, COALESCE(rs.review_count, 0) AS rating_count, rs.rating_sum
+                FROM changed
+                LEFT JOIN product_rating_stats rs ON rs.product_id = changed.id
+                """,
+                catalog=(CATALOG_PRODUCTS,),
+                catalog_ids=True,
             )
-
-    return get_product(current_user, product_id)
+    if not row:
+        raise ValueError("ไม่พบสินค้า")
+    return _row_to_product(row)
 
 
 def delete_product(current_user: User, product_id: str) -> None:
@@ -897,16 +2298,233 @@ def delete_product(current_user: User, product_id: str) -> None:
     _require_admin(current_user)
 
     with get_connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                "SELECT 1 FROM products WHERE id = %s",
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            row = _write_returning(
+                cur,
+                ["changed AS (DELETE FROM products WHERE id = %s RETURNING id, image)", _release_blob_cte("image")],
                 (product_id,),
+                # รีวิวของสินค้านี้ถูกลบตาม ON DELETE CASCADE ด้วย
+                catalog=(CATALOG_PRODUCTS, CATALOG_REVIEWS),
+                catalog_ids=True,
             )
-            row = cur.fetchone()
-            if not row:
-                raise ValueError("ไม่พบสินค้าที่ต้องการลบ")
+    if not row:
+        raise ValueError("ไม่พบสินค้าที่ต้องการลบ")
+
 
-            cur.execute("DELETE FROM products WHERE id = %s", (product_id,))
+# ==========================
+#  Product Facets (จำนวนสินค้าต่อหมวดหมู่ / ประเภท สำหรับแท็บตัวกรอง)
+# ==========================
+
+
+def _product_facet_counts_query(filters: Optional[ProductFilters] = None) -> Tuple[str, tuple]:
+    """
+    นับสินค้าแยกตาม (category, price_type, มีของ) ในช่วงราคาที่กรอง — ได้ไม่กี่สิบแถว
+    ตัวกรองด้านอื่นใช้ตอนรวมผลใน _facets_from_counts
+    """
+    conditions, values = _product_filter_conditions(filters, facets=False)
+    where_clause = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+    return (
+        f"""
+        SELECT category, price_type, COALESCE(stock, 0) > 0 AS in_stock, COUNT(*) AS count
+        FROM products
+        {where_clause}
+        GROUP BY 1, 2, 3
+        """,
+        tuple(values),
+    )
+
+
+def _facets_from_counts(rows, filters: Optional[ProductFilters] = None) -> Dict:
+    """
+    รวมแถวของ _product_facet_counts_query เป็น facet — แต่ละด้านนับโดยใช้ตัวกรองของด้านอื่นทั้งหมด
+    ยกเว้นของตัวเอง (แท็บหมวดหมู่บอกได้ว่าถ้ากดแล้วจะเจอกี่ชิ้น) ส่วน total ใช้ตัวกรองครบทุกด้าน
+    {"total": n, "category": {ชื่อ: n}, "price_type": {ชื่อ: n}, "in_stock": {"true": n, "false": n}}
+    """
+    filters = filters or ProductFilters()
+    wanted = {"category": filters.category, "price_type": filters.price_type, "in_stock": filters.in_stock}
+    facets: Dict[str, Dict] = {"category": {}, "price_type": {}, "in_stock": {"true": 0, "false": 0}}
+    total = 0
+    for row in rows:
+        values = {
+            "category": row["category"] or DEFAULT_PRODUCT_CATEGORY,
+            "price_type": row["price_type"],
+            "in_stock": bool(row["in_stock"]),
+        }
+        misses = [name for name, want in wanted.items() if want is not None and values[name] != want]
+        count = int(row["count"])
+        if not misses:
+            total += count
+        for name in wanted:
+            # ผ่านตัวกรองของด้านอื่นทั้งหมด (ไม่นับด้านของตัวเอง)
+            if misses and misses != [name]:
+                continue
+            if name == "in_stock":
+                key = "true" if values[name] else "false"
+            elif values[name] is None:
+                continue  # สินค้าที่ไม่ได้ระบุประเภทนับใน total เท่านั้น
+            else:
+                key = values[name]
+            facets[name][key] = facets[name].get(key, 0) + count
+    return {"total": total, **facets}
+
+
+def product_facets(current_user: User, filters: Optional[ProductFilters] = None) -> Dict:
+    """
+    จำนวนสินค้าต่อหมวดหมู่ / ประเภท / มีของ ภายใต้ตัวกรองที่เหลือ (ดู _facets_from_counts)
+    อ่านทั้งตาราง products — route ต้อง cache ผลไว้ (app.py ใช้ catalog cache ที่ล้างเมื่อสินค้าเปลี่ยน)
+    """
+    sql, values = _product_facet_counts_query(filters)
+    with get_connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(sql, values)
+            return _facets_from_counts(cur.fetchall(), filters)
+
+
+# ==========================
+#  Product Search (/api/search)
+# ==========================
+
+SEARCH_MAX_QUERY_LENGTH = 100
+# trigram (LIKE '%คำ%') ใช้ index ได้เมื่อคำค้นยาวอย่างน้อย 3 ตัวอักษร สั้นกว่านั้นหาจาก tsvector อย่างเดียว
+SEARCH_TRGM_MIN_LENGTH = 3
+# หน้าลึกกว่านี้ไม่ให้ไปต่อ (ผลค้นหาเรียงตามคะแนน จึงแบ่งหน้าด้วย offset ไม่ใช่ keyset)
+SEARCH_MAX_OFFSET = 1000
+
+# คำ = ตัวอักษร/ตัวเลข รวมสระและวรรณยุกต์ของไทย (U+0E00-0E7F) และลาว (U+0E80-0EFF) ที่ \w ไม่นับ
+_SEARCH_TERM_RE = re.compile(r"[\w\u0e00-\u0eff]+")
+
+
+def normalize_search_query(q: Optional[str]) -> str:
+    """ตัดช่องว่างซ้ำ ตัวพิมพ์เล็ก และความยาวไม่เกิน SEARCH_MAX_QUERY_LENGTH"""
+    return " ".join((q or "").lower().split())[:SEARCH_MAX_QUERY_LENGTH]
+
+
+def _encode_offset_cursor(offset: int) -> str:
+    return base64.urlsafe_b64encode(f"o:{int(offset)}".encode("ascii")).decode("ascii").rstrip("=")
+
+
+def _decode_offset_cursor(cursor: str) -> int:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        kind, offset = base64.urlsafe_b64decode(padded.encode("ascii")).decode("ascii").split(":")
+        if kind != "o" or not 0 < int(offset) <= SEARCH_MAX_OFFSET:
+            raise ValueError
+        return int(offset)
+    except Exception:
+        raise ValueError("cursor ไม่ถูกต้อง")
+
+
+def _like_pattern(text: str) -> str:
+    return "%" + text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+def _search_products_query(
+    q: str, limit: int, cursor: Optional[str], trigram: bool = True
+) -> Optional[Tuple[str, tuple, int]]:
+    """
+    SQL + values + offset ของ search_products (limit ต้อง clamp แล้ว; ดึง limit+1 แถว) — None ถ้าไม่มีคำให้ค้น
+    - tsvector (name น้ำหนัก A, category B, description C) จับคำที่ขึ้นต้นด้วยคำค้น (prefix :*) ทุกคำ
+    - LIKE จับข้อความที่อยู่กลางคำ (ลาว/ไทยเขียนติดกันไม่เว้นวรรค) ผ่าน GIN index ของ pg_trgm
+    คะแนน = ts_rank + word_similarity เรียงมากไปน้อย แล้วใหม่สุดก่อน
+    trigram=False (ไม่มี pg_trgm): ไม่มี word_similarity และ LIKE อ่านทั้งตาราง
+    """
+    text = normalize_search_query(q)
+    terms = _SEARCH_TERM_RE.findall(text)
+    offset = _decode_offset_cursor(cursor) if cursor else 0
+    rank_parts, rank_values, conditions, values = [], [], [], []
+    if trigram:
+        rank_parts.append("word_similarity(%s, search_text)")
+        rank_values.append(text)
+    if terms:
+        tsquery = " & ".join(f"'{term}':*" for term in terms)
+        rank_parts.insert(0, "ts_rank(search_vector, to_tsquery('simple', %s))")
+        rank_values.insert(0, tsquery)
+        conditions.append("search_vector @@ to_tsquery('simple', %s)")
+        values.append(tsquery)
+    if len(text) >= SEARCH_TRGM_MIN_LENGTH:
+        conditions.append("search_text LIKE %s")
+        values.append(_like_pattern(text))
+    if not conditions:
+        return None
+    return (
+        f"""
+        SELECT
+            id,
+            name,
+            price,
+            stock,
+            image,
+            description,
+            category,
+            price_type,
+            EXTRACT(EPOCH FROM created_at) AS created_at,
+            COALESCE(rs.review_count, 0) AS rating_count,
+            rs.rating_sum,
+            {" + ".join(rank_parts) or "0"} AS rank
+        FROM products
+        LEFT JOIN product_rating_stats rs ON rs.product_id = products.id
+        WHERE {" OR ".join(conditions)}
+        ORDER BY rank DESC, products.created_at DESC, id DESC
+        LIMIT %s OFFSET %s
+        """,
+        tuple(rank_values + values + [limit + 1, offset]),
+        offset,
+    )
+
+
+def _finish_search_page(rows: list, limit: int, offset: int):
+    """เหมือน _finish_page แต่ cursor เป็น offset ถัดไป (ไม่เกิน SEARCH_MAX_OFFSET)"""
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        if offset + limit <= SEARCH_MAX_OFFSET:
+            next_cursor = _encode_offset_cursor(offset + limit)
+    return rows, next_cursor
+
+
+def search_products(
+    current_user: User,
+    q: str,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    row_to: Callable[[Dict], Any] = _row_to_product,
+) -> Tuple[List[Product], Optional[str]]:
+    """
+    ค้นหาสินค้าจากชื่อ หมวดหมู่ และรายละเอียด เรียงตามความเกี่ยวข้อง ทีละหน้า
+    คืน (สินค้าในหน้านี้, next_cursor) — คำค้นว่างให้ ValueError
+    """
+    limit = _clamp_limit(limit)
+    query = _search_products_query(q, limit, cursor, trigram=_has_search_trigram())
+    if query is None:
+        raise ValueError("กรุณาระบุคำค้นหา")
+    sql, values, offset = query
+    with get_connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(sql, values)
+            rows, next_cursor = _finish_search_page(cur.fetchall(), limit, offset)
+    return [row_to(r) for r in rows], next_cursor
+
+
+def list_product_names(ids: Optional[Iterable[int]] = None) -> List[Tuple[int, str, Optional[str], float]]:
+    """
+    (id, name, category, created_at epoch) ของสินค้า ใหม่สุดก่อน — ข้อมูลของ suggest_index (ไม่ดึงคอลัมน์อื่น)
+    ids: อ่านเฉพาะสินค้าเหล่านี้ (id ที่ไม่อยู่ในผล = ถูกลบแล้ว) — None = ทุกชิ้น
+    """
+    where_clause, values = "", ()
+    if ids is not None:
+        where_clause, values = "WHERE id = ANY(%s)", (list(ids),)
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                f"""
+                SELECT id, name, category, EXTRACT(EPOCH FROM created_at)::float8
+                FROM products
+                {where_clause}
+                ORDER BY created_at DESC, id DESC
+                """,
+                values,
+            )
+            return cur.fetchall()
 
 
 # ==========================
@@ -914,6 +2532,99 @@ def delete_product(current_user: User, product_id: str) -> None:
 # ==========================
 
 
+def _star_delta(stars: int) -> str:
+    return f"COALESCE((new_rating = {stars})::int, 0) - COALESCE((old_rating = {stars})::int, 0)"
+
+
+# ปรับ product_rating_stats ตามรีวิวที่เขียนในคำสั่งเดียวกัน (CTE ของ _write_returning)
+# changed ต้องคืน product_id, old_rating, new_rating — เพิ่มรีวิว: old_rating NULL, ลบรีวิว: new_rating NULL
+_RATING_DELTA_CTE = f"""
+    rated AS (
+        INSERT INTO product_rating_stats
+            (product_id, review_count, rating_sum, stars_1, stars_2, stars_3, stars_4, stars_5)
+        SELECT
+            product_id,
+            (new_rating IS NOT NULL)::int - (old_rating IS NOT NULL)::int,
+            COALESCE(new_rating, 0) - COALESCE(old_rating, 0),
+            {", ".join(_star_delta(i) for i in range(1, 6))}
+        FROM changed
+        WHERE product_id IS NOT NULL AND old_rating IS DISTINCT FROM new_rating
+        ON CONFLICT (product_id) DO UPDATE SET
+            review_count = product_rating_stats.review_count + EXCLUDED.review_count,
+            rating_sum = product_rating_stats.rating_sum + EXCLUDED.rating_sum,
+            stars_1 = product_rating_stats.stars_1 + EXCLUDED.stars_1,
+            stars_2 = product_rating_stats.stars_2 + EXCLUDED.stars_2,
+            stars_3 = product_rating_stats.stars_3 + EXCLUDED.stars_3,
+            stars_4 = product_rating_stats.stars_4 + EXCLUDED.stars_4,
+            stars_5 = product_rating_stats.stars_5 + EXCLUDED.stars_5,
+            updated_at = NOW()
+    )"""
+
+
+_PRODUCT_RATING_SQL = """
+    SELECT
+        p.id,
+        COALESCE(rs.review_count, 0) AS review_count,
+        COALESCE(rs.rating_sum, 0) AS rating_sum,
+        COALESCE(rs.stars_1, 0) AS stars_1,
+        COALESCE(rs.stars_2, 0) AS stars_2,
+        COALESCE(rs.stars_3, 0) AS stars_3,
+        COALESCE(rs.stars_4, 0) AS stars_4,
+        COALESCE(rs.stars_5, 0) AS stars_5
+    FROM products p
+    LEFT JOIN product_rating_stats rs ON rs.product_id = p.id
+    WHERE p.id = %s
+"""
+
+
+def _row_to_rating(row) -> Dict:
+    if not row:
+        raise ValueError("ไม่พบสินค้า")
+    count = int(row["review_count"])
+    return {
+        "product_id": int(row["id"]),
+        "count": count,
+        "average": round(int(row["rating_sum"]) / count, 2) if count else None,
+        "histogram": {str(i): int(row[f"stars_{i}"]) for i in range(1, 6)},
+    }
+
+
+def get_product_rating(product_id: int) -> Dict:
+    """สรุปคะแนนของสินค้า (จำนวน, เฉลี่ย, histogram 1-5 ดาว) จากตารางสรุป — ไม่ต้องนับรีวิวใหม่"""
+    with get_connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(_PRODUCT_RATING_SQL, (product_id,))
+            row = cur.fetchone()
+    return _row_to_rating(row)
+
+
+def rebuild_rating_stats() -> None:
+    """คำนวณ product_rating_stats ใหม่ทั้งหมดจาก product_reviews (ใช้ซ่อมกรณีข้อมูลคลาดเคลื่อน)"""
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("LOCK TABLE product_rating_stats IN EXCLUSIVE MODE")
+            cur.execute("DELETE FROM product_rating_stats")
+            cur.execute(
+                """
+                INSERT INTO product_rating_stats
+                    (product_id, review_count, rating_sum, stars_1, stars_2, stars_3, stars_4, stars_5)
+                SELECT
+                    product_id,
+                    COUNT(*),
+                    SUM(rating),
+                    COUNT(*) FILTER (WHERE rating = 1),
+                    COUNT(*) FILTER (WHERE rating = 2),
+                    COUNT(*) FILTER (WHERE rating = 3),
+                    COUNT(*) FILTER (WHERE rating = 4),
+                    COUNT(*) FILTER (WHERE rating = 5)
+                FROM product_reviews
+                WHERE product_id IS NOT NULL
+                GROUP BY product_id
+                """
+            )
+            bump_catalog_version(cur, CATALOG_REVIEWS)
+
+
 def _row_to_review(row) -> ProductReview:
     import json
     images = None
@@ -936,50 +2647,232 @@ def _row_to_review(row) -> ProductReview:
     )
 
 
-def list_reviews(current_user: User, product_id: Optional[int] = None) -> List[ProductReview]:
-    """รายการรีวิวสินค้า (admin หรือ customer ก็เรียกดูได้)"""
+_REVIEW_COLUMNS = """
+    id,
+    product_id,
+    customer_name,
+    customer_phone,
+    customer_facebook,
+    customer_instagram,
+    rating,
+    comment,
+    images,
+    EXTRACT(EPOCH FROM created_at) AS created_at
+"""
+
+
+# _REVIEW_COLUMNS สำหรับ UPDATE product_reviews r ... FROM (...) (ชื่อคอลัมน์ต้องระบุตาราง)
+_REVIEW_COLUMNS_R = """
+    r.id,
+    r.product_id,
+    r.customer_name,
+    r.customer_phone,
+    r.customer_facebook,
+    r.customer_instagram,
+    r.rating,
+    r.comment,
+    r.images,
+    EXTRACT(EPOCH FROM r.created_at) AS created_at
+"""
+
+# INSERT รีวิว + ปรับ product_rating_stats + bump version ในคำสั่งเดียว (ใช้กับ _write_returning)
+_INSERT_REVIEW_CTE = f"""
+    changed AS (
+        INSERT INTO product_reviews (product_id, customer_name, customer_phone, customer_facebook, customer_instagram, rating, comment, images, created_at)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, TO_TIMESTAMP(%s))
+        RETURNING {_REVIEW_COLUMNS}, NULL::int AS old_rating, rating AS new_rating
+    )"""
+
+
+def _insert_review(values: tuple) -> ProductReview:
+    """เพิ่มรีวิว (values ตามลำดับของ _INSERT_REVIEW_CTE) — สินค้าไม่มีอยู่จริงให้ foreign key ตรวจเอง ไม่ต้อง SELECT ก่อน"""
+    try:
+        with get_connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                row = _write_returning(cur, [_INSERT_REVIEW_CTE, _RATING_DELTA_CTE], values, catalog=(CATALOG_REVIEWS,))
+    except ForeignKeyViolation:
+        raise ValueError("ไม่พบสินค้า")
+    return _row_to_review(row)
+
+
+def _reviews_query(product_id: Optional[int]) -> Tuple[str, tuple]:
+    """SQL + values ของ list_reviews (ทั้งหมด หรือเฉพาะสินค้าหนึ่งชิ้น)"""
+    if product_id:
+        return (
+            f"""
+            SELECT {_REVIEW_COLUMNS}
+            FROM product_reviews
+            WHERE product_id = %s
+            ORDER BY product_reviews.created_at DESC
+            """,
+            (product_id,),
+        )
+    return (
+        f"""
+        SELECT {_REVIEW_COLUMNS}
+        FROM product_reviews
+        ORDER BY product_reviews.created_at DESC
+        """,
+        (),
+    )
+
+
+def _reviews_page_query(product_id: Optional[int], limit: int, cursor: Optional[str]) -> Tuple[str, tuple]:
+    """SQL + values ของ list_reviews_page (limit ต้อง clamp แล้ว; ดึง limit+1 แถว)"""
+    conditions = []
+    values: list = []
+    if product_id:
+        conditions.append("product_id = %s")
+        values.append(product_id)
+    if cursor:
+        sql, cursor_values = _keyset_condition(cursor)
+        conditions.append(sql)
+        values.extend(cursor_values)
+    where_clause = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+    values.append(limit + 1)
+    return (
+        f"""
+        SELECT
+            {_REVIEW_COLUMNS},
+            (EXTRACT(EPOCH FROM created_at) * 1000000)::BIGINT AS created_at_us
+        FROM product_reviews
+        {where_clause}
+        ORDER BY product_reviews.created_at DESC, product_reviews.id DESC
+        LIMIT %s
+        """,
+        tuple(values),
+    )
+
+
+def _review_cards_query(product_id: Optional[int], limit: int, cursor: Optional[str]) -> Tuple[str, tuple]:
+    """SQL + values ของ list_review_cards (limit ต้อง clamp แล้ว; ดึง limit+1 แถว)"""
+    conditions = []
+    values: list = []
+    if product_id:
+        conditions.append("r.product_id = %s")
+        values.append(product_id)
+    if cursor:
+        sql, cursor_values = _keyset_condition(cursor, prefix="r.")
+        conditions.append(sql)
+        values.extend(cursor_values)
+    where_clause = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+    values.append(limit + 1)
+    return (
+        f"""
+        SELECT
+            r.id,
+            r.product_id,
+            r.customer_name,
+            r.customer_phone,
+            r.customer_facebook,
+            r.customer_instagram,
+            r.rating,
+            r.comment,
+            r.images,
+            EXTRACT(EPOCH FROM r.created_at) AS created_at,
+            (EXTRACT(EPOCH FROM r.created_at) * 1000000)::BIGINT AS created_at_us,
+            p.name AS product_name,
+            p.image AS product_image,
+            LEFT(p.description, 200) AS product_description
+        FROM product_reviews r
+        LEFT JOIN products p ON p.id = r.product_id
+        {where_clause}
+        ORDER BY r.created_at DESC, r.id DESC
+        LIMIT %s
+        """,
+        tuple(values),
+    )
+
+
+def _row_to_review_card(row) -> Dict:
+    import json
+    images = None
+    if row.get("images"):
+        try:
+            images = json.loads(row["images"])
+        except (TypeError, ValueError):
+            images = None
+    return {
+        "id": int(row["id"]),
+        "product_id": int(row["product_id"]) if row["product_id"] is not None else None,
+        "customer_name": row["customer_name"],
+        "customer_phone": row.get("customer_phone"),
+        "customer_facebook": row.get("customer_facebook"),
+        "customer_instagram": row.get("customer_instagram"),
+        "rating": int(row["rating"]),
+        "comment": row.get("comment"),
+        "images": images,
+        "created_at": float(row["created_at"]),
+        "product": {
+            "name": row["product_name"],
+            "image": row["product_image"],
+            "description": row["product_description"],
+        } if row["product_name"] is not None else None,
+    }
+
+
+def list_reviews(
+    current_user: User,
+    product_id: Optional[int] = None,
+    row_to: Callable[[Dict], Any] = _row_to_review,
+) -> List[ProductReview]:
+    """รายการรีวิวสินค้า (admin หรือ customer ก็เรียกดูได้) — row_to เหมือน list_products"""
+    sql, values = _reviews_query(product_id)
     with get_connection() as conn:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            if product_id:
-                cur.execute(
-                    """
-                    SELECT
-                        id,
-                        product_id,
-                        customer_name,
-                        customer_phone,
-                        customer_facebook,
-                        customer_instagram,
-                        rating,
-                        comment,
-                        images,
-                        EXTRACT(EPOCH FROM created_at) AS created_at
-                    FROM product_reviews
-                    WHERE product_id = %s
-                    ORDER BY created_at DESC
-                    """,
-                    (product_id,),
-                )
-            else:
-                cur.execute(
-                    """
-                    SELECT
-                        id,
-                        product_id,
-                        customer_name,
-                        customer_phone,
-                        customer_facebook,
-                        customer_instagram,
-                        rating,
-                        comment,
-                        images,
-                        EXTRACT(EPOCH FROM created_at) AS created_at
-                    FROM product_reviews
-                    ORDER BY created_at DESC
-                    """
-                )
+            cur.execute(sql, values)
             rows = cur.fetchall()
-            return [_row_to_review(r) for r in rows]
+            return [row_to(r) for r in rows]
+
+
+def list_reviews_page(
+    current_user: User,
+    product_id: Optional[int] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    row_to: Callable[[Dict], Any] = _row_to_review,
+) -> Tuple[List[ProductReview], Optional[str]]:
+    """
+    รายการรีวิวทีละหน้า (ใหม่สุดก่อน) แบบ keyset บน (created_at, id)
+    คืน (รีวิวในหน้านี้, next_cursor) — next_cursor เป็น None เมื่อไม่มีหน้าถัดไป
+    """
+    limit = _clamp_limit(limit)
+    sql, values = _reviews_page_query(product_id, limit, cursor)
+    with get_connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(sql, values)
+            rows, next_cursor = _finish_page(cur.fetchall(), limit)
+    return [row_to(r) for r in rows], next_cursor
+
+
+def list_review_cards(
+    product_id: Optional[int] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+) -> Tuple[List[Dict], Optional[str]]:
+    """
+    รีวิวล่าสุดพร้อมข้อมูลสินค้าที่ใช้แสดงการ์ด (join ใน SQL ครั้งเดียว)
+    ให้หน้าเว็บไม่ต้องโหลดสินค้าทั้งหมดมาหา product ของแต่ละรีวิวเอง
+    คืน (รายการ dict, next_cursor)
+    """
+    limit = _clamp_limit(limit)
+    sql, values = _review_cards_query(product_id, limit, cursor)
+    with get_connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(sql, values)
+            rows, next_cursor = _finish_page(cur.fetchall(), limit)
+    return [_row_to_review_card(r) for r in rows], next_cursor
+
+
+def iter_reviews(
+    current_user: User,
+    product_id: Optional[int] = None,
+    itersize: Optional[int] = None,
+) -> Iterator[Dict]:
+    """รีวิวทั้งหมด (หรือของสินค้าหนึ่งชิ้น) เป็นแถวดิบทีละแถว สำหรับ export — แปลงด้วย serialization.review_row_json"""
+    _require_admin(current_user)
+    sql, values = _reviews_query(product_id)
+    return _iter_rows(sql, values, itersize)
 
 
 def create_review(
@@ -998,39 +2891,11 @@ def create_review(
     if rating < 1 or rating > 5:
         raise ValueError("rating ต้องอยู่ระหว่าง 1-5")
     
-    # ตรวจสอบว่า product_id มีอยู่จริง
-    product = get_product(current_user, str(product_id))
-    if not product:
-        raise ValueError("ไม่พบสินค้า")
-    
     import json
     images_json = json.dumps(images) if images else None
     
-    created_at = time.time()
-    
-    with get_connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                """
-                INSERT INTO product_reviews (product_id, customer_name, customer_phone, customer_facebook, customer_instagram, rating, comment, images, created_at)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, TO_TIMESTAMP(%s))
-                RETURNING id
-                """,
-                (product_id, customer_name, customer_phone, customer_facebook, customer_instagram, rating, comment, images_json, created_at),
-            )
-            review_id = cur.fetchone()[0]
-    
-    return ProductReview(
-        id=review_id,
-        product_id=product_id,
-        customer_name=customer_name,
-        customer_phone=customer_phone,
-        customer_facebook=customer_facebook,
-        customer_instagram=customer_instagram,
-        rating=rating,
-        comment=comment,
-        images=images,
-        created_at=created_at,
+    return _insert_review(
+        (product_id, customer_name, customer_phone, customer_facebook, customer_instagram, rating, comment, images_json, time.time())
     )
 
 
@@ -1047,36 +2912,10 @@ def create_review_by_customer(
     """ลูกค้าส่งรีวิวและคะแนนดาว ม system บันทึกแล้ว admin ดูได้"""
     if rating < 1 or rating > 5:
         raise ValueError("rating ต้องอยู่ระหว่าง 1-5")
-    with get_connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute("SELECT id FROM products WHERE id = %s", (product_id,))
-            if not cur.fetchone():
-                raise ValueError("ไม่พบสินค้า")
     import json
     images_json = json.dumps(images) if images else None
-    created_at = time.time()
-    with get_connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                """
-                INSERT INTO product_reviews (product_id, customer_name, customer_phone, customer_facebook, customer_instagram, rating, comment, images, created_at)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, TO_TIMESTAMP(%s))
-                RETURNING id
-                """,
-                (product_id, customer_name.strip(), customer_phone, customer_facebook, customer_instagram, rating, comment, images_json, created_at),
-            )
-            review_id = cur.fetchone()[0]
-    return ProductReview(
-        id=review_id,
-        product_id=product_id,
-        customer_name=customer_name.strip(),
-        customer_phone=customer_phone,
-        customer_facebook=customer_facebook,
-        customer_instagram=customer_instagram,
-        rating=rating,
-        comment=comment,
-        images=images,
-        created_at=created_at,
+    return _insert_review(
+        (product_id, customer_name.strip(), customer_phone, customer_facebook, customer_instagram, rating, comment, images_json, time.time())
     )
 
 
@@ -1164,28 +3003,63 @@ def update_review(
     set_clause = ", ".join(fields)
     
     with get_connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                f"UPDATE product_reviews SET {set_clause} WHERE id = %s",
-                values,
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            # ได้แถวใหม่ + คะแนนเก่า/ใหม่ (ปรับตารางสรุปคะแนน) กลับมาในคำสั่งเดียว
+            row = _write_returning(
+                cur,
+                [
+                    f"""
+                    changed AS (
+                        UPDATE product_reviews r
+                        SET {set_clause}
+                        FROM (SELECT id, rating FROM product_reviews WHERE id = %s FOR UPDATE) old
+                        WHERE r.id = old.id
+                        RETURNING {_REVIEW_COLUMNS_R}, old.rating AS old_rating, r.rating AS new_rating
+                    )""",
+                    _RATING_DELTA_CTE,
+                ],
+                tuple(values),
+                catalog=(CATALOG_REVIEWS,),
             )
-    
-    return get_review(current_user, review_id)
+    if not row:
+        raise ValueError("ไม่พบรีวิว")
+    return _row_to_review(row)
 
 
 def update_review_rating_by_customer(review_id: str, customer_name: str, rating: int) -> ProductReview:
     """ลูกค้าแก้ไขเฉพาะคะแนนดาวของตัวเองได้ ถ้าชื่อตรงกับรีวิวนั้น"""
     if rating < 1 or rating > 5:
         raise ValueError("rating ต้องอยู่ระหว่าง 1-5")
-    review = get_review(User(id=0, username="guest", phone=None, password_hash="", role="customer"), review_id)
     name_given = (customer_name or "").strip()
-    name_in_db = (review.customer_name or "").strip()
-    if name_given.lower() != name_in_db.lower():
-        raise ValueError("ຊື່ບໍ່ຕົງກັນ ບໍ່ສາມາດແກ້ໄຂຄະແນນໄດ້")
     with get_connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute("UPDATE product_reviews SET rating = %s WHERE id = %s", (rating, review_id))
-    return get_review(User(id=0, username="guest", phone=None, password_hash="", role="customer"), review_id)
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            # ตรวจชื่อใน WHERE ของ UPDATE เลย: target บอกว่ามีรีวิวไหม, changed ว่างแปลว่าชื่อไม่ตรง
+            row = _write_returning(
+                cur,
+                [
+                    """
+                    target AS (
+                        SELECT id, rating, customer_name FROM product_reviews WHERE id = %s FOR UPDATE
+                    )""",
+                    f"""
+                    changed AS (
+                        UPDATE product_reviews r
+                        SET rating = %s
+                        FROM target old
+                        WHERE r.id = old.id AND LOWER(TRIM(old.customer_name)) = LOWER(%s)
+                        RETURNING {_REVIEW_COLUMNS_R}, old.rating AS old_rating, r.rating AS new_rating
+                    )""",
+                    _RATING_DELTA_CTE,
+                ],
+                (review_id, rating, name_given),
+                select="SELECT changed.* FROM target LEFT JOIN changed ON true",
+                catalog=(CATALOG_REVIEWS,),
+            )
+    if not row:
+        raise ValueError("ไม่พบรีวิว")
+    if row["id"] is None:
+        raise ValueError("ຊື່ບໍ່ຕົງກັນ ບໍ່ສາມາດແກ້ໄຂຄະແນນໄດ້")
+    return _row_to_review(row)
 
 
 def delete_review(current_user: User, review_id: str) -> None:
@@ -1193,11 +3067,20 @@ def delete_review(current_user: User, review_id: str) -> None:
     _require_admin(current_user)
     
     with get_connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute("SELECT 1 FROM product_reviews WHERE id = %s", (review_id,))
-            row = cur.fetchone()
-            if not row:
-                raise ValueError("ไม่พบรีวิวที่ต้องการลบ")
-            
-            cur.execute("DELETE FROM product_reviews WHERE id = %s", (review_id,))
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            row = _write_returning(
+                cur,
+                [
+                    """
+                    changed AS (
+                        DELETE FROM product_reviews WHERE id = %s
+                        RETURNING product_id, rating AS old_rating, NULL::int AS new_rating
+                    )""",
+                    _RATING_DELTA_CTE,
+                ],
+                (review_id,),
+                catalog=(CATALOG_REVIEWS,),
+            )
+    if not row:
+        raise ValueError("ไม่พบรีวิวที่ต้องการลบ")
 
@@ -0,0 +1,201 @@
+"""
+ชั้นข้อมูลแบบ async สำหรับโหมด ASGI (asgi.py) — psycopg 3 + AsyncConnectionPool
+ใช้ SQL และตัวแปลงแถวชุดเดียวกับ pyhon.py ฟังก์ชันชื่อเดียวกันจึงคืนผลเหมือนกันทุกอย่าง
+(รอ DB ด้วย await แทนการถือ thread/worker ไว้)
+"""
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from psycopg.conninfo import make_conninfo
+from psycopg.rows import dict_row, tuple_row
+from psycopg_pool import AsyncConnectionPool
+
+from pyhon import (
+    DB_POOL_MAX,
+    DB_POOL_MIN,
+    DB_POOL_PING_AFTER,
+    DB_POOL_RECYCLE,
+    DB_POOL_TIMEOUT,
+    Product,
+    ProductFilters,
+    ProductReview,
+    User,
+    _CATALOG_VERSIONS_SQL,
+    _PRODUCT_RATING_SQL,
+    _SEARCH_TRIGRAM_SQL,
+    _clamp_limit,
+    _connect_params,
+    _facets_from_counts,
+    _finish_page,
+    _finish_search_page,
+    _list_products_query,
+    _product_facet_counts_query,
+    _products_page_query,
+    _review_cards_query,
+    _reviews_page_query,
+    _reviews_query,
+    _row_to_product,
+    _row_to_rating,
+    _row_to_review,
+    _row_to_review_card,
+    _rows_to_catalog_versions,
+    _search_products_query,
+)
+
+
+# ==========================
+#  Async Connection Pool
+# ==========================
+
+_POOL: Optional[AsyncConnectionPool] = None
+
+
+def _conninfo() -> str:
+    params = dict(_connect_params())
+    return make_conninfo(params.pop("dsn", ""), **params)
+
+
+async def open_pool() -> AsyncConnectionPool:
+    """เปิด pool (เรียกตอน ASGI lifespan startup ของแต่ละ worker) ใช้ค่า DB_POOL_* ชุดเดียวกับ pyhon"""
+    global _POOL
+    if _POOL is None:
+        pool = AsyncConnectionPool(
+            _conninfo(),
+            min_size=DB_POOL_MIN,
+            max_size=DB_POOL_MAX,
+            timeout=DB_POOL_TIMEOUT,
+            max_lifetime=DB_POOL_RECYCLE,
+            max_idle=max(DB_POOL_PING_AFTER, 60.0),
+            check=AsyncConnectionPool.check_connection,
+            open=False,
+        )
+        await pool.open()
+        _POOL = pool
+    return _POOL
+
+
+async def close_pool() -> None:
+    global _POOL
+    pool, _POOL = _POOL, None
+    if pool is not None:
+        await pool.close()
+
+
+@asynccontextmanager
+async def get_connection():
+    """
+    ยืม connection แบบ async — ใช้ `async with get_connection() as conn:`
+    จบ block แล้ว commit (หรือ rollback ถ้า error) และคืนเข้า pool เหมือน pyhon.get_connection
+    """
+    pool = _POOL or await open_pool()
+    async with pool.connection() as conn:
+        yield conn
+
+
+async def _fetch_all(sql: str, values: tuple = (), dict_rows: bool = True) -> list:
+    async with get_connection() as conn:
+        async with conn.cursor(row_factory=dict_row if dict_rows else tuple_row) as cur:
+            await cur.execute(sql, values)
+            return await cur.fetchall()
+
+
+# ==========================
+#  Catalogue (อ่านอย่างเดียว — ชื่อ/ผลลัพธ์ตรงกับ pyhon)
+# ==========================
+
+
+async def get_catalog_versions() -> Dict[str, Tuple[int, float]]:
+    return _rows_to_catalog_versions(await _fetch_all(_CATALOG_VERSIONS_SQL, dict_rows=False))
+
+
+async def list_products(
+    current_user: User,
+    row_to: Callable[[Dict], Any] = _row_to_product,
+    filters: Optional[ProductFilters] = None,
+) -> List[Product]:
+    sql, values = _list_products_query(filters)
+    return [row_to(r) for r in await _fetch_all(sql, values)]
+
+
+async def list_products_page(
+    current_user: User,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    row_to: Callable[[Dict], Any] = _row_to_product,
+    filters: Optional[ProductFilters] = None,
+) -> Tuple[List[Product], Optional[str]]:
+    limit = _clamp_limit(limit)
+    sql, values = _products_page_query(limit, cursor, filters)
+    rows, next_cursor = _finish_page(await _fetch_all(sql, values), limit)
+    return [row_to(r) for r in rows], next_cursor
+
+
+async def product_facets(current_user: User, filters: Optional[ProductFilters] = None) -> Dict:
+    sql, values = _product_facet_counts_query(filters)
+    return _facets_from_counts(await _fetch_all(sql, values), filters)
+
+
+# เหมือน pyhon._has_search_trigram (ตรวจครั้งแรกที่ค้นหาของ process)
+_search_trigram: Optional[bool] = None
+
+
+async def _has_search_trigram() -> bool:
+    global _search_trigram
+    if _search_trigram is None:
+        rows = await _fetch_all(_SEARCH_TRIGRAM_SQL, dict_rows=False)
+        _search_trigram = bool(rows[0][0])
+    return _search_trigram
+
+
+async def search_products(
+    current_user: User,
+    q: str,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    row_to: Callable[[Dict], Any] = _row_to_product,
+) -> Tuple[List[Product], Optional[str]]:
+    limit = _clamp_limit(limit)
+    query = _search_products_query(q, limit, cursor, trigram=await _has_search_trigram())
+    if query is None:
+        raise ValueError("กรุณาระบุคำค้นหา")
+    sql, values, offset = query
+    rows, next_cursor = _finish_search_page(await _fetch_all(sql, values), limit, offset)
+    return [row_to(r) for r in rows], next_cursor
+
+
+async def get_product_rating(product_id: int) -> Dict:
+    rows = await _fetch_all(_PRODUCT_RATING_SQL, (product_id,))
+    return _row_to_rating(rows[0] if rows else None)
+
+
+async def list_reviews(
+    current_user: User,
+    product_id: Optional[int] = None,
+    row_to: Callable[[Dict], Any] = _row_to_review,
+) -> List[ProductReview]:
+    sql, values = _reviews_query(product_id)
+    return [row_to(r) for r in await _fetch_all(sql, values)]
+
+
+async def list_reviews_page(
+    current_user: User,
+    product_id: Optional[int] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    row_to: Callable[[Dict], Any] = _row_to_review,
+) -> Tuple[List[ProductReview], Optional[str]]:
+    limit = _clamp_limit(limit)
+    sql, values = _reviews_page_query(product_id, limit, cursor)
+    rows, next_cursor = _finish_page(await _fetch_all(sql, values), limit)
+    return [row_to(r) for r in rows], next_cursor
+
+
+async def list_review_cards(
+    product_id: Optional[int] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+) -> Tuple[List[Dict], Optional[str]]:
+    limit = _clamp_limit(limit)
+    sql, values = _review_cards_query(product_id, limit, cursor)
+    rows, next_cursor = _finish_page(await _fetch_all(sql, values), limit)
+    return [_row_to_review_card(r) for r in rows], next_cursor
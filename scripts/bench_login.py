@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+วัดจำนวน login/s และ register/s ของทางเดิมเทียบกับทางใหม่ (ส่วนที่วิ่งถึงฐานข้อมูล)
+
+- login เดิม: _get_user_by_username แล้วถ้าไม่เจอค่อย normalize_lao_phone + หาด้วยเบอร์ (สูงสุด 2 query ต่อกัน)
+  login ใหม่: _get_user_by_login (username หรือเบอร์ใน query เดียว)
+  วัดทั้งล็อกอินด้วย username และด้วยเบอร์มือถือ — --with-password รวมการตรวจรหัสผ่าน (KDF) เข้าไปด้วย
+- register เดิม: SELECT หา username ซ้ำ แล้ว INSERT อีก connection
+  register ใหม่: pyhon.register() (INSERT ... ON CONFLICT คำสั่งเดียว)
+  ทั้งสองแบบใช้ hash ที่คำนวณไว้แล้ว ให้เห็นเฉพาะต้นทุนของ DB
+
+⚠️ ใช้กับฐานข้อมูลทดสอบเท่านั้น — สร้าง user ทดสอบ (ลบทิ้งตอนจบ) และต้อง migrate ถึง v8 แล้ว
+
+    python scripts/bench_login.py --logins 2000 --concurrency 8
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# ปิด sweeper เบื้องหลัง ไม่ให้ query ของมันปนกับผลวัด
+os.environ.setdefault("SESSION_SWEEP_INTERVAL", "0")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pyhon  # noqa: E402
+
+_USER_BY_PHONE_SQL = """
+    SELECT id, username, phone, password_hash, role, EXTRACT(EPOCH FROM created_at) AS created_at
+    FROM users
+    WHERE phone = %s
+"""
+
+
+def legacy_lookup(login_id: str):
+    """การหา user ของ login() ก่อนมี _get_user_by_login"""
+    user = pyhon._get_user_by_username(login_id)
+    if user:
+        return user
+    try:
+        phone_norm = pyhon.normalize_lao_phone(login_id)
+    except ValueError:
+        return None
+    with pyhon.get_connection() as conn:
+        with conn.cursor(cursor_factory=pyhon.RealDictCursor) as cur:
+            cur.execute(_USER_BY_PHONE_SQL, (phone_norm,))
+            row = cur.fetchone()
+            return pyhon._row_to_user(row) if row else None
+
+
+def legacy_register(username: str, password_hash: str):
+    """register() ก่อนเป็น INSERT ... ON CONFLICT: SELECT หา username ซ้ำก่อน แล้ว INSERT"""
+    if pyhon._get_user_by_username(username):
+        raise ValueError("username นี้ถูกใช้งานแล้ว")
+    with pyhon.get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                INSERT INTO users (username, phone, password_hash, role, created_at)
+                VALUES (%s, %s, %s, 'customer', NOW())
+                RETURNING id
+                """,
+                (username, None, password_hash),
+            )
+            return cur.fetchone()[0]
+
+
+def _measure(label: str, attempt, count: int, concurrency: int, baseline=None) -> float:
+    attempt(-1)  # warm-up (สร้าง pool / connection)
+    latencies = []
+    lock = threading.Lock()
+
+    def one(i):
+        start = time.perf_counter()
+        attempt(i)
+        with lock:
+            latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as clients:
+        list(clients.map(one, range(count)))
+    rate = count / (time.perf_counter() - started)
+
+    latencies.sort()
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    speedup = f"   x{rate / baseline:.2f}" if baseline else ""
+    print(
+        f"{label:<28} {rate:>9.1f} /s"
+        f"   p50 {statistics.median(latencies) * 1000:>7.2f} ms"
+        f"   p95 {p95 * 1000:>7.2f} ms{speedup}"
+    )
+    return rate
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=2000, help="จำนวนครั้งต่อแบบ")
+    parser.add_argument("--concurrency", type=int, default=8, help="จำนวน client ที่ยิงพร้อมกัน")
+    parser.add_argument("--with-password", action="store_true", help="รวมการตรวจรหัสผ่าน (KDF) ในแต่ละ login")
+    args = parser.parse_args()
+
+    prefix = "benchlogin_" + uuid.uuid4().hex[:8]
+    password = "bench-" + uuid.uuid4().hex[:8]
+    # 0208xxxxxxx ไม่ชนกับเบอร์ของ users จำลองใน check_query_plans.py (+856200..., 0209...)
+    phone = "0208" + str(int(uuid.uuid4().hex[:8], 16) % 10**7).zfill(7)
+    user = pyhon.register(prefix, password, phone=phone)
+    stored_hash = user.password_hash
+
+    def login_with(lookup, login_id):
+        def attempt(_):
+            found = lookup(login_id)
+            assert found is not None and found.id == user.id
+            if args.with_password:
+                ok, _ = pyhon._verify_password(password, found.password_hash)
+                assert ok
+
+        return attempt
+
+    print(
+        f"{args.logins} ครั้งต่อแบบ, client พร้อมกัน {args.concurrency}, pool สูงสุด {pyhon.DB_POOL_MAX}"
+        f" ({'รวม' if args.with_password else 'ไม่รวม'}การตรวจรหัสผ่าน)"
+    )
+    try:
+        for label, login_id in (("username", prefix), ("เบอร์มือถือ", phone)):
+            before = _measure(f"login ({label}) เดิม", login_with(legacy_lookup, login_id), args.logins, args.concurrency)
+            _measure(
+                f"login ({label}) ใหม่", login_with(pyhon._get_user_by_login, login_id), args.logins, args.concurrency, before
+            )
+
+        # register ทั้งสองแบบใช้ hash ที่มีอยู่แล้ว (ต้นทุน KDF เท่ากันทั้งสองทาง จึงตัดออก)
+        pyhon._hash_password = lambda _password: stored_hash
+        before = _measure(
+            "register เดิม", lambda i: legacy_register(f"{prefix}_old_{i}", stored_hash), args.logins, args.concurrency
+        )
+        _measure(
+            "register ใหม่", lambda i: pyhon.register(f"{prefix}_new_{i}", password), args.logins, args.concurrency, before
+        )
+    finally:
+        with pyhon.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("DELETE FROM users WHERE username LIKE %s", (prefix + "%",))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+วัด throughput ของการล็อกอิน (ตรวจรหัสผ่าน) ที่ค่า cost ต่าง ๆ ของ KDF
+
+- ค่าเริ่มต้นวัดเฉพาะการตรวจรหัสผ่านผ่าน pool ของ pyhon (ไม่แตะ DB) — ส่วนที่แพงที่สุดของ login()
+- --db: เรียก pyhon.login() จริง (สร้าง user ทดสอบ + session ในฐานข้อมูล ใช้กับ DB ทดสอบเท่านั้น)
+
+    python scripts/bench_password_hash.py --logins 64 --concurrency 8 --workers 2
+"""
+import argparse
+import hashlib
+import os
+import statistics
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pyhon  # noqa: E402
+
+# (ชื่อ, scheme, ค่า cost) — None = hash เก่าแบบ SHA-256 (เทียบ baseline)
+COST_SETTINGS = [
+    ("sha256 (legacy)", None, None),
+    ("scrypt N=2^13", "scrypt", {"PASSWORD_SCRYPT_N": 2 ** 13}),
+    ("scrypt N=2^14", "scrypt", {"PASSWORD_SCRYPT_N": 2 ** 14}),
+    ("scrypt N=2^15", "scrypt", {"PASSWORD_SCRYPT_N": 2 ** 15}),
+    ("scrypt N=2^16", "scrypt", {"PASSWORD_SCRYPT_N": 2 ** 16}),
+    ("pbkdf2 200k", "pbkdf2_sha256", {"PASSWORD_PBKDF2_ITERATIONS": 200_000}),
+    ("pbkdf2 600k", "pbkdf2_sha256", {"PASSWORD_PBKDF2_ITERATIONS": 600_000}),
+    ("pbkdf2 1M", "pbkdf2_sha256", {"PASSWORD_PBKDF2_ITERATIONS": 1_000_000}),
+]
+
+
+def _apply(scheme, params) -> None:
+    if scheme:
+        pyhon.PASSWORD_HASH_SCHEME = scheme
+    for name, value in (params or {}).items():
+        setattr(pyhon, name, value)
+
+
+def _stored_hash(scheme, password: str) -> str:
+    if scheme is None:
+        return hashlib.sha256(password.encode("utf-8")).hexdigest()
+    return pyhon._hash_password(password)
+
+
+def _login_via_db(password: str):
+    """สร้าง user ทดสอบที่มี hash ตาม cost นี้ แล้วคืนฟังก์ชันที่เรียก login() จริง"""
+    username = "bench_" + uuid.uuid4().hex[:10]
+    pyhon.register(username, password)
+
+    def _login():
+        token = pyhon.login(username, password)
+        pyhon.logout(token)
+
+    return _login
+
+
+def run(label, scheme, params, args) -> None:
+    if args.db and scheme is None:
+        # login ครั้งแรกจะ rehash เป็น KDF ทันที จึงวัดแบบเก่าผ่าน DB ไม่ได้
+        print(f"{label:<18} (ข้ามในโหมด --db)")
+        return
+    _apply(scheme, params)
+    password = "bench-" + uuid.uuid4().hex[:8]
+    if args.db:
+        attempt = _login_via_db(password)
+    else:
+        stored = _stored_hash(scheme, password)
+
+        def attempt():
+            ok, _ = pyhon._verify_password(password, stored)
+            assert ok
+
+    attempt()  # warm-up (สร้าง pool / connection)
+    latencies = []
+    lock = threading.Lock()
+
+    def one(_):
+        start = time.perf_counter()
+        attempt()
+        with lock:
+            latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as clients:
+        list(clients.map(one, range(args.logins)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(
+        f"{label:<18} {args.logins / elapsed:>9.1f} login/s"
+        f"   p50 {statistics.median(latencies) * 1000:>8.1f} ms"
+        f"   p95 {p95 * 1000:>8.1f} ms"
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=64, help="จำนวนการล็อกอินต่อค่า cost")
+    parser.add_argument("--concurrency", type=int, default=8, help="จำนวน client ที่ยิงพร้อมกัน")
+    parser.add_argument("--workers", type=int, default=pyhon.PASSWORD_HASH_WORKERS, help="PASSWORD_HASH_WORKERS")
+    parser.add_argument("--db", action="store_true", help="เรียก login() จริงผ่านฐานข้อมูล (DB ทดสอบเท่านั้น)")
+    parser.add_argument("--only", help="วัดเฉพาะค่า cost ที่ชื่อมีข้อความนี้ เช่น scrypt")
+    args = parser.parse_args()
+
+    pyhon.PASSWORD_HASH_WORKERS = args.workers
+    pyhon.PASSWORD_HASH_TIMEOUT = 600
+    mode = "login() + DB" if args.db else "ตรวจรหัสผ่านอย่างเดียว"
+    print(f"{mode}: {args.logins} ครั้ง, client พร้อมกัน {args.concurrency}, KDF workers {args.workers}, CPU {os.cpu_count()}")
+    for label, scheme, params in COST_SETTINGS:
+        if args.only and args.only not in label:
+            continue
+        run(label, scheme, params, args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+วัดเวลาแปลงรายการสินค้า/รีวิวเป็น JSON (ไม่แตะ DB — ใช้แถวจำลองหน้าตาเหมือน RealDictCursor)
+
+- เดิม: แถว -> dataclass (_row_to_*) -> dict ที่ประกอบเองใน route -> json มาตรฐานแบบ jsonify (sort_keys, ensure_ascii)
+- dataclass: แถว -> dataclass -> serialization.product_json / review_json -> serialization.dumps
+- แถวตรง: แถว -> serialization.product_row_json / review_row_json -> serialization.dumps (ทางของ API สาธารณะ)
+ทุกแบบต้องได้ JSON ที่อ่านกลับมาแล้วเท่ากัน (เช็คก่อนวัด) และวัดทั้ง orjson (ถ้าติดตั้ง) และ json มาตรฐาน
+
+    python scripts/bench_serialization.py --rows 10000 --repeat 5
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+
+import pyhon  # noqa: E402
+import serialization  # noqa: E402
+
+
+def product_rows(n: int):
+    return [
+        {
+            "id": i,
+            "name": f"ชุดดอกจำปา {i}",
+            "price": Decimal("1290.00") + i,
+            "stock": i % 40 if i % 7 else None,
+            "image": f"uploads/product/ab/cd/{i:064x}.jpg",
+            "description": "ผ้าฝ้ายทอมือ ลายดอกจำปา เหมาะกับงานบุญและงานแต่ง " * 2,
+            "category": ("ชุด", "ผ้าซิ่น", "เสื้อ")[i % 3],
+            "price_type": ("1-10", "11-20", "custom")[i % 3],
+            "created_at": Decimal("1700000000.123456") + i,
+            "rating_count": i % 12,
+            "rating_sum": (i % 12) * 4,
+        }
+        for i in range(1, n + 1)
+    ]
+
+
+def review_rows(n: int):
+    return [
+        {
+            "id": i,
+            "product_id": i % 500 + 1,
+            "customer_name": f"ลูกค้า {i}",
+            "customer_phone": "020" + str(10000000 + i),
+            "customer_facebook": None,
+            "customer_instagram": f"champa_{i}" if i % 2 else None,
+            "rating": i % 5 + 1,
+            "comment": "ผ้าสวยมาก เนื้อผ้านุ่ม ส่งไว แนะนำเลยค่ะ " * 3,
+            "images": json.dumps([f"uploads/product/ab/cd/{i:064x}-{k}.jpg" for k in range(3)]),
+            "created_at": Decimal("1700000000.5") + i,
+        }
+        for i in range(1, n + 1)
+    ]
+
+
+def _jsonify_bytes(obj) -> bytes:
+    """json มาตรฐานแบบที่ jsonify ของ Flask ใช้ (ก่อนมี serialization.JSONProvider)"""
+    return json.dumps(obj, default=DefaultJSONProvider.default, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+
+def legacy_products(rows) -> bytes:
+    products = [pyhon._row_to_product(r) for r in rows]
+    return _jsonify_bytes([
+        {"id": p.id, "name": p.name, "price": p.price, "stock": p.stock, "image": serialization.normalize_image_path(p.image), "images": serialization.image_pipeline.image_set(serialization.normalize_image_path(p.image)), "description": p.description, "category": p.category, "price_type": p.price_type, "rating_count": p.rating_count, "rating_avg": p.rating_avg}
+        for p in products
+    ])
+
+
+def legacy_reviews(rows) -> bytes:
+    reviews = [pyhon._row_to_review(r) for r in rows]
+    return _jsonify_bytes([
+        {
+            "id": r.id,
+            "product_id": r.product_id,
+            "customer_name": r.customer_name,
+            "customer_phone": r.customer_phone,
+            "customer_facebook": r.customer_facebook,
+            "customer_instagram": r.customer_instagram,
+            "rating": r.rating,
+            "comment": r.comment,
+            "images": r.images,
+            "created_at": r.created_at
+        }
+        for r in reviews
+    ])
+
+
+def dataclass_products(rows) -> bytes:
+    return serialization.dumps([serialization.product_json(pyhon._row_to_product(r)) for r in rows])
+
+
+def dataclass_reviews(rows) -> bytes:
+    return serialization.dumps([serialization.review_json(pyhon._row_to_review(r)) for r in rows])
+
+
+def row_products(rows) -> bytes:
+    return serialization.dumps([serialization.product_row_json(r) for r in rows])
+
+
+def row_reviews(rows) -> bytes:
+    return serialization.dumps([serialization.review_row_json(r) for r in rows])
+
+
+PATHS = [
+    ("สินค้า", product_rows, (("เดิม", legacy_products), ("dataclass", dataclass_products), ("แถวตรง", row_products))),
+    ("รีวิว", review_rows, (("เดิม", legacy_reviews), ("dataclass", dataclass_reviews), ("แถวตรง", row_reviews))),
+]
+
+
+def _best_of(fn, rows, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(rows)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000, help="จำนวนแถวต่อรายการ")
+    parser.add_argument("--repeat", type=int, default=5, help="วัดกี่รอบ (เอาเวลาที่ดีที่สุด)")
+    args = parser.parse_args()
+
+    orjson = serialization.orjson
+    backends = [("orjson", orjson), ("json", None)] if orjson is not None else [("json", None)]
+    print(f"{args.rows} แถว, ดีที่สุดจาก {args.repeat} รอบ (orjson {'มี' if orjson else 'ไม่ได้ติดตั้ง'})")
+    for label, make_rows, paths in PATHS:
+        rows = make_rows(args.rows)
+        expected = json.loads(paths[0][1](rows))
+        for name, fn in paths[1:]:
+            assert json.loads(fn(rows)) == expected, f"{label}/{name}: JSON ไม่ตรงกับแบบเดิม"
+        baseline = _best_of(paths[0][1], rows, args.repeat)
+        print(f"{label}: {'เดิม (json)':<22} {baseline * 1000:>8.1f} ms   {len(paths[0][1](rows)) / 1024:>7.0f} KB")
+        for backend_name, module in backends:
+            serialization.orjson = module
+            for name, fn in paths[1:]:
+                elapsed = _best_of(fn, rows, args.repeat)
+                print(
+                    f"{label}: {f'{name} ({backend_name})':<22} {elapsed * 1000:>8.1f} ms"
+                    f"   {len(fn(rows)) / 1024:>7.0f} KB   x{baseline / elapsed:.2f}"
+                )
+        serialization.orjson = orjson
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
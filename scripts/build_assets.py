@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Build ไฟล์ static ของหน้าเว็บ (client/ และ static/js/) ลง build/ ก่อน deploy
+
+    python scripts/build_assets.py            # รันใน build command ต่อจาก pip install
+
+- minify CSS/JS (ใช้ rcssmin / rjsmin ถ้าติดตั้งไว้ — requirements-build.txt; ไม่มีก็ minify CSS แบบพื้นฐาน ส่วน JS คงเดิม)
+- ไฟล์ที่ไม่ใช่ HTML ได้ชื่อที่มี hash ของเนื้อไฟล์ด้วย (style.3f2a1b9c.css) — เสิร์ฟแบบ immutable ได้ทั้งปี
+  ชื่อเดิมยังอยู่ (สำหรับ path ที่ JS ประกอบเองตอนรัน เช่น images/products/1.jpg) แต่ถูก revalidate ทุกครั้ง
+- HTML/CSS ถูกเขียน reference (src/href/url()) ให้ชี้ชื่อที่มี hash
+- ไฟล์ข้อความมี .gz (และ .br ถ้าติดตั้ง Brotli) คู่กัน ให้ server เลือกตาม Accept-Encoding โดยไม่ต้องบีบอัดตอนรับ request
+- build/manifest.json: path เดิม -> path ที่มี hash (static_assets.py อ่านตอนเริ่ม app)
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# (ชื่อใน manifest, โฟลเดอร์ต้นทาง)
+SOURCES = [("client", os.path.join(ROOT, "client")), ("static/js", os.path.join(ROOT, "static", "js"))]
+
+FINGERPRINT_EXTENSIONS = {".css", ".js", ".svg", ".png", ".jpg", ".jpeg", ".gif", ".webp", ".ico", ".woff", ".woff2"}
+COMPRESS_EXTENSIONS = {".html", ".css", ".js", ".svg", ".json", ".txt", ".xml", ".ico"}
+SKIP_EXTENSIONS = {".ini"}
+# บีบอัดแล้วต้องเล็กลงอย่างน้อยเท่านี้จึงเก็บ variant ไว้
+MIN_COMPRESSION_SAVING = 0.05
+
+_HTML_REF_RE = re.compile(r"""(?P<attr>\b(?:src|href)\s*=\s*)(?P<quote>["'])(?P<url>[^"'<>]+)(?P=quote)""", re.I)
+_CSS_URL_RE = re.compile(r"""url\(\s*(?P<quote>["']?)(?P<url>[^"')]+)(?P=quote)\s*\)""", re.I)
+
+
+def minify_css(text: str) -> str:
+    if rcssmin is not None:
+        return rcssmin.cssmin(text)
+    text = re.sub(r"/\*.*?\*/", "", text, flags=re.S)
+    text = re.sub(r"\s+", " ", text)
+    text = re.sub(r"\s*([{};,>])\s*", r"\1", text)
+    return text.replace(";}", "}").strip()
+
+
+def minify_js(text: str) -> str:
+    # ไม่มี rjsmin: ไม่แตะ JS (ตัด comment ด้วย regex ไม่ปลอดภัยกับ string/regex literal) — gzip/brotli ยังลดขนาดได้มาก
+    return rjsmin.jsmin(text) if rjsmin is not None else text
+
+
+def fingerprinted(relative_path: str, content: bytes) -> str:
+    stem, ext = os.path.splitext(relative_path)
+    return f"{stem}.{hashlib.sha256(content).hexdigest()[:8]}{ext}"
+
+
+def _resolve(reference: str, from_dir: str, files: dict):
+    """
+    reference ใน HTML/CSS -> (path ใน files, โฟลเดอร์ที่ใช้เทียบ) หรือ None
+    ลองเทียบกับโฟลเดอร์ของไฟล์ก่อน แล้วค่อยเทียบกับราก (partials/ ถูกโหลดเข้าหน้าที่อยู่ที่ราก)
+    """
+    if re.match(r"^(?:[a-z][a-z0-9+.-]*:|//|#|/)", reference, re.I):
+        return None
+    path = reference.split("#", 1)[0].split("?", 1)[0].replace("\\", "/")
+    for base in dict.fromkeys((from_dir, "")):
+        candidate = os.path.normpath(os.path.join(base, path)).replace(os.sep, "/")
+        if candidate in files:
+            return candidate, base
+    return None
+
+
+def _rewrite(text: str, pattern, relative_path: str, files: dict, fingerprints: dict) -> str:
+    from_dir = os.path.dirname(relative_path)
+
+    def replace(match):
+        resolved = _resolve(match.group("url"), from_dir, files)
+        if resolved is None or resolved[0] not in fingerprints:
+            return match.group(0)
+        target, base = resolved
+        new_url = os.path.relpath(fingerprints[target], base or ".").replace(os.sep, "/")
+        return match.group(0).replace(match.group("url"), new_url)
+
+    return pattern.sub(replace, text)
+
+
+def _write(path: str, content: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(content)
+
+
+def _write_compressed(path: str, content: bytes) -> int:
+    written = 0
+    variants = [(".gz", gzip.compress(content, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append((".br", brotli.compress(content, quality=11)))
+    for suffix, compressed in variants:
+        if len(compressed) <= len(content) * (1 - MIN_COMPRESSION_SAVING):
+            _write(path + suffix, compressed)
+            written += 1
+    return written
+
+
+def _order(relative_path: str) -> int:
+    """ไฟล์ที่ถูกอ้างถึงต้อง hash ก่อนไฟล์ที่อ้าง: รูป/ฟอนต์/JS -> CSS -> HTML"""
+    ext = os.path.splitext(relative_path)[1].lower()
+    return {".css": 1, ".html": 2}.get(ext, 0)
+
+
+def build_tree(name: str, source_dir: str, out_dir: str, manifest: dict) -> dict:
+    files = {}
+    for dirpath, dirnames, filenames in os.walk(source_dir):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            relative_path = os.path.relpath(path, source_dir).replace(os.sep, "/")
+            if os.path.splitext(filename)[1].lower() not in SKIP_EXTENSIONS and not filename.startswith("."):
+                files[relative_path] = path
+
+    fingerprints = {}
+    stats = {"files": 0, "fingerprinted": 0, "compressed": 0, "bytes_in": 0, "bytes_out": 0}
+    for relative_path in sorted(files, key=lambda p: (_order(p), p)):
+        with open(files[relative_path], "rb") as f:
+            content = f.read()
+        stats["bytes_in"] += len(content)
+        ext = os.path.splitext(relative_path)[1].lower()
+        if ext == ".css":
+            text = minify_css(content.decode("utf-8"))
+            content = _rewrite(text, _CSS_URL_RE, relative_path, files, fingerprints).encode("utf-8")
+        elif ext == ".js":
+            content = minify_js(content.decode("utf-8")).encode("utf-8")
+        elif ext == ".html":
+            text = content.decode("utf-8")
+            content = _rewrite(text, _HTML_REF_RE, relative_path, files, fingerprints).encode("utf-8")
+        stats["bytes_out"] += len(content)
+
+        targets = [relative_path]
+        if ext in FINGERPRINT_EXTENSIONS:
+            fingerprints[relative_path] = fingerprinted(relative_path, content)
+            manifest[f"{name}/{relative_path}"] = f"{name}/{fingerprints[relative_path]}"
+            targets.append(fingerprints[relative_path])
+            stats["fingerprinted"] += 1
+        for target in targets:
+            out_path = os.path.join(out_dir, name, target)
+            _write(out_path, content)
+            if ext in COMPRESS_EXTENSIONS:
+                stats["compressed"] += _write_compressed(out_path, content)
+        stats["files"] += 1
+    return stats
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", default=os.path.join(ROOT, "build"), help="โฟลเดอร์ผลลัพธ์ (ถูกลบแล้วสร้างใหม่)")
+    args = parser.parse_args()
+
+    tmp_out = args.out + ".tmp"
+    shutil.rmtree(tmp_out, ignore_errors=True)
+    manifest = {}
+    for name, source_dir in SOURCES:
+        stats = build_tree(name, source_dir, tmp_out, manifest)
+        print(
+            f"{name}: {stats['files']} ไฟล์, hash {stats['fingerprinted']}, variant บีบอัด {stats['compressed']}, "
+            f"{stats['bytes_in'] / 1024:.0f}KB -> {stats['bytes_out'] / 1024:.0f}KB (ก่อน gzip/brotli)"
+        )
+    _write(os.path.join(tmp_out, "manifest.json"), json.dumps(manifest, indent=1, sort_keys=True).encode("utf-8"))
+    # เขียนลง .tmp ให้เสร็จก่อนแล้วค่อยสลับ: build ที่พังกลางทางไม่ทับของเดิม
+    shutil.rmtree(args.out, ignore_errors=True)
+    os.replace(tmp_out, args.out)
+    print(f"minify: css={'rcssmin' if rcssmin else 'พื้นฐาน'}, js={'rjsmin' if rjsmin else 'ไม่ minify'}; "
+          f"brotli={'มี' if brotli else 'ไม่มี (gzip อย่างเดียว)'} -> {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
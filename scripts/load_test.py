@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Load test: ยิง GET พร้อมกันหลายระดับ แล้วดูว่า throughput โตตามจำนวน client เกินจำนวน worker ได้ไหม
+
+รัน server ทีละโหมด (worker เท่ากัน) แล้วเทียบตาราง:
+
+    gunicorn app:app --workers 2 --bind 127.0.0.1:8000                # WSGI (sync)
+    uvicorn asgi:app --workers 2 --host 127.0.0.1 --port 8001        # ASGI
+    python scripts/load_test.py --url http://127.0.0.1:8000 --workers 2
+    python scripts/load_test.py --url http://127.0.0.1:8001 --workers 2
+
+ค่าเริ่มต้นเติม query string ไม่ซ้ำทุก request (?_=n) ให้พลาด catalog cache และวิ่งถึง DB จริง
+ใช้แค่ stdlib (asyncio) — ไม่ต้องติดตั้งอะไรเพิ่ม
+"""
+import argparse
+import asyncio
+import itertools
+import statistics
+import sys
+import time
+from urllib.parse import urlsplit
+
+_counter = itertools.count()
+
+
+async def _get(host: str, port: int, target: str, timeout: float) -> int:
+    """GET หนึ่งครั้ง (connection ใหม่ + Connection: close) คืน HTTP status"""
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    try:
+        writer.write(f"GET {target} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode("latin-1"))
+        await writer.drain()
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+        await asyncio.wait_for(reader.read(), timeout)
+        return int(status_line.split()[1])
+    finally:
+        writer.close()
+
+
+async def _run_level(args, host: str, port: int, path: str, concurrency: int):
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + args.duration
+
+    async def client():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            target = path
+            if not args.cached:
+                target += ("&" if "?" in path else "?") + f"_={next(_counter)}"
+            start = time.perf_counter()
+            try:
+                status = await _get(host, port, target, args.timeout)
+            except (OSError, asyncio.TimeoutError, ValueError, IndexError):
+                status = 0
+            if status == 200:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return latencies, errors, elapsed
+
+
+async def main_async(args) -> int:
+    parts = urlsplit(args.url)
+    host, port = parts.hostname, parts.port or 80
+    path = (parts.path or "") + args.path
+    print(f"{args.url}{args.path}  ({'cache' if args.cached else 'ไม่ใช้ cache'}, {args.duration:.0f}s ต่อระดับ, worker {args.workers})")
+    print(f"{'client':>7} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'errors':>7}")
+    baseline = None
+    for concurrency in args.levels:
+        latencies, errors, elapsed = await _run_level(args, host, port, path, concurrency)
+        rps = len(latencies) / elapsed if elapsed else 0.0
+        baseline = baseline or rps
+        if latencies:
+            latencies.sort()
+            p50 = statistics.median(latencies) * 1000
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000
+        else:
+            p50 = p95 = float("nan")
+        marker = "  <- เกินจำนวน worker" if concurrency > args.workers else ""
+        print(f"{concurrency:>7} {rps:>9.1f} {p50:>9.1f} {p95:>9.1f} {errors:>7}{marker}")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--path", default="/api/products?limit=24")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument("--duration", type=float, default=10.0, help="วินาทีต่อระดับ")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--workers", type=int, default=2, help="จำนวน worker ของ server (ใช้แสดงผลเท่านั้น)")
+    parser.add_argument("--cached", action="store_true", help="ไม่เติม ?_=n (วัดเส้นทางที่ตอบจาก cache)")
+    return asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,274 @@
+"""
+แปลงข้อมูลเป็น JSON ของ API — projection เดียวต่อ model ใช้ทุก route (app.py, asgi.py)
+
+- product_json / review_json / user_json: จาก dataclass ของ pyhon
+- product_row_json / review_row_json: จากแถวของ DB ตรง ๆ (dict จาก RealDictCursor / psycopg dict_row)
+  ส่งเป็น row_to= ให้ list_products / list_reviews ได้ ไม่ต้องสร้าง dataclass แล้วแปลงเป็น dict ซ้ำอีกรอบ
+  ผลต้องตรงกับ projection ของ dataclass ทุก key (scripts/bench_serialization.py เช็คให้)
+- dumps: ใช้ orjson ถ้าติดตั้งไว้ (เร็วกว่า json มาตรฐานหลายเท่า) ไม่มีก็ใช้ json มาตรฐาน — คืน bytes UTF-8
+  JSONProvider ให้ jsonify ของ Flask ใช้ตัวเดียวกัน
+"""
+import csv
+import io
+import json
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from flask.json.provider import DefaultJSONProvider
+
+import image_pipeline
+from pyhon import Product, ProductReview, User
+
+try:
+    import orjson
+except ImportError:  # ไม่มี orjson: json มาตรฐาน (ผลเหมือนกัน ช้ากว่า)
+    orjson = None
+
+
+# ==========================
+#  JSON backend
+# ==========================
+
+
+def _default(obj):
+    # ตัวเลข NUMERIC จาก DB -> float (ตรงกับ Product.price)
+    if isinstance(obj, Decimal):
+        return float(obj)
+    return DefaultJSONProvider.default(obj)
+
+
+if orjson is not None:
+    # datetime/dataclass ส่งต่อให้ _default เพื่อให้ได้รูปแบบเดียวกับ jsonify เดิม (http date, asdict)
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+
+
+def backend() -> str:
+    return "orjson" if orjson is not None else "json"
+
+
+def dumps(obj: Any) -> bytes:
+    """obj -> JSON bytes (UTF-8, ไม่ escape ภาษาไทยเป็น \\uXXXX)"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS)
+    return json.dumps(obj, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class JSONProvider(DefaultJSONProvider):
+    """app.json = JSONProvider(app): jsonify ใช้ dumps ด้านบน (ยกเว้นตอนส่ง option ของ json มาเอง)"""
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return dumps(obj).decode("utf-8")
+
+    def response(self, *args: Any, **kwargs: Any):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj), mimetype=self.mimetype)
+
+
+def page_body(items: List[Dict], next_cursor: Optional[str], paged: bool) -> bytes:
+    """body ของ list API: {"items", "next_cursor"} เมื่อขอแบบแบ่งหน้า ไม่งั้นเป็น array"""
+    if paged:
+        return dumps({"items": items, "next_cursor": next_cursor})
+    return dumps(items)
+
+
+# ==========================
+#  Projections
+# ==========================
+
+
+def normalize_image_path(path):
+    """ให้ path รูปใช้ forward slash เสมอ เพื่อให้ URL ใช้ได้ทุกที่"""
+    if not path or not isinstance(path, str):
+        return path
+    return path.replace("\\", "/")
+
+
+def product_json(p: Product) -> Dict:
+    image = normalize_image_path(p.image)
+    return {
+        "id": p.id,
+        "name": p.name,
+        "price": p.price,
+        "stock": p.stock,
+        "image": image,
+        "images": image_pipeline.image_set(image),
+        "description": p.description,
+        "category": p.category,
+        "price_type": p.price_type,
+        "rating_count": p.rating_count,
+        "rating_avg": p.rating_avg,
+    }
+
+
+def product_row_json(row) -> Dict:
+    """เหมือน product_json แต่อ่านจากแถวของ SQL สินค้า (_list_products_query / _products_page_query)"""
+    image = normalize_image_path(row["image"])
+    stock = row["stock"]
+    rating_count = row["rating_count"] or 0
+    return {
+        "id": row["id"],
+        "name": row["name"],
+        "price": float(row["price"]),
+        "stock": int(stock) if stock is not None else None,
+        "image": image,
+        "images": image_pipeline.image_set(image),
+        "description": row["description"],
+        "category": row["category"],
+        "price_type": row["price_type"],
+        "rating_count": rating_count,
+        "rating_avg": round(float(row["rating_sum"]) / rating_count, 2) if rating_count else None,
+    }
+
+
+# ลำดับคอลัมน์ของ export แบบ CSV (key เดียวกับ projection)
+REVIEW_FIELDS = (
+    "id", "product_id", "customer_name", "customer_phone", "customer_facebook", "customer_instagram",
+    "rating", "comment", "images", "created_at",
+)
+USER_FIELDS = ("id", "username", "phone", "role")
+
+
+def review_json(r: ProductReview) -> Dict:
+    return {
+        "id": r.id,
+        "product_id": r.product_id,
+        "customer_name": r.customer_name,
+        "customer_phone": r.customer_phone,
+        "customer_facebook": r.customer_facebook,
+        "customer_instagram": r.customer_instagram,
+        "rating": r.rating,
+        "comment": r.comment,
+        "images": r.images,
+        "created_at": r.created_at,
+    }
+
+
+def _review_images(value):
+    """คอลัมน์ images เก็บ JSON array เป็นข้อความ (อ่านไม่ได้ = None เหมือน _row_to_review)"""
+    if not value:
+        return None
+    if not isinstance(value, str):
+        return value
+    try:
+        return json.loads(value)
+    except ValueError:
+        return None
+
+
+def review_row_json(row) -> Dict:
+    """เหมือน review_json แต่อ่านจากแถวของ _REVIEW_COLUMNS"""
+    return {
+        "id": row["id"],
+        "product_id": row["product_id"],
+        "customer_name": row["customer_name"],
+        "customer_phone": row["customer_phone"],
+        "customer_facebook": row["customer_facebook"],
+        "customer_instagram": row["customer_instagram"],
+        "rating": row["rating"],
+        "comment": row["comment"],
+        "images": _review_images(row["images"]),
+        "created_at": float(row["created_at"]),
+    }
+
+
+def user_json(u: User) -> Dict:
+    return {"id": u.id, "username": u.username, "phone": u.phone, "role": u.role}
+
+
+def user_row_json(row) -> Dict:
+    """เหมือน user_json แต่อ่านจากแถวของตาราง users (ไม่ส่ง password_hash ออกไป)"""
+    return {"id": row["id"], "username": row["username"], "phone": row["phone"], "role": row["role"]}
+
+
+# ==========================
+#  Streaming (export ขนาดใหญ่: memory คงที่ ส่งเป็นก้อน ๆ)
+# ==========================
+
+# รวมแถวที่ encode แล้วจนได้ขนาดนี้ค่อยส่งหนึ่งก้อน (ไม่ส่งทีละแถวเล็ก ๆ)
+STREAM_CHUNK_BYTES = 64 * 1024
+
+EXPORT_FORMATS = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+def _chunked(pieces: Iterable[bytes]) -> Iterator[bytes]:
+    buffer, size = [], 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= STREAM_CHUNK_BYTES:
+            yield b"".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def _json_array_pieces(items: Iterable[Dict]) -> Iterator[bytes]:
+    yield b"["
+    first = True
+    for item in items:
+        if not first:
+            yield b","
+        first = False
+        yield dumps(item)
+    yield b"]"
+
+
+def _ndjson_pieces(items: Iterable[Dict]) -> Iterator[bytes]:
+    for item in items:
+        yield dumps(item) + b"\n"
+
+
+def _csv_cell(value):
+    # list/dict (เช่น images) เขียนเป็น JSON ในช่องเดียว
+    if isinstance(value, (list, dict)):
+        return dumps(value).decode("utf-8")
+    # กัน Excel ตีความข้อความจากลูกค้าเป็นสูตร (=, +, -, @)
+    if isinstance(value, str) and value[:1] in ("=", "+", "-", "@", "\t", "\r"):
+        return "'" + value
+    return value
+
+
+def _csv_pieces(items: Iterable[Dict], fields: Sequence[str]) -> Iterator[bytes]:
+    out = io.StringIO()
+    writer = csv.writer(out)
+
+    def flush() -> bytes:
+        data = out.getvalue().encode("utf-8")
+        out.seek(0)
+        out.truncate()
+        return data
+
+    # BOM ให้ Excel เปิดภาษาไทย/ลาวเป็น UTF-8 ถูกต้อง
+    out.write("\ufeff")
+    writer.writerow(fields)
+    yield flush()
+    for item in items:
+        writer.writerow([_csv_cell(item.get(f)) for f in fields])
+        yield flush()
+
+
+def stream_rows(rows: Iterable, row_json: Callable[[Any], Dict], fmt: str, fields: Sequence[str] = ()) -> Iterator[bytes]:
+    """
+    แถวจาก DB (เช่น pyhon.iter_reviews) -> body เป็นก้อน bytes ตาม fmt ("json" array, "ndjson", "csv")
+    แปลงทีละแถว ไม่มีรายการทั้งหมดอยู่ใน memory พร้อมกัน
+    """
+    items = (row_json(row) for row in rows)
+    if fmt == "ndjson":
+        pieces = _ndjson_pieces(items)
+    elif fmt == "csv":
+        pieces = _csv_pieces(items, fields)
+    else:
+        pieces = _json_array_pieces(items)
+    try:
+        yield from _chunked(pieces)
+    finally:
+        # client ตัดการเชื่อมต่อกลางทาง: ปิด cursor และคืน connection เข้า pool ทันที
+        close = getattr(rows, "close", None)
+        if close is not None:
+            close()
@@ -98,5 +98,41 @@ const API = {
 
   async delete(path) {
     return this.request(path, { method: 'DELETE' });
+  },
+
+  // อัปโหลดไฟล์ทีละก้อน (resumable) — เน็ตหลุดกลางทางจะถามตำแหน่งล่าสุดจาก server แล้วส่งต่อ ไม่เริ่มใหม่
+  // คืน upload_id ไว้ส่งให้ route อัปโหลดรูป เช่น POST /api/admin/products/<id>/upload-image {upload_id}
+  async uploadResumable(kind, file, onProgress) {
+    const session = await this.post('/api/admin/uploads', { kind, size: file.size, filename: file.name });
+    const url = `${window.location.origin}/api/admin/uploads/${session.upload_id}`;
+    let offset = session.offset;
+    let failures = 0;
+    while (offset < file.size) {
+      try {
+        const response = await fetch(url, {
+          method: 'PATCH',
+          headers: {
+            'Authorization': `Bearer ${this.getToken()}`,
+            'Content-Type': 'application/offset+octet-stream',
+            'Upload-Offset': String(offset)
+          },
+          body: file.slice(offset, offset + session.chunk_size)
+        });
+        const data = await response.json();
+        if (response.status === 409) {
+          offset = data.offset;  // server ได้รับไปแล้วมากกว่า/น้อยกว่าที่คิด — ต่อจากตำแหน่งของ server
+          continue;
+        }
+        if (!response.ok) throw new Error(data.error || 'อัปโหลดไม่สำเร็จ');
+        offset = data.offset;
+        failures = 0;
+        if (onProgress) onProgress(offset / file.size);
+      } catch (error) {
+        if (!(error instanceof TypeError) || ++failures > 5) throw error;  // TypeError = เน็ตหลุด
+        await new Promise((resolve) => setTimeout(resolve, 1000 * failures));
+        offset = (await this.get(`/api/admin/uploads/${session.upload_id}`)).offset;
+      }
+    }
+    return session.upload_id;
   }
 };
@@ -278,18 +278,18 @@ const ProductPage = {
       return;
     }
 
-    const formData = new FormData();
-    formData.append('file', file);
-
     try {
       Notification.info('กำลังอัปโหลดรูป...');
+      // ส่งทีละก้อน (ต่อได้ถ้าเน็ตหลุด) แล้วผูก upload กับสินค้า
+      const uploadId = await API.uploadResumable('product', file);
       const token = API.getToken();
       const response = await fetch(`/api/admin/products/${productId}/upload-image`, {
         method: 'POST',
         headers: {
-          'Authorization': `Bearer ${token}`
+          'Authorization': `Bearer ${token}`,
+          'Content-Type': 'application/json'
         },
-        body: formData
+        body: JSON.stringify({ upload_id: uploadId })
       });
 
       const data = await response.json();
@@ -0,0 +1,81 @@
+"""
+เสิร์ฟไฟล์ static ที่ build แล้ว (scripts/build_assets.py -> build/)
+
+- ชื่อที่มี hash (ตาม build/manifest.json) ได้ Cache-Control immutable 1 ปี; ชื่อเดิม/HTML ให้ revalidate (no-cache + ETag)
+- เลือก .br / .gz ที่บีบอัดไว้แล้วตาม Accept-Encoding ของ request
+- ยังไม่ได้ build (dev): เสิร์ฟจากโฟลเดอร์ต้นทางเหมือนเดิม
+"""
+import json
+import logging
+import mimetypes
+import os
+from typing import Dict, Optional
+
+from flask import request, send_from_directory
+from werkzeug.security import safe_join
+
+logger = logging.getLogger(__name__)
+
+BUILD_DIR = os.environ.get("ASSET_BUILD_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "build"))
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+# (Content-Encoding, นามสกุลของไฟล์ที่บีบอัดไว้) เรียงตามที่อยากส่งก่อน
+PRECOMPRESSED = (("br", ".br"), ("gzip", ".gz"))
+
+# (ชื่อใน manifest, URL prefix)
+_URL_PREFIXES = (("client", "/brand/"), ("static/js", "/static/js/"))
+
+_manifest: Optional[Dict[str, str]] = None
+_fingerprinted: frozenset = frozenset()
+
+
+def _load_manifest() -> Dict[str, str]:
+    """อ่าน build/manifest.json ครั้งเดียวต่อ process ({} ถ้ายังไม่ได้ build)"""
+    global _manifest, _fingerprinted
+    if _manifest is None:
+        try:
+            with open(os.path.join(BUILD_DIR, "manifest.json"), encoding="utf-8") as f:
+                _manifest = json.load(f)
+        except (OSError, ValueError):
+            logger.info("ไม่พบ %s/manifest.json — เสิร์ฟไฟล์ static จากโฟลเดอร์ต้นทาง (ยังไม่ได้รัน build_assets.py)", BUILD_DIR)
+            _manifest = {}
+        _fingerprinted = frozenset(_manifest.values())
+    return _manifest
+
+
+def asset_url(url: str) -> str:
+    """URL ของไฟล์ -> URL ของชื่อที่มี hash (ใช้ใน template: {{ asset_url('/static/js/api.js') }})"""
+    manifest = _load_manifest()
+    for name, prefix in _URL_PREFIXES:
+        if url.startswith(prefix):
+            built = manifest.get(name + "/" + url[len(prefix):])
+            if built:
+                return prefix + built[len(name) + 1:]
+    return url
+
+
+def send_asset(name: str, source_dir: str, path: str):
+    """
+    เสิร์ฟ path จาก build/<name> (เลือก variant ที่บีบอัดตาม Accept-Encoding) หรือจาก source_dir ถ้ายังไม่ได้ build
+    """
+    if not _load_manifest():
+        return send_from_directory(source_dir, path)
+    root = os.path.join(BUILD_DIR, name)
+    full_path = safe_join(root, path)
+    response = None
+    if full_path is not None and os.path.isfile(full_path):
+        mimetype = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        available = [(encoding, suffix) for encoding, suffix in PRECOMPRESSED if os.path.isfile(full_path + suffix)]
+        for encoding, suffix in available:
+            if request.accept_encodings[encoding]:
+                response = send_from_directory(root, path + suffix, mimetype=mimetype)
+                response.headers["Content-Encoding"] = encoding
+                break
+        if available:
+            response = response or send_from_directory(root, path, mimetype=mimetype)
+            response.vary.add("Accept-Encoding")
+    if response is None:
+        response = send_from_directory(root, path)
+    immutable = f"{name}/{path}" in _fingerprinted
+    response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL
+    return response
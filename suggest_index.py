@@ -0,0 +1,300 @@
+"""
+คำแนะนำระหว่างพิมพ์ของช่องค้นหา (/api/search/suggest) จาก index ในหน่วยความจำของแต่ละ worker — ตอบโดยไม่แตะ DB
+
+- ชื่อสินค้า/หมวดหมู่ที่ขึ้นต้นด้วยคำค้น: bisect บนรายการ key ที่เรียงไว้
+- คำค้นอยู่กลางข้อความ (ลาว/ไทยเขียนติดกัน, ยาว >= 3 ตัวอักษร): ไล่ posting ของ trigram ที่พบน้อยที่สุด แล้วตรวจ substring
+- โหลดใหม่เมื่อ catalogue products เปลี่ยน (generation ของ catalog_cache — เขียนใน process นี้ หรือ NOTIFY จาก worker อื่น)
+  NOTIFY ของการเขียนสินค้าแนบ id มาด้วย: อ่านจาก DB เฉพาะแถวนั้นใน background แล้วแก้ index
+  อ่านทั้งตารางเฉพาะตอนเริ่ม, listener หลุด (ไม่รู้ว่าพลาดอะไรไป) หรือครบ SUGGEST_FULL_RELOAD_AGE
+  ระหว่างโหลดยังตอบจาก index เดิม
+"""
+import bisect
+import logging
+import os
+import threading
+import time
+from array import array
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from catalog_cache import get_catalog_cache
+from pyhon import CATALOG_PRODUCTS, list_product_names, normalize_search_query
+
+logger = logging.getLogger(__name__)
+
+
+# ==========================
+#  Settings
+# ==========================
+
+SUGGEST_DEFAULT_LIMIT = 8
+SUGGEST_MAX_LIMIT = 20
+# โหลดใหม่ทั้งตารางอย่างน้อยทุกเท่านี้เมื่อ listener ของ catalog_cache ไม่ทำงาน (อาจพลาด NOTIFY)
+SUGGEST_MAX_AGE = float(os.environ.get("SUGGEST_MAX_AGE", os.environ.get("CATALOG_CACHE_TTL", "300")))
+# เมื่อ listener ทำงาน: โหลดทั้งตารางนาน ๆ ครั้ง กันข้อมูลที่ถูกแก้นอกแอป (ไม่มี NOTIFY)
+SUGGEST_FULL_RELOAD_AGE = float(os.environ.get("SUGGEST_FULL_RELOAD_AGE", "3600"))
+SUGGEST_RETRY = 5.0  # วินาทีก่อนลองโหลดใหม่เมื่อ DB error
+# จำนวนสินค้าจาก posting ของ trigram ที่ตรวจ substring ต่อ request สูงสุด (คุมเวลาตอบเมื่อคำค้นพบบ่อยมาก)
+SUGGEST_SCAN_LIMIT = 5000
+# แถวที่เปลี่ยนเกินสัดส่วนนี้ของ index: สร้างใหม่ทั้งก้อน (แก้ทีละแถวเป็น O(n) ต่อแถว)
+_REBUILD_RATIO = 0.1
+
+
+def _key(text: Optional[str]) -> str:
+    """รูปแบบเดียวกับ normalize_search_query แต่ไม่ตัดความยาว"""
+    return " ".join((text or "").lower().split())
+
+
+def _trigrams(text: str) -> set:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class _Doc(NamedTuple):
+    name: str
+    category: Optional[str]
+    created_at: float
+    name_key: str
+    category_key: str
+    text: str  # name_key + category_key สำหรับตรวจ substring
+
+
+def _make_doc(name: str, category: Optional[str], created_at: float) -> _Doc:
+    name_key, category_key = _key(name), _key(category)
+    return _Doc(name, category, float(created_at), name_key, category_key, f"{name_key} {category_key}".rstrip())
+
+
+def _rank(doc_id: int, doc: _Doc) -> Tuple[float, int]:
+    """ลำดับใหม่สุดก่อน เหมือน ORDER BY created_at DESC, id DESC"""
+    return (-doc.created_at, -doc_id)
+
+
+def _prefix_keys(doc_id: int, doc: _Doc) -> List[Tuple[str, int]]:
+    keys = [(doc.name_key, doc_id)]
+    if doc.category_key:
+        keys.append((doc.category_key, doc_id))
+    return keys
+
+
+# ==========================
+#  Suggest Index
+# ==========================
+
+
+class SuggestIndex:
+    """
+    index ของชื่อ/หมวดหมู่สินค้า — suggest() อ่านภายใต้ lock สั้น ๆ, การโหลดใหม่ทำทีละครั้ง (_refresh_lock)
+    และมีแค่ thread ที่ถือ _refresh_lock เท่านั้นที่แก้ _docs / _prefix / _grams
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._docs: Dict[int, _Doc] = {}
+        self._prefix: List[Tuple[str, int]] = []  # (key, id) เรียงตาม key
+        self._grams: Dict[str, array] = {}  # trigram -> id ของสินค้า (เรียงตาม _rank: ใหม่สุดก่อน)
+        self._generation: Optional[int] = None  # generation ของ catalogue products ตอนโหลดล่าสุด
+        self._loaded_at = 0.0  # เวลาที่อ่านทั้งตารางครั้งล่าสุด (time.monotonic)
+        self._retry_at = 0.0
+        self.queries = 0
+        self.refreshes = 0
+        self.full_reloads = 0
+        self.rebuilds = 0
+
+    @property
+    def ready(self) -> bool:
+        """โหลดครั้งแรกแล้ว (suggest() จะไม่รอ DB)"""
+        return self._generation is not None
+
+    # ----- ค้นหา -----
+
+    def suggest(self, q: Optional[str], limit: Optional[int] = None) -> List[Dict]:
+        """สินค้าที่ชื่อ/หมวดหมู่ขึ้นต้นด้วยคำค้นก่อน ตามด้วยที่มีคำค้นอยู่กลางข้อความ — [{"id", "name", "category"}]"""
+        limit = min(limit, SUGGEST_MAX_LIMIT) if limit and limit > 0 else SUGGEST_DEFAULT_LIMIT
+        query = normalize_search_query(q)
+        if not query:
+            return []
+        self._ensure_fresh()
+        with self._lock:
+            self.queries += 1
+            found = self._prefix_matches(query, limit)
+            if len(found) < limit and len(query) >= 3:
+                self._infix_matches(query, limit, found)
+            return [
+                {"id": doc_id, "name": self._docs[doc_id].name, "category": self._docs[doc_id].category}
+                for doc_id in found
+            ]
+
+    def _prefix_matches(self, query: str, limit: int) -> Dict[int, None]:
+        found: Dict[int, None] = {}
+        i = bisect.bisect_left(self._prefix, (query,))
+        while i < len(self._prefix) and len(found) < limit:
+            key, doc_id = self._prefix[i]
+            if not key.startswith(query):
+                break
+            found[doc_id] = None
+            i += 1
+        return found
+
+    def _infix_matches(self, query: str, limit: int, found: Dict[int, None]) -> None:
+        postings = [self._grams.get(gram) for gram in _trigrams(query)]
+        if not all(postings):
+            return  # มี trigram ที่ไม่อยู่ในสินค้าชิ้นไหนเลย
+        for doc_id in min(postings, key=len)[:SUGGEST_SCAN_LIMIT]:
+            if doc_id not in found and query in self._docs[doc_id].text:
+                found[doc_id] = None
+                if len(found) >= limit:
+                    return
+
+    # ----- โหลด / แก้ index -----
+
+    def _expired(self, now: float) -> bool:
+        max_age = SUGGEST_FULL_RELOAD_AGE if get_catalog_cache().listening else SUGGEST_MAX_AGE
+        return now >= self._loaded_at + max_age
+
+    def _ensure_fresh(self) -> None:
+        generation = get_catalog_cache().generation(CATALOG_PRODUCTS)
+        now = time.monotonic()
+        if generation == self._generation and not self._expired(now):
+            return
+        if self._generation is None:
+            # request แรกของ worker: ต้องรอโหลดให้เสร็จ (request ที่มาพร้อมกันรอก้อนเดียวกัน)
+            with self._refresh_lock:
+                if self._generation is None:
+                    self._refresh(generation)
+            return
+        if now >= self._retry_at and self._refresh_lock.acquire(blocking=False):
+            threading.Thread(
+                target=self._refresh_in_background, args=(generation,), name="suggest-refresh", daemon=True
+            ).start()
+
+    def _refresh_in_background(self, generation: int) -> None:
+        try:
+            self._refresh(generation)
+        except Exception:
+            pass  # log แล้วใน _refresh; ตอบจาก index เดิมต่อ
+        finally:
+            self._refresh_lock.release()
+
+    def _refresh(self, generation: int) -> None:
+        """
+        อ่านสินค้าที่เปลี่ยนจาก DB แล้วแก้ index — เรียกโดย thread ที่ถือ _refresh_lock เท่านั้น
+        รู้ id ที่เปลี่ยน (จาก catalog_cache) อ่านเฉพาะแถวนั้น ไม่รู้หรือครบอายุ อ่านทั้งตาราง
+        """
+        ids = None
+        now = time.monotonic()
+        if self._generation is not None and not self._expired(now):
+            ids = get_catalog_cache().changed_ids(CATALOG_PRODUCTS, self._generation, generation)
+        try:
+            if ids is None:
+                self._apply(list_product_names(), full=True)
+            elif ids:
+                self._apply(list_product_names(ids), ids=ids)
+        except Exception as e:
+            logger.warning("suggest index refresh error: %s", e)
+            self._retry_at = time.monotonic() + SUGGEST_RETRY
+            raise
+        self._generation = generation
+        if ids is None:
+            self._loaded_at = now
+            self.full_reloads += 1
+        self.refreshes += 1
+
+    def _apply(self, rows, full: bool = False, ids=()) -> None:
+        """
+        rows: (id, name, category, created_at) — full=True คือทุกชิ้น (ที่ไม่อยู่ใน rows ถูกลบแล้ว)
+        ไม่งั้นคือแถวล่าสุดของ ids (id ใน ids ที่ไม่อยู่ใน rows ถูกลบแล้ว)
+        """
+        fresh = {doc_id: (name, category, float(created_at)) for doc_id, name, category, created_at in rows}
+        current = self._docs  # อ่านนอก _lock ได้: ไม่มี thread อื่นแก้ระหว่างนี้
+        candidates = current if full else ids
+        removed = [doc_id for doc_id in candidates if doc_id in current and doc_id not in fresh]
+        changed = []
+        for doc_id, value in fresh.items():
+            doc = current.get(doc_id)
+            if doc is None or (doc.name, doc.category, doc.created_at) != value:
+                changed.append(doc_id)
+        if not removed and not changed:
+            return
+        if len(removed) + len(changed) > len(current) * _REBUILD_RATIO:
+            if full:
+                docs = {doc_id: _make_doc(*value) for doc_id, value in fresh.items()}
+            else:
+                docs = dict(current)
+                for doc_id in removed:
+                    del docs[doc_id]
+                docs.update((doc_id, _make_doc(*value)) for doc_id, value in fresh.items())
+            self._rebuild(docs)
+            return
+        with self._lock:
+            for doc_id in removed:
+                self._remove(doc_id)
+            for doc_id in changed:
+                if doc_id in self._docs:
+                    self._remove(doc_id)
+                self._add(doc_id, _make_doc(*fresh[doc_id]))
+
+    def _rebuild(self, docs: Dict[int, _Doc]) -> None:
+        """สร้างโครงสร้างใหม่ทั้งหมดนอก lock แล้วสลับทีเดียว"""
+        prefix = sorted(key for doc_id, doc in docs.items() for key in _prefix_keys(doc_id, doc))
+        postings = defaultdict(list)
+        for doc_id, doc in sorted(docs.items(), key=lambda item: _rank(*item)):
+            for gram in _trigrams(doc.text):
+                postings[gram].append(doc_id)
+        grams = {gram: array("i", ids) for gram, ids in postings.items()}
+        with self._lock:
+            self._docs, self._prefix, self._grams = docs, prefix, grams
+        self.rebuilds += 1
+
+    def _add(self, doc_id: int, doc: _Doc) -> None:
+        self._docs[doc_id] = doc
+        for key in _prefix_keys(doc_id, doc):
+            bisect.insort(self._prefix, key)
+        # แทรกตามลำดับ created_at ไม่ใช่หน้าสุด: สินค้าเก่าที่ถูกแก้ชื่อต้องไม่แซงสินค้าใหม่กว่า
+        rank = _rank(doc_id, doc)
+        for gram in _trigrams(doc.text):
+            posting = self._grams.setdefault(gram, array("i"))
+            posting.insert(bisect.bisect_left(posting, rank, key=self._rank_of), doc_id)
+
+    def _rank_of(self, doc_id: int) -> Tuple[float, int]:
+        return _rank(doc_id, self._docs[doc_id])
+
+    def _remove(self, doc_id: int) -> None:
+        doc = self._docs.pop(doc_id)
+        for key in _prefix_keys(doc_id, doc):
+            i = bisect.bisect_left(self._prefix, key)
+            if i < len(self._prefix) and self._prefix[i] == key:
+                del self._prefix[i]
+        for gram in _trigrams(doc.text):
+            posting = self._grams[gram]
+            posting.remove(doc_id)
+            if not posting:
+                del self._grams[gram]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "ready": self.ready,
+                "products": len(self._docs),
+                "prefix_keys": len(self._prefix),
+                "trigrams": len(self._grams),
+                "queries": self.queries,
+                "refreshes": self.refreshes,
+                "full_reloads": self.full_reloads,
+                "rebuilds": self.rebuilds,
+            }
+
+
+_INDEX: Optional[SuggestIndex] = None
+_INDEX_PID: Optional[int] = None
+_INDEX_LOCK = threading.Lock()
+
+
+def get_suggest_index() -> SuggestIndex:
+    """index ของ process นี้ (สร้างใหม่หลัง gunicorn fork)"""
+    global _INDEX, _INDEX_PID
+    if _INDEX is not None and _INDEX_PID == os.getpid():
+        return _INDEX
+    with _INDEX_LOCK:
+        if _INDEX is None or _INDEX_PID != os.getpid():
+            _INDEX, _INDEX_PID = SuggestIndex(), os.getpid()
+        return _INDEX
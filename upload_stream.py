@@ -0,0 +1,304 @@
+"""
+รับไฟล์อัปโหลดแบบ stream สำหรับ route อัปโหลดรูป (app.py)
+
+- multipart: UploadRequest ให้ werkzeug เขียน part ของไฟล์ลง blob temp ตรง ๆ ผ่าน SniffingWriter
+  ตรวจ magic bytes ตั้งแต่ก้อนแรกและตัดทันทีเมื่อเกินขนาดของชนิดไฟล์นั้น — ไม่ต้องรับครบ 5MB ก่อนค่อยรู้ว่าไฟล์ใช้ไม่ได้
+- resumable: สร้าง upload (POST) แล้วส่งทีละก้อน (PATCH + Upload-Offset) หลุดกลางทางก็ถามตำแหน่งล่าสุด (GET/HEAD)
+  แล้วส่งต่อได้ เหมาะกับมือถือที่เน็ตช้า/หลุดบ่อย เสร็จแล้วส่ง {"upload_id"} ให้ route อัปโหลดเดิม
+"""
+import json
+import os
+import re
+import time
+import uuid
+from typing import Dict, Optional
+
+from flask import Request
+
+import blob_store
+
+try:
+    import fcntl
+except ImportError:  # Windows (dev): ไม่มี file lock — PATCH ซ้อนกันบน upload เดียวกันไม่ได้ถูกกัน
+    fcntl = None
+
+
+# ==========================
+#  ชนิดไฟล์ + ขนาดสูงสุด
+# ==========================
+
+# นามสกุลที่เก็บ -> ขนาดสูงสุด (bytes)
+UPLOAD_MAX_BYTES: Dict[str, int] = {
+    "jpg": int(os.environ.get("UPLOAD_MAX_BYTES_JPG", str(5 * 1024 * 1024))),
+    "png": int(os.environ.get("UPLOAD_MAX_BYTES_PNG", str(5 * 1024 * 1024))),
+    "webp": int(os.environ.get("UPLOAD_MAX_BYTES_WEBP", str(5 * 1024 * 1024))),
+    "gif": int(os.environ.get("UPLOAD_MAX_BYTES_GIF", str(2 * 1024 * 1024))),
+}
+ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "gif", "webp"}
+SNIFF_BYTES = 12
+_UNSUPPORTED = "ไฟล์ไม่รองรับ (รองรับเฉพาะ: png, jpg, jpeg, gif, webp)"
+
+
+class UploadRejected(Exception):
+    """ไฟล์ถูกปฏิเสธระหว่างรับ (status = HTTP status ที่ควรตอบ, extra = field เพิ่มใน JSON)"""
+
+    def __init__(self, message: str, status: int = 400, **extra):
+        super().__init__(message)
+        self.status = status
+        self.extra = extra
+
+
+def sniff_image_type(head: bytes) -> Optional[str]:
+    """ดูชนิดรูปจาก magic bytes (ไม่เชื่อนามสกุล/Content-Type ที่ client ส่งมา)"""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+def _too_large(ext: str) -> UploadRejected:
+    return UploadRejected(f"ไฟล์ใหญ่เกินไป ({ext} สูงสุด {UPLOAD_MAX_BYTES[ext] // (1024 * 1024)}MB)", 413)
+
+
+def _check_filename(filename: Optional[str]) -> None:
+    if not filename:
+        raise UploadRejected("ไม่ได้เลือกไฟล์")
+    if "." not in filename or filename.rsplit(".", 1)[1].lower() not in ALLOWED_EXTENSIONS:
+        raise UploadRejected(_UNSUPPORTED)
+
+
+# ==========================
+#  Multipart แบบ stream
+# ==========================
+
+
+class SniffingWriter:
+    """
+    ปลายทางของ part ไฟล์ใน multipart: werkzeug เรียก write() ทีละก้อน (ไม่เกิน buffer 64KB ของ parser)
+    เก็บแค่ SNIFF_BYTES แรกไว้ดูชนิด จากนั้นเขียนผ่าน BlobWriter ทันที — เกินขนาดหรือชนิดไม่ถูกก็ลบ temp แล้ว raise
+    """
+
+    def __init__(self, kind: str):
+        self._writer = blob_store.BlobWriter(kind)
+        self._head = b""
+        self.ext: Optional[str] = None
+
+    def write(self, data: bytes) -> int:
+        if self.ext is None:
+            self._head += data
+            if len(self._head) < SNIFF_BYTES:
+                return len(data)
+            self.ext = sniff_image_type(self._head)
+            if self.ext is None:
+                self._reject(UploadRejected(_UNSUPPORTED, 415))
+            data, self._head = self._head, b""
+        if self._writer.size + len(data) > UPLOAD_MAX_BYTES[self.ext]:
+            self._reject(_too_large(self.ext))
+        self._writer.write(data)
+        return len(data)
+
+    def _reject(self, error: UploadRejected):
+        self._writer.abort()
+        raise error
+
+    # ฝั่งอ่าน (FileStorage / Pillow ใช้ตรวจ header หลัง parse เสร็จ)
+    def seek(self, offset: int, whence: int = 0) -> int:
+        return self._writer.file.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self._writer.file.tell()
+
+    def read(self, size: int = -1) -> bytes:
+        return self._writer.file.read(size)
+
+    def readline(self, size: int = -1) -> bytes:
+        return self._writer.file.readline(size)
+
+    def seekable(self) -> bool:
+        return True
+
+    def readable(self) -> bool:
+        return True
+
+    def finish(self) -> blob_store.PendingBlob:
+        """ปิดไฟล์ คืน PendingBlob (ชนิดไฟล์จาก magic bytes) ไว้ให้ blob_store.store"""
+        if self.ext is None:
+            self._reject(UploadRejected(_UNSUPPORTED, 415))
+        return self._writer.finish(self.ext)
+
+    def close(self) -> None:
+        """ถูกเรียกตอนจบ request — ถ้ายังไม่ finish (เช่น route error) ลบ temp ทิ้ง"""
+        if not self._writer.file.closed:
+            self._writer.abort()
+
+
+class UploadRequest(Request):
+    """
+    Request ของ app: ถ้า route ตั้ง upload_kind ก่อนแตะ request.files ไฟล์จะถูก stream ลง blob temp ผ่าน SniffingWriter
+    route อื่นใช้ของ werkzeug ตามปกติ
+    """
+
+    upload_kind: Optional[str] = None
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if self.upload_kind is None:
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        _check_filename(filename)
+        return SniffingWriter(self.upload_kind)
+
+
+# ==========================
+#  Resumable upload (ส่งทีละก้อน ต่อจากจุดที่หลุดได้)
+# ==========================
+
+# ที่เก็บ upload ที่ยังไม่เสร็จ — อยู่นอก static/ เพื่อไม่ให้ถูกเสิร์ฟ
+RESUMABLE_DIR = os.environ.get(
+    "UPLOAD_RESUMABLE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".uploads")
+)
+RESUMABLE_CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_SIZE", str(512 * 1024)))  # ขนาดก้อนที่แนะนำให้ client
+RESUMABLE_TTL = float(os.environ.get("UPLOAD_RESUMABLE_TTL", "86400"))  # upload ที่ไม่ขยับนานเกินนี้ถูกลบ
+_READ_SIZE = 64 * 1024
+_UPLOAD_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+
+def _paths(upload_id: str):
+    if not _UPLOAD_ID_RE.match(upload_id or ""):
+        raise UploadRejected("ไม่พบ upload", 404)
+    base = os.path.join(RESUMABLE_DIR, upload_id)
+    return base + ".json", base + ".part"
+
+
+def _load(upload_id: str, user_id: int) -> Dict:
+    meta_path, _ = _paths(upload_id)
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        raise UploadRejected("ไม่พบ upload (อาจหมดอายุแล้ว)", 404)
+    if meta["user_id"] != user_id:
+        raise UploadRejected("ไม่พบ upload", 404)
+    return meta
+
+
+def _save(upload_id: str, meta: Dict) -> None:
+    meta_path, _ = _paths(upload_id)
+    tmp = f"{meta_path}.{os.getpid()}"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp, meta_path)
+
+
+def _remove(upload_id: str) -> None:
+    for path in _paths(upload_id):
+        blob_store.discard_path(path)
+
+
+def _status(upload_id: str, meta: Dict, offset: int) -> Dict:
+    return {
+        "upload_id": upload_id,
+        "kind": meta["kind"],
+        "size": meta["size"],
+        "offset": offset,
+        "complete": offset == meta["size"],
+        "chunk_size": RESUMABLE_CHUNK_SIZE,
+    }
+
+
+def create_resumable(kind: str, size, filename: Optional[str], user_id: int) -> Dict:
+    """เริ่ม upload ใหม่ (ยังไม่รับข้อมูล) — ขนาดที่ประกาศเกินขนาดสูงสุดของทุกชนิดถูกปฏิเสธทันที"""
+    if kind not in blob_store.BLOB_KINDS:
+        raise UploadRejected("kind ต้องเป็น product หรือ profile")
+    _check_filename(filename)
+    if not isinstance(size, int) or size <= 0:
+        raise UploadRejected("size ต้องเป็นจำนวนเต็มบวก")
+    if size > max(UPLOAD_MAX_BYTES.values()):
+        raise UploadRejected(f"ไฟล์ใหญ่เกินไป (สูงสุด {max(UPLOAD_MAX_BYTES.values()) // (1024 * 1024)}MB)", 413)
+    os.makedirs(RESUMABLE_DIR, exist_ok=True)
+    upload_id = uuid.uuid4().hex
+    meta = {"kind": kind, "size": size, "ext": None, "user_id": user_id, "created_at": time.time()}
+    _save(upload_id, meta)
+    open(_paths(upload_id)[1], "wb").close()
+    return _status(upload_id, meta, 0)
+
+
+def resumable_status(upload_id: str, user_id: int) -> Dict:
+    """ตำแหน่งล่าสุดที่ได้รับ (client ใช้ต่อหลังเน็ตหลุด)"""
+    meta = _load(upload_id, user_id)
+    return _status(upload_id, meta, os.path.getsize(_paths(upload_id)[1]))
+
+
+def append_resumable(upload_id: str, user_id: int, offset: int, stream, content_length: Optional[int]) -> Dict:
+    """
+    ต่อข้อมูลก้อนหนึ่งที่ offset (ต้องเท่ากับขนาดที่ได้รับแล้วพอดี ไม่งั้น 409 พร้อม offset ที่ถูกต้อง)
+    ก้อนแรกถูกตรวจ magic bytes ก่อนเขียน; อ่าน/เขียนทีละ 64KB
+    """
+    meta = _load(upload_id, user_id)
+    _, part_path = _paths(upload_id)
+    with open(part_path, "r+b") as part:
+        if fcntl is not None:
+            fcntl.flock(part, fcntl.LOCK_EX)
+        current = os.fstat(part.fileno()).st_size
+        if offset != current:
+            raise UploadRejected("Upload-Offset ไม่ตรงกับที่ได้รับแล้ว", 409, offset=current)
+        if content_length is not None and offset + content_length > meta["size"]:
+            raise UploadRejected("ข้อมูลเกินขนาดที่ประกาศไว้", 413)
+        part.seek(current)
+        if meta["ext"] is None:
+            head = stream.read(SNIFF_BYTES)
+            ext = sniff_image_type(head)
+            if ext is None:
+                _remove(upload_id)
+                raise UploadRejected(_UNSUPPORTED, 415)
+            if meta["size"] > UPLOAD_MAX_BYTES[ext]:
+                _remove(upload_id)
+                raise _too_large(ext)
+            meta["ext"] = ext
+            _save(upload_id, meta)
+            part.write(head)
+            current += len(head)
+        for chunk in iter(lambda: stream.read(_READ_SIZE), b""):
+            if current + len(chunk) > meta["size"]:
+                part.truncate(current)
+                raise UploadRejected("ข้อมูลเกินขนาดที่ประกาศไว้", 413, offset=current)
+            part.write(chunk)
+            current += len(chunk)
+    return _status(upload_id, meta, current)
+
+
+def complete_resumable(upload_id: str, kind: str, user_id: int) -> blob_store.PendingBlob:
+    """upload ที่ครบแล้ว -> PendingBlob สำหรับ blob_store.store (ไฟล์ถูกย้ายออกจาก RESUMABLE_DIR)"""
+    meta = _load(upload_id, user_id)
+    _, part_path = _paths(upload_id)
+    if meta["kind"] != kind:
+        raise UploadRejected("upload นี้ไม่ใช่ของรูปประเภทนี้")
+    if meta["ext"] is None or os.path.getsize(part_path) != meta["size"]:
+        raise UploadRejected("upload ยังไม่ครบ", 409, offset=os.path.getsize(part_path))
+    pending = blob_store.pending_from_file(kind, part_path, meta["ext"])
+    _remove(upload_id)
+    return pending
+
+
+def sweep_resumable(ttl: Optional[float] = None) -> int:
+    """ลบ upload ที่ไม่มีข้อมูลเข้ามานานเกิน ttl — คืนจำนวนที่ลบ"""
+    ttl = RESUMABLE_TTL if ttl is None else ttl
+    if not os.path.isdir(RESUMABLE_DIR):
+        return 0
+    cutoff = time.time() - ttl
+    removed = 0
+    for name in os.listdir(RESUMABLE_DIR):
+        upload_id, _, suffix = name.partition(".")
+        if suffix != "json" or not _UPLOAD_ID_RE.match(upload_id):
+            continue
+        try:
+            last_activity = max(os.path.getmtime(p) for p in _paths(upload_id) if os.path.exists(p))
+        except (OSError, ValueError):
+            continue
+        if last_activity < cutoff:
+            _remove(upload_id)
+            removed += 1
+    return removed